@@ -0,0 +1,187 @@
+# -*- coding: utf-8 -*-
+#       __BENCH_DYNAMICS__
+#       Benchmarks of the dynamics hot paths and of the
+#       flip scenarios, with baselines to track regressions
+#
+#       usage: PYTHONPATH=. python benchmarks/bench_dynamics.py [--save baseline.json] [--compare baseline.json]
+"""Benchmarks of the dynamics hot paths and of the flip scenarios
+
+Reports the best wall time, the steps/s, the RHS calls per step, the peak
+traced memory and the memory blocks still allocated after a run, per step,
+of each workload. With --compare, exits with 1 when a workload is slower or
+uses more memory than the baseline by more than --tolerance.
+"""
+
+import argparse
+import json
+import sys
+import time
+import tracemalloc
+from collections import OrderedDict
+
+import numpy as np
+
+from quadrotor_simulator.batch import BatchQuadrotorDynamics
+from quadrotor_simulator.flips import Section, SimulationParams
+from quadrotor_simulator.quadrotor_dynamics import QuadrotorDynamics
+from quadrotor_simulator.sweep import grid, run_sweep
+
+HOVER = Section(total_thrust=9.81, desired_angular_acc=[0, 0, 0], t=60)
+
+
+def flip_sections(turns):
+    gen = SimulationParams(turns=turns)
+    return gen.get_sections(gen.get_initial_parameters())
+
+
+def bench_rhs_call():
+    quadrotor = QuadrotorDynamics(save_state=False)
+    quadrotor.update_state(flip_sections(1)[:1])
+    state = quadrotor.current_state
+    n = 10000
+    for i in range(n):
+        quadrotor._integrator(state, 0.0, 9.81, [10.0, 0.0, 0.0])
+    return n, n
+
+
+def bench_update_state(sections, **kwargs):
+    def bench():
+        quadrotor = QuadrotorDynamics(**kwargs)
+        quadrotor.update_state(sections)
+        return int(round(quadrotor.t_start / quadrotor._dt)), quadrotor.integrator.nfev
+    return bench
+
+
+def bench_update_state_dense(sections):
+    def bench():
+        quadrotor = QuadrotorDynamics()
+        result = quadrotor.update_state_dense(sections)
+        # Steps of update_state covering the same flight, for comparison
+        return int(round(quadrotor.t_start / quadrotor._dt)), result.nfev
+    return bench
+
+
+def bench_batch(n):
+    sections = flip_sections(5)
+
+    def bench():
+        batch = BatchQuadrotorDynamics(n)
+        ts, states, n_samples = batch.simulate(sections)
+        steps = int((n_samples - 1).sum())
+        return steps, 4 * steps
+    return bench
+
+
+def bench_sweep(n):
+    parameters = grid(p1=np.linspace(0.15, 0.25, n))
+    gen = SimulationParams()
+    p0, _, p2, p3, p4 = gen.get_initial_parameters()
+    schedules = [gen.get_sections((p0, p1, p2, p3, p4)) for p1 in parameters.p1]
+    steps = int(BatchQuadrotorDynamics(n).compile_schedules(schedules)[3].sum())
+
+    def bench():
+        run_sweep(parameters)
+        # The RHS calls happen in the workers
+        return steps, None
+    return bench
+
+
+WORKLOADS = OrderedDict([
+    ('rhs_call', bench_rhs_call),
+    # The two sections of tests/test_quadrotor_sim.py
+    ('update_state_3_turns', bench_update_state(flip_sections(3)[:2])),
+    # The schedule of multiflips_example.py
+    ('update_state_5_turns', bench_update_state(flip_sections(5))),
+    ('update_state_5_turns_rk4_compiled', bench_update_state(flip_sections(5), integrator='rk4_compiled')),
+    ('update_state_5_turns_quaternion', bench_update_state(flip_sections(5), attitude='quaternion')),
+    ('hover_60s', bench_update_state([HOVER])),
+    ('hover_60s_bounded_history', bench_update_state([HOVER], max_history=1000)),
+    ('hover_60s_rk4_compiled', bench_update_state([HOVER], integrator='rk4_compiled')),
+    ('hover_60s_dense', bench_update_state_dense([HOVER])),
+    ('batch_256_5_turns', bench_batch(256)),
+    ('sweep_32_5_turns', bench_sweep(32)),
+])
+
+
+def measure(bench, repeat):
+    """Best wall time over repeat runs, then peak memory and retained blocks in a traced run"""
+    bench()  # warm up caches and compiled kernels
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        steps, rhs_calls = bench()
+        best = min(best, time.perf_counter() - start)
+
+    tracemalloc.start()
+    blocks = sys.getallocatedblocks()
+    bench()
+    retained = sys.getallocatedblocks() - blocks
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+
+    result = OrderedDict([('wall_s', best), ('peak_memory_kb', peak / 1024.0)])
+    if steps:
+        result['steps'] = steps
+        result['steps_per_s'] = steps / best
+        result['retained_blocks_per_step'] = retained / float(steps)
+        if rhs_calls is not None:
+            result['rhs_calls_per_step'] = rhs_calls / float(steps)
+    return result
+
+
+def compare(results, baseline, tolerance):
+    """Names of the workloads slower or using more memory than baseline by more than tolerance"""
+    regressions = []
+    for name, result in results.items():
+        if name not in baseline:
+            continue
+        reference = baseline[name]
+        if result['wall_s'] > reference['wall_s'] * (1 + tolerance):
+            regressions.append('{}: wall time {:.4g} s vs {:.4g} s'.format(name, result['wall_s'],
+                                                                          reference['wall_s']))
+        if result['peak_memory_kb'] > reference['peak_memory_kb'] * (1 + tolerance):
+            regressions.append('{}: peak memory {:.1f} kB vs {:.1f} kB'.format(name, result['peak_memory_kb'],
+                                                                             reference['peak_memory_kb']))
+    return regressions
+
+
+def _column(result, key, spec):
+    return format(result[key], spec) if key in result else ''
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('workloads', nargs='*', help='workloads to run, all by default')
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--save', help='write the results to this JSON file')
+    parser.add_argument('--compare', help='baseline JSON file to compare against')
+    parser.add_argument('--tolerance', type=float, default=0.1, help='allowed relative regression')
+    args = parser.parse_args(argv)
+
+    results = OrderedDict()
+    print('{:<36}{:>12}{:>14}{:>12}{:>14}{:>24}'.format('workload', 'wall [ms]', 'steps/s', 'RHS/step',
+                                                        'peak [kB]', 'retained blocks/step'))
+    for name in args.workloads or WORKLOADS:
+        result = results[name] = measure(WORKLOADS[name], args.repeat)
+        # Adaptive solvers may take far fewer RHS calls than steps, hence the significant digits.
+        # Workloads not counting the RHS calls leave the column blank
+        print('{:<36}{:>12.2f}{:>14}{:>12}{:>14.1f}{:>24}'.format(
+            name, result['wall_s'] * 1e3, _column(result, 'steps_per_s', '.0f'),
+            _column(result, 'rhs_calls_per_step', '.3g'), result['peak_memory_kb'],
+            _column(result, 'retained_blocks_per_step', '.3f')))
+
+    if args.save:
+        with open(args.save, 'w') as f:
+            json.dump(results, f, indent=2)
+
+    if args.compare:
+        with open(args.compare) as f:
+            regressions = compare(results, json.load(f), args.tolerance)
+        for regression in regressions:
+            print('REGRESSION ' + regression)
+        return 1 if regressions else 0
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
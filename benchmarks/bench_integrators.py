@@ -0,0 +1,45 @@
+# -*- coding: utf-8 -*-
+#       __BENCH_INTEGRATORS__
+#       Accuracy against cost of the integrators
+#       available to QuadrotorDynamics
+#
+#       usage: PYTHONPATH=. python benchmarks/bench_integrators.py
+
+import time
+
+import numpy as np
+
+from quadrotor_simulator.flips import SimulationParams
+from quadrotor_simulator.quadrotor_dynamics import QuadrotorDynamics
+
+INTEGRATORS = ('odeint', 'RK45', 'DOP853', 'LSODA', 'rk4', 'rk2', 'semi_implicit_euler', 'rk4_compiled',
+               'rk2_compiled', 'semi_implicit_euler_compiled')
+
+
+def run(integrator, sections, dt=0.005):
+    quadrotor = QuadrotorDynamics(save_state=True, dt=dt, integrator=integrator)
+    start = time.perf_counter()
+    state = quadrotor.update_state(sections)
+    elapsed = time.perf_counter() - start
+    return state.values, elapsed, quadrotor.integrator.nfev
+
+
+def main():
+    gen = SimulationParams()
+    sections = gen.get_sections(gen.get_initial_parameters())
+    reference = run('odeint', sections)[0]
+    n_steps = len(reference) - 1
+
+    print('{:<30}{:>12}{:>12}{:>14}{:>16}'.format('integrator', 'time [ms]', 'RHS calls', 'RHS / step',
+                                                  'max error'))
+    for integrator in INTEGRATORS:
+        # The first run compiles the numba kernels
+        run(integrator, sections)
+        values, elapsed, nfev = run(integrator, sections)
+        error = np.abs(values - reference).max()
+        print('{:<30}{:>12.2f}{:>12d}{:>14.2f}{:>16.3e}'.format(integrator, elapsed * 1e3, nfev,
+                                                                nfev / float(n_steps), error))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,56 @@
+# -*- coding: utf-8 -*-
+#       __ATTITUDE__
+#       This file implements the conversions between the
+#       Euler angles of the model and unit quaternions
+#
+#       The Euler angles are the Z-Y-X angles of rotation_matrix and the
+#       quaternions are [w, x, y, z] with the same rotation.
+
+import numpy as np
+
+
+def euler_to_quaternion(phi, theta, psi):
+    """Unit quaternion [w, x, y, z] of rotation_matrix(phi, theta, psi)"""
+    cphi, sphi = np.cos(phi / 2.0), np.sin(phi / 2.0)
+    cthe, sthe = np.cos(theta / 2.0), np.sin(theta / 2.0)
+    cpsi, spsi = np.cos(psi / 2.0), np.sin(psi / 2.0)
+    return np.array([
+        cphi * cthe * cpsi + sphi * sthe * spsi,
+        sphi * cthe * cpsi - cphi * sthe * spsi,
+        cphi * sthe * cpsi + sphi * cthe * spsi,
+        cphi * cthe * spsi - sphi * sthe * cpsi,
+    ])
+
+
+def quaternion_to_euler(quaternions, reference=None):
+    """Euler angles [phi, theta, psi] of (n, 4) quaternions
+
+    phi and psi are unwrapped along the rows so that they stay continuous
+    through flips, starting from the first row or from the angles given
+    as reference.
+
+    Parameters
+    ----------
+    quaternions : numpy.array
+        (n, 4) quaternions [w, x, y, z], not necessarily normalized
+    reference : numpy.array, optional
+        [phi, theta, psi] preceding the first row
+
+    Returns
+    -------
+    numpy.array
+        (n, 3) Euler angles
+    """
+    quaternions = np.asarray(quaternions, dtype=float)
+    quaternions = quaternions / np.linalg.norm(quaternions, axis=1)[:, np.newaxis]
+    w, x, y, z = quaternions.T
+    angles = np.empty((len(quaternions), 3))
+    angles[:, 0] = np.arctan2(2 * (w * x + y * z), 1 - 2 * (x * x + y * y))
+    angles[:, 1] = np.arcsin(np.clip(2 * (w * y - z * x), -1.0, 1.0))
+    angles[:, 2] = np.arctan2(2 * (w * z + x * y), 1 - 2 * (y * y + z * z))
+    if reference is None:
+        angles[:, [0, 2]] = np.unwrap(angles[:, [0, 2]], axis=0)
+    else:
+        reference = np.asarray(reference, dtype=float)[[0, 2]]
+        angles[:, [0, 2]] = np.unwrap(np.vstack((reference, angles[:, [0, 2]])), axis=0)[1:]
+    return angles
@@ -0,0 +1,307 @@
+# -*- coding: utf-8 -*-
+#       __BATCH__
+#       This file implements the dynamics of many
+#       quadrotors integrated at once, one row per vehicle
+
+import numpy as np
+
+from quadrotor_simulator.quadrotor_dynamics import default_config
+from quadrotor_simulator.scenarios import Schedule, broadcast_schedule, compile_schedule, pack_sections
+from quadrotor_simulator.vehicle import VehicleParams
+
+
+def _cross(a, b):
+    """Cross product of (N, 3) arrays, cheaper than np.cross for small N"""
+    cross = np.empty_like(a)
+    cross[:, 0] = a[:, 1] * b[:, 2] - a[:, 2] * b[:, 1]
+    cross[:, 1] = a[:, 2] * b[:, 0] - a[:, 0] * b[:, 2]
+    cross[:, 2] = a[:, 0] * b[:, 1] - a[:, 1] * b[:, 0]
+    return cross
+
+
+def batch_moments(ref_acc, angular_vel, inertia):
+    """Vectorized ``moments``
+
+    Parameters
+    ----------
+    ref_acc : numpy.array
+        (N, 3) desired angular accelerations [dp/dt, dq/dt, dr/dt]
+    angular_vel : numpy.array
+        (N, 3) angular velocities [p, q, r]
+    inertia : numpy.array
+        (N, 3) diagonal of the inertia matrices [Ixx, Iyy, Izz]
+
+    Returns
+    -------
+    numpy.array
+        (N, 3) desired moments
+    """
+    cross = _cross(angular_vel / inertia, inertia * angular_vel)
+    return inertia * (ref_acc + cross)
+
+
+def batch_motor_thrust(moments, total_thrust, inverse_mixer):
+    """Vectorized ``motor_thrust``
+
+    Parameters
+    ----------
+    moments : numpy.array
+        (N, 3) moments [Mp, Mq, Mr]
+    total_thrust : numpy.array
+        (N,) total thrust generated by all motors
+    inverse_mixer : numpy.array
+        (4, 4) inverse mixer shared by the batch or (N, 4, 4) one per vehicle,
+        see VehicleParams
+
+    Returns
+    -------
+    numpy.array
+        (N, 4) thrust generated by each motor [T1, T2, T3, T4]
+    """
+    commands = np.concatenate((np.reshape(total_thrust, (-1, 1)), moments), axis=1)
+    if np.ndim(inverse_mixer) == 2:
+        return np.dot(commands, inverse_mixer.T)
+    return np.matmul(inverse_mixer, commands[:, :, np.newaxis])[:, :, 0]
+
+
+def section_rows(states, total_thrust, desired_angular_acc, vehicle):
+    """Rows of df_state_history for states sampled with constant inputs
+
+    Parameters
+    ----------
+    states : numpy.array
+        (n, 12) states
+    total_thrust : float
+        Total thrust of the section
+    desired_angular_acc : numpy.array
+        [dp/dt, dq/dt, dr/dt] of the section
+    vehicle : VehicleParams
+        Constants of the vehicle
+
+    Returns
+    -------
+    numpy.array
+        (n, 19) states, motor thrusts and desired angular accelerations
+    """
+    states = np.asarray(states, dtype=float)
+    rows = np.empty((len(states), 19))
+    rows[:, :12] = states
+    rows[:, 16:19] = desired_angular_acc
+    rows[:, 12:16] = batch_motor_thrust(batch_moments(rows[:, 16:19], states[:, 9:12], vehicle.inertia),
+                                        np.full(len(states), float(total_thrust)), vehicle.inverse_mixer)
+    return rows
+
+
+def batch_rotation_matrix(phi, theta, psi):
+    """Vectorized ``rotation_matrix``, returns an (N, 3, 3) array"""
+    cphi, sphi = np.cos(phi), np.sin(phi)
+    cthe, sthe = np.cos(theta), np.sin(theta)
+    cpsi, spsi = np.cos(psi), np.sin(psi)
+    rot_mat = np.empty(np.shape(phi) + (3, 3))
+    rot_mat[..., 0, 0] = cthe * cpsi
+    rot_mat[..., 0, 1] = sphi * sthe * cpsi - cphi * spsi
+    rot_mat[..., 0, 2] = cphi * sthe * cpsi + sphi * spsi
+    rot_mat[..., 1, 0] = cthe * spsi
+    rot_mat[..., 1, 1] = sphi * sthe * spsi + cphi * cpsi
+    rot_mat[..., 1, 2] = cphi * sthe * spsi - sphi * cpsi
+    rot_mat[..., 2, 0] = -sthe
+    rot_mat[..., 2, 1] = cthe * sphi
+    rot_mat[..., 2, 2] = cthe * cphi
+    return rot_mat
+
+
+def batch_angular_rotation_matrix(phi, theta, psi):
+    """Vectorized ``angular_rotation_matrix``, returns an (N, 3, 3) array"""
+    cphi, sphi = np.cos(phi), np.sin(phi)
+    cthe, sthe = np.cos(theta), np.sin(theta)
+    rot_mat = np.zeros(np.shape(phi) + (3, 3))
+    rot_mat[..., 0, 0] = 1
+    rot_mat[..., 0, 2] = -sthe
+    rot_mat[..., 1, 1] = cphi
+    rot_mat[..., 1, 2] = cthe * sphi
+    rot_mat[..., 2, 1] = -sphi
+    rot_mat[..., 2, 2] = cthe * cphi
+    return rot_mat
+
+
+class BatchParams(object):
+    def __init__(self, configs, n):
+        """Vehicle constants of a batch stored as (N,) and (N, 3) arrays
+
+        Parameters
+        ----------
+        configs : dict or list of dict
+            A single config shared by all vehicles or one config per vehicle,
+            each one updating ``default_config()``
+        n : int
+            Number of vehicles
+        """
+        if configs is None or isinstance(configs, dict):
+            configs = [configs] * n
+        if len(configs) != n:
+            raise ValueError('Expected {} configs, got {}'.format(n, len(configs)))
+        vehicles = []
+        for config in configs:
+            full_config = default_config()
+            if config:
+                full_config.update(config)
+            vehicles.append(VehicleParams.from_config(full_config))
+
+        self.gravity = np.array([v.gravity for v in vehicles])
+        self.mass = np.array([v.mass for v in vehicles])
+        self.length = np.array([v.length for v in vehicles])
+        self.thrust_to_drag = np.array([v.thrust_to_drag for v in vehicles])
+        self.inertia = np.array([v.inertia for v in vehicles])
+        self.inverse_inertia = np.array([v.inverse_inertia for v in vehicles])
+        self.mixer = np.array([v.mixer for v in vehicles])
+        self.inverse_mixer = np.array([v.inverse_mixer for v in vehicles])
+
+
+def batch_state_derivative(states, total_thrust, desired_angular_acc, params):
+    """Vectorized ``state_derivative``
+
+    Parameters
+    ----------
+    states : numpy.array
+        (N, 12) states [x, y, z, x_dot, y_dot, z_dot, phi, theta, psi, p, q, r]
+    total_thrust : numpy.array
+        (N,) total thrust
+    desired_angular_acc : numpy.array
+        (N, 3) desired angular accelerations
+    params : BatchParams
+        Constants of the vehicles
+
+    Returns
+    -------
+    tuple of numpy.array
+        (N, 12) rates of the states and (N, 4) motor thrusts
+    """
+    omega = states[:, 9:12]
+    phi, theta, psi = states[:, 6], states[:, 7], states[:, 8]
+
+    thrust = batch_motor_thrust(batch_moments(desired_angular_acc, omega, params.inertia),
+                                total_thrust, params.inverse_mixer)
+
+    cphi, sphi = np.cos(phi), np.sin(phi)
+    cthe, sthe = np.cos(theta), np.sin(theta)
+    cpsi, spsi = np.cos(psi), np.sin(psi)
+
+    states_dot = np.empty_like(states)
+    states_dot[:, 0:3] = states[:, 3:6]
+
+    # Only the last column of the rotation matrix is needed for the acceleration
+    force_z_body = thrust.sum(axis=1) / params.mass
+    states_dot[:, 3] = (cphi * sthe * cpsi + sphi * spsi) * force_z_body
+    states_dot[:, 4] = (cphi * sthe * spsi - sphi * cpsi) * force_z_body
+    states_dot[:, 5] = cthe * cphi * force_z_body - params.gravity
+
+    # Closed form inverse of angular_rotation_matrix
+    p, q, r = omega[:, 0], omega[:, 1], omega[:, 2]
+    det = cthe * (cphi * cphi + sphi * sphi)
+    states_dot[:, 7] = cthe * (cphi * q - sphi * r) / det
+    states_dot[:, 8] = (sphi * q + cphi * r) / det
+    states_dot[:, 6] = p + sthe * states_dot[:, 8]
+
+    thrust_matrix = np.matmul(params.mixer[:, 1:], thrust[:, :, np.newaxis])[:, :, 0]
+    states_dot[:, 9:12] = (params.inverse_inertia * thrust_matrix -
+                           _cross(params.inverse_inertia * omega, params.inertia * omega))
+    return states_dot, thrust
+
+
+class BatchQuadrotorDynamics(object):
+    def __init__(self, n, configs=None, dt=0.005, substeps=1):
+        """Integrate N quadrotors at once with a fixed step Runge-Kutta 4 scheme
+
+        Parameters
+        ----------
+        n : int
+            Number of vehicles
+        configs : dict or list of dict
+            A config shared by all vehicles or one config per vehicle
+        dt : float
+            Sampling step of the results
+        substeps : int
+            Number of Runge-Kutta steps per dt
+        """
+        self.n = n
+        self.params = BatchParams(configs, n)
+        self._dt = dt
+        self.substeps = substeps
+        self.current_state = np.zeros((n, 12))
+
+    def compile_schedules(self, schedules):
+        """Turn the schedule of each vehicle into padded arrays, see scenarios.compile_schedule
+
+        The sections are sampled like ``QuadrotorDynamics.update_state``
+        does: sections shorter than 2 * dt are skipped and each section lasts
+        ``len(np.arange(t_start, t_start + section.t, dt)) - 1`` steps.
+
+        Parameters
+        ----------
+        schedules : list of tuple of Section or Schedule
+            One piecewise schedule per vehicle, or a single schedule shared
+            by all vehicles
+
+        Returns
+        -------
+        tuple of numpy.array
+            (N, K) step at which each section ends, (N, K) thrusts,
+            (N, K, 3) desired angular accelerations and (N,) number of steps
+        """
+        if not isinstance(schedules, Schedule):
+            schedules = pack_sections(schedules)
+        compiled = compile_schedule(broadcast_schedule(schedules, self.n), self._dt)
+        return compiled.section_end, compiled.total_thrust, compiled.desired_angular_acc, compiled.n_steps
+
+    def simulate(self, schedules, initial_states=None):
+        """Integrate all the vehicles over their schedules
+
+        Parameters
+        ----------
+        schedules : list of tuple of Section or Schedule
+            One piecewise schedule per vehicle, or a single shared schedule
+        initial_states : numpy.array
+            (N, 12) initial states, defaults to self.current_state
+
+        Returns
+        -------
+        tuple of numpy.array
+            (T,) sampling times, (N, T, 12) states and (N,) number of valid
+            samples of each vehicle. Vehicles with a shorter schedule keep
+            their final state until T.
+        """
+        section_end, total_thrust, desired_angular_acc, n_steps = self.compile_schedules(schedules)
+        if initial_states is not None:
+            self.current_state = np.array(initial_states, dtype=float).reshape(self.n, 12)
+
+        n_samples = int(n_steps.max()) + 1
+        states = np.empty((self.n, n_samples, 12))
+        states[:, 0] = self.current_state
+        state = self.current_state.copy()
+        section = np.zeros(self.n, dtype=np.int64)
+        rows = np.arange(self.n)
+        h = self._dt / self.substeps
+
+        for step in range(1, n_samples):
+            # Move to the next section of each vehicle when the current one is over
+            section += (step > section_end[rows, section]) & (section < section_end.shape[1] - 1)
+            thrust = total_thrust[rows, section]
+            acc = desired_angular_acc[rows, section]
+            active = (step <= n_steps)[:, np.newaxis]
+
+            new_state = state
+            for _ in range(self.substeps):
+                new_state = self._rk4_step(new_state, h, thrust, acc)
+            state = np.where(active, new_state, state)
+            states[:, step] = state
+
+        self.current_state = state
+        ts = np.arange(n_samples) * self._dt
+        return ts, states, n_steps + 1
+
+    def _rk4_step(self, state, h, total_thrust, desired_angular_acc):
+        k1 = batch_state_derivative(state, total_thrust, desired_angular_acc, self.params)[0]
+        k2 = batch_state_derivative(state + h / 2 * k1, total_thrust, desired_angular_acc, self.params)[0]
+        k3 = batch_state_derivative(state + h / 2 * k2, total_thrust, desired_angular_acc, self.params)[0]
+        k4 = batch_state_derivative(state + h * k3, total_thrust, desired_angular_acc, self.params)[0]
+        return state + h / 6 * (k1 + 2 * k2 + 2 * k3 + k4)
@@ -0,0 +1,126 @@
+# -*- coding: utf-8 -*-
+#       __EVENTS__
+#       This file implements the events detected while
+#       integrating with dense output, see
+#       QuadrotorDynamics.update_state_dense
+#
+#       Events follow the scipy.integrate.solve_ivp conventions: a function
+#       of (t, state) whose zeros are located, with terminal and direction
+#       attributes.
+
+import numpy as np
+
+STATE_NAMES = ('x', 'y', 'z', 'x_dot', 'y_dot', 'z_dot', 'phi', 'theta', 'psi', 'p', 'q', 'r')
+
+ANGLES = {'phi': 6, 'theta': 7, 'psi': 8}
+
+
+class Event(object):
+    """Base class of the events
+
+    Attributes
+    ----------
+    name : str
+        Label of the event in DenseTrajectory.events
+    terminal : bool
+        Whether the flight stops when the event fires
+    direction : int
+        Only zeros crossed downwards (-1), upwards (1) or both (0) fire
+    """
+    name = None
+    terminal = False
+    direction = 0
+
+    def __call__(self, t, state):
+        raise NotImplementedError
+
+
+class AngleCrossing(Event):
+    def __init__(self, angle, axis='phi', terminal=False):
+        """The Euler angle axis crosses angle [rad]"""
+        self.angle = angle
+        self.index = ANGLES[axis]
+        self.name = '{}={:g}'.format(axis, angle)
+        self.terminal = terminal
+
+    def __call__(self, t, state):
+        return state[self.index] - self.angle
+
+
+class GroundContact(Event):
+    def __init__(self, height=0.0, terminal=True):
+        """The vehicle goes down through z = height"""
+        self.height = height
+        self.name = 'ground_contact'
+        self.terminal = terminal
+        self.direction = -1
+
+    def __call__(self, t, state):
+        return state[2] - self.height
+
+
+class AttitudeRecovered(Event):
+    def __init__(self, max_tilt=np.pi / 12, terminal=False):
+        """The angle between the body z axis and the vertical drops below max_tilt [rad]"""
+        self.max_tilt = max_tilt
+        self.name = 'attitude_recovered'
+        self.terminal = terminal
+        self.direction = 1
+        self._cos_max_tilt = np.cos(max_tilt)
+
+    def __call__(self, t, state):
+        # Last element of the rotation matrix, the cosine of the tilt
+        return np.cos(state[6]) * np.cos(state[7]) - self._cos_max_tilt
+
+
+def flip_events(turns, axis='phi'):
+    """AngleCrossing at every completed turn about axis"""
+    return [AngleCrossing(2 * np.pi * turn, axis) for turn in range(1, int(turns) + 1)]
+
+
+class DenseTrajectory(object):
+    def __init__(self):
+        """Result of QuadrotorDynamics.update_state_dense
+
+        Attributes
+        ----------
+        ts, states : numpy.array
+            The requested times and the (n, 12) interpolated states
+        events : pandas.DataFrame
+            One row per fired event: its time, section, name and state
+        nfev : int
+            Number of right-hand side evaluations
+        terminated : bool
+            Whether a terminal event stopped the flight
+        """
+        import pandas as pd
+
+        self.ts = np.empty(0)
+        self.states = np.empty((0, 12))
+        self.events = pd.DataFrame(columns=['t', 'section', 'event'] + list(STATE_NAMES))
+        self.nfev = 0
+        self.terminated = False
+        # (t_start, t_end, OdeSolution) of each integrated section
+        self.solutions = []
+
+    @property
+    def t_start(self):
+        return self.solutions[0][0] if self.solutions else np.nan
+
+    @property
+    def t_end(self):
+        return self.solutions[-1][1] if self.solutions else np.nan
+
+    def __call__(self, ts):
+        """(n, 12) states at any times ts within [t_start, t_end]"""
+        ts = np.atleast_1d(np.asarray(ts, dtype=float))
+        if (ts < self.t_start - 1e-9).any() or (ts > self.t_end + 1e-9).any():
+            raise ValueError('Times outside [{}, {}]'.format(self.t_start, self.t_end))
+        states = np.empty((len(ts), 12))
+        ends = np.array([t_end for _, t_end, _ in self.solutions])
+        # A time at a boundary belongs to the section starting there
+        sections = np.minimum(np.searchsorted(ends, ts, side='right'), len(self.solutions) - 1)
+        for i in np.unique(sections):
+            mask = sections == i
+            states[mask] = self.solutions[i][2](ts[mask]).T
+        return states
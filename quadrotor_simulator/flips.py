@@ -0,0 +1,75 @@
+# -*- coding: utf-8 -*-
+#       __FLIPS__
+#       This file implements the multi-flip parameters
+#       of Lupashin et al. and their piecewise sections
+#
+#       Largely based on the work of https://github.com/nikhilkalige
+
+from collections import namedtuple
+
+import numpy as np
+
+Section = namedtuple('Section', ['total_thrust', 'desired_angular_acc', 't'])
+
+# Names of the parameters that define a multi-flip
+FLIP_PARAMETERS = ('Bup', 'Bdown', 'Cpmax', 'Cn', 'p0', 'p1', 'p2', 'p3', 'p4')
+
+
+class SimulationParams(object):
+    def __init__(self, turns=5, Bup=21.58, Bdown=3.92, Cpmax=np.pi * 1800 / 180):
+        """Multi-flip about the body x axis
+
+        Parameters
+        ----------
+        turns : int
+            Number of flips, Cn
+        Bup : float
+            Reduced max collective acceleration
+        Bdown : float
+            Reduced min collective acceleration
+        Cpmax : float
+            Max roll rate [rad s^-1]
+        """
+        self.mass = 1
+        self.length = 0.2
+        # inertia about xb,yb
+        self.Ixx = 0.0053
+        # reduced max collective accel.
+        self.Bup = Bup
+        # reduced min collective accel.
+        self.Bdown = Bdown
+        self.Cpmax = Cpmax
+        self.Cn = turns
+        self.gravity = 9.81
+
+    def get_acceleration(self, p0, p3):
+        """Roll accelerations of the 5 sections, see scenarios.Flip"""
+        rates = self._flip(p0=p0, p3=p3).accelerations(self._config())[0]
+        return dict(zip(('acc', 'start', 'coast', 'stop', 'recover'), (float(rate) for rate in rates)))
+
+    def get_initial_parameters(self):
+        return tuple(float(p) for p in self._flip().initial_parameters(self._config())[0])
+
+    def get_sections(self, parameters):
+        """Sections of the roll flip with parameters p0..p4, see scenarios.Flip"""
+        (p0, p1, p2, p3, p4) = parameters
+        return self._flip(p0=p0, p1=p1, p2=p2, p3=p3, p4=p4).sections(self._config())
+
+    def _flip(self, **parameters):
+        from quadrotor_simulator.scenarios import Flip
+
+        return Flip(turns=self.Cn, axis='roll', Bup=self.Bup, Bdown=self.Bdown, Cpmax=self.Cpmax, **parameters)
+
+    def _config(self):
+        # A roll flip only uses the inertia about xb
+        return {'mass': self.mass, 'length': self.length, 'gravity': self.gravity,
+                'inertia': np.array([self.Ixx, self.Ixx, self.Ixx])}
+
+
+def flip_sections(Bup=21.58, Bdown=3.92, Cpmax=np.pi * 1800 / 180, Cn=5,
+                  p0=np.nan, p1=np.nan, p2=np.nan, p3=np.nan, p4=np.nan):
+    """Sections of a multi-flip, missing (NaN) p0..p4 take their initial value"""
+    gen = SimulationParams(turns=Cn, Bup=Bup, Bdown=Bdown, Cpmax=Cpmax)
+    parameters = tuple(initial if np.isnan(p) else p
+                       for p, initial in zip((p0, p1, p2, p3, p4), gen.get_initial_parameters()))
+    return gen.get_sections(parameters)
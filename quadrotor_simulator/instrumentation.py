@@ -0,0 +1,94 @@
+# -*- coding: utf-8 -*-
+#       __INSTRUMENTATION__
+#       This file implements the opt-in profiling of
+#       QuadrotorDynamics, per section of the flight
+
+import time
+
+import numpy as np
+
+# Timed stages of one call of the integrator callback: the shared right-hand
+# side of the attitude representation and the recording of the history row
+STAGES = ('rhs', 'history')
+
+clock = time.perf_counter
+
+
+class SectionStats(object):
+    def __init__(self, index, total_thrust, desired_angular_acc, ts):
+        """Measurements of one section of the flight
+
+        Attributes
+        ----------
+        index : int
+            Position of the section in the flight
+        total_thrust, desired_angular_acc :
+            The inputs of the section
+        t_start, t_end : float
+            Integration interval
+        rhs_evaluations : int
+            Number of right-hand side evaluations
+        stage_times : numpy.array
+            Seconds spent in each of STAGES, zeros for compiled integrators
+            whose right-hand side is not a Python callback
+        wall_time : float
+            Seconds spent integrating the section
+        step_sizes : numpy.array
+            Step sizes taken by the integrator, odeint 'hu' or the fixed steps
+        info : dict
+            The infodict returned by odeint or the solve_ivp result, if any,
+            odeint being asked for it only while instrumented
+        """
+        self.index = index
+        self.total_thrust = total_thrust
+        self.desired_angular_acc = desired_angular_acc
+        self.t_start = ts[0]
+        self.t_end = ts[-1]
+        self.rhs_evaluations = 0
+        self.stage_times = np.zeros(len(STAGES))
+        self.wall_time = 0.0
+        self.step_sizes = np.empty(0)
+        self.info = None
+
+
+class SimulationStats(object):
+    def __init__(self, callback=None):
+        """Per section statistics collected by an instrumented QuadrotorDynamics
+
+        Parameters
+        ----------
+        callback : callable, optional
+            Called with each SectionStats once its section is integrated
+        """
+        self.callback = callback
+        self.sections = []
+
+    def begin_section(self, total_thrust, desired_angular_acc, ts):
+        stats = SectionStats(len(self.sections), total_thrust, desired_angular_acc, ts)
+        self.sections.append(stats)
+        return stats
+
+    def end_section(self, stats):
+        if self.callback is not None:
+            self.callback(stats)
+
+    def to_dataframe(self):
+        """One row per section: RHS evaluations, wall time, step sizes and stage times"""
+        import pandas as pd
+
+        rows = []
+        for stats in self.sections:
+            row = {
+                'section': stats.index,
+                't_start': stats.t_start,
+                't_end': stats.t_end,
+                'rhs_evaluations': stats.rhs_evaluations,
+                'wall_time': stats.wall_time,
+                'steps': len(stats.step_sizes),
+                'min_step': stats.step_sizes.min() if len(stats.step_sizes) else np.nan,
+                'max_step': stats.step_sizes.max() if len(stats.step_sizes) else np.nan,
+            }
+            row.update(zip(STAGES, stats.stage_times))
+            rows.append(row)
+        return pd.DataFrame(rows, columns=['section', 't_start', 't_end', 'rhs_evaluations', 'wall_time', 'steps',
+                                           'min_step', 'max_step'] + list(STAGES))
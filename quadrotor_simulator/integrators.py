@@ -0,0 +1,250 @@
+# -*- coding: utf-8 -*-
+#       __INTEGRATORS__
+#       This file implements the integration schemes
+#       that can be used by QuadrotorDynamics
+
+from functools import partial
+
+import numpy as np
+
+
+class Integrator(object):
+    """Base class of the integrators
+
+    ``integrate`` follows the ``scipy.integrate.odeint`` conventions: the
+    right-hand side is called as ``fun(y, t, *args)`` and the result holds
+    one row per requested time. ``jac``, when given, is the Jacobian of the
+    right-hand side called as ``jac(y, t, *args)``, used by the implicit
+    schemes and ignored by the others. ``nfev`` counts the right-hand side
+    evaluations since the creation of the integrator, ``njev`` the Jacobian
+    evaluations, and ``last_info`` holds the solver output of the last call,
+    when there is one. Solvers only produce their optional diagnostics while
+    ``full_output`` is set.
+    """
+    name = None
+    full_output = False
+
+    def __init__(self):
+        self.nfev = 0
+        self.njev = 0
+        self.last_info = None
+
+    def step_sizes(self, ts):
+        """Step sizes taken during the last call of integrate over ts"""
+        return np.diff(ts)
+
+    def integrate(self, fun, y0, ts, args=(), jac=None):
+        raise NotImplementedError
+
+    def _reject_options(self, options):
+        """Raise ValueError for the keyword arguments the integrator does not support"""
+        if options:
+            raise ValueError('{} does not accept {}'.format(self.name, ', '.join(sorted(options))))
+
+    def _counted(self, fun):
+        def counted_fun(*fun_args):
+            self.nfev += 1
+            return fun(*fun_args)
+        return counted_fun
+
+    def _counted_jac(self, jac):
+        def counted_jac(*jac_args):
+            self.njev += 1
+            return jac(*jac_args)
+        return counted_jac
+
+
+class OdeintIntegrator(Integrator):
+    """scipy.integrate.odeint (LSODA), the historical default"""
+    name = 'odeint'
+
+    def __init__(self, **options):
+        super(OdeintIntegrator, self).__init__()
+        self.options = options
+
+    def integrate(self, fun, y0, ts, args=(), jac=None):
+        from scipy.integrate import odeint
+
+        Dfun = None if jac is None else self._counted_jac(jac)
+        if not self.full_output:
+            self.last_info = None
+            return odeint(self._counted(fun), y0, ts, args=args, Dfun=Dfun, **self.options)
+        output, self.last_info = odeint(self._counted(fun), y0, ts, args=args, Dfun=Dfun, full_output=True,
+                                        **self.options)
+        return output
+
+    def step_sizes(self, ts):
+        if self.last_info is None:
+            return super(OdeintIntegrator, self).step_sizes(ts)
+        return self.last_info['hu'][:len(ts) - 1]
+
+
+class SolveIvpIntegrator(Integrator):
+    """scipy.integrate.solve_ivp with one of its methods (RK45, DOP853, Radau, ...)"""
+    # Methods using the Jacobian
+    implicit_methods = ('Radau', 'BDF', 'LSODA')
+
+    def __init__(self, method='RK45', **options):
+        super(SolveIvpIntegrator, self).__init__()
+        self.name = method
+        self.options = options
+
+    def integrate(self, fun, y0, ts, args=(), jac=None):
+        from scipy.integrate import solve_ivp
+
+        counted_fun = self._counted(fun)
+        options = dict(self.options)
+        if jac is not None and self.name in self.implicit_methods:
+            counted_jac = self._counted_jac(jac)
+            options['jac'] = lambda t, y: counted_jac(y, t, *args)
+        solution = solve_ivp(lambda t, y: counted_fun(y, t, *args), (ts[0], ts[-1]), y0,
+                             method=self.name, t_eval=ts, **options)
+        if not solution.success:
+            raise RuntimeError(solution.message)
+        self.last_info = solution
+        return solution.y.T
+
+
+class FixedStepIntegrator(Integrator):
+    """Base class of the schemes taking exactly one step between requested times, without options"""
+
+    def __init__(self, **options):
+        super(FixedStepIntegrator, self).__init__()
+        self._reject_options(options)
+
+    def integrate(self, fun, y0, ts, args=(), jac=None):
+        output = np.empty((len(ts), len(y0)))
+        output[0] = y0
+        for i in range(len(ts) - 1):
+            output[i + 1] = self.step(fun, output[i], ts[i], ts[i + 1] - ts[i], args)
+        return output
+
+    def step(self, fun, y, t, h, args):
+        raise NotImplementedError
+
+
+class RK4Integrator(FixedStepIntegrator):
+    """Classical Runge-Kutta, 4 evaluations per step"""
+    name = 'rk4'
+
+    def step(self, fun, y, t, h, args):
+        k1 = fun(y, t, *args)
+        k2 = fun(y + h / 2 * k1, t + h / 2, *args)
+        k3 = fun(y + h / 2 * k2, t + h / 2, *args)
+        k4 = fun(y + h * k3, t + h, *args)
+        self.nfev += 4
+        return y + h / 6 * (k1 + 2 * k2 + 2 * k3 + k4)
+
+
+class RK2Integrator(FixedStepIntegrator):
+    """Midpoint Runge-Kutta, 2 evaluations per step"""
+    name = 'rk2'
+
+    def step(self, fun, y, t, h, args):
+        k1 = fun(y, t, *args)
+        k2 = fun(y + h / 2 * k1, t + h / 2, *args)
+        self.nfev += 2
+        return y + h * k2
+
+
+class SemiImplicitEulerIntegrator(FixedStepIntegrator):
+    """Symplectic Euler, 2 evaluations per step
+
+    Velocities [x_dot, y_dot, z_dot, p, q, r] are updated first and the
+    positions and Euler angles are then integrated with the new velocities.
+    """
+    name = 'semi_implicit_euler'
+    # Indices of the velocities in the state
+    velocities = np.array([3, 4, 5, 9, 10, 11])
+    positions = np.array([0, 1, 2, 6, 7, 8])
+
+    def step(self, fun, y, t, h, args):
+        y_new = y.copy()
+        y_new[self.velocities] += h * fun(y, t, *args)[self.velocities]
+        y_new[self.positions] += h * fun(y_new, t, *args)[self.positions]
+        self.nfev += 2
+        return y_new
+
+
+class CompiledIntegrator(FixedStepIntegrator):
+    """Fixed step scheme running the fused kernels of quadrotor_simulator.kernels
+
+    The whole section is integrated by ``kernels.integrate_fixed_step``,
+    compiled with numba when it is importable. QuadrotorDynamics calls
+    ``integrate_section``; ``integrate`` falls back to the Python schemes for
+    any other right-hand side. The kernels, and numba, are imported by the
+    first compiled integrator created.
+    """
+    # Python scheme of each kernel scheme, named as in kernels
+    schemes = {
+        'rk4': RK4Integrator,
+        'rk2': RK2Integrator,
+        'semi_implicit_euler': SemiImplicitEulerIntegrator,
+    }
+
+    def __init__(self, scheme='rk4', **options):
+        if scheme not in self.schemes:
+            raise ValueError('Unknown scheme {!r}, expected one of {}'.format(scheme, ', '.join(sorted(self.schemes))))
+        self.name = scheme + '_compiled'
+        super(CompiledIntegrator, self).__init__(**options)
+        from quadrotor_simulator import kernels
+
+        self.scheme = scheme
+        self._kernels = kernels
+
+    def integrate(self, fun, y0, ts, args=(), jac=None):
+        integrator = self.schemes[self.scheme]()
+        output = integrator.integrate(fun, y0, ts, args)
+        self.nfev += integrator.nfev
+        return output
+
+    def integrate_section(self, y0, ts, total_thrust, desired_angular_acc, vehicle):
+        """Integrate the quadrotor dynamics over ts
+
+        Returns
+        -------
+        tuple of numpy.array
+            (len(ts), 12) states and (len(ts), 4) motor thrusts
+        """
+        states = np.empty((len(ts), len(y0)))
+        thrusts = np.empty((len(ts), 4))
+        kernels = self._kernels
+        scheme = getattr(kernels, self.scheme.upper())
+        self.nfev += kernels.integrate_fixed_step(scheme, np.asarray(y0, dtype=float), np.asarray(ts, dtype=float),
+                                                  float(total_thrust), np.asarray(desired_angular_acc, dtype=float),
+                                                  vehicle, states, thrusts)
+        return states, thrusts
+
+
+INTEGRATORS = {
+    'odeint': OdeintIntegrator,
+    'rk4': RK4Integrator,
+    'rk2': RK2Integrator,
+    'semi_implicit_euler': SemiImplicitEulerIntegrator,
+    'rk4_compiled': partial(CompiledIntegrator, 'rk4'),
+    'rk2_compiled': partial(CompiledIntegrator, 'rk2'),
+    'semi_implicit_euler_compiled': partial(CompiledIntegrator, 'semi_implicit_euler'),
+}
+
+SOLVE_IVP_METHODS = ('RK45', 'RK23', 'DOP853', 'Radau', 'BDF', 'LSODA')
+
+
+def get_integrator(integrator='odeint', **options):
+    """Integrator instance from its name
+
+    Parameters
+    ----------
+    integrator : str or Integrator
+        One of INTEGRATORS or SOLVE_IVP_METHODS, an instance is returned as is
+    options : dict
+        Keyword arguments of the integrator (rtol, atol, ...). The fixed step
+        schemes take none and raise ValueError for any
+    """
+    if isinstance(integrator, Integrator):
+        return integrator
+    if integrator in INTEGRATORS:
+        return INTEGRATORS[integrator](**options)
+    if integrator in SOLVE_IVP_METHODS:
+        return SolveIvpIntegrator(integrator, **options)
+    raise ValueError('Unknown integrator {!r}, expected one of {}'.format(
+        integrator, ', '.join(sorted(INTEGRATORS) + list(SOLVE_IVP_METHODS))))
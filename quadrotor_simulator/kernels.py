@@ -0,0 +1,182 @@
+# -*- coding: utf-8 -*-
+#       __KERNELS__
+#       This file implements allocation free kernels of the
+#       quadrotor dynamics, compiled with numba when available
+
+import math
+
+import numpy as np
+
+try:
+    import numba
+except ImportError:  # pragma: no cover - depends on the environment
+    numba = None
+
+HAS_NUMBA = numba is not None
+
+# Layout of the vehicle array consumed by the kernels, see vehicle.vehicle_array
+MASS, GRAVITY, LENGTH, THRUST_TO_DRAG, IXX, IYY, IZZ, JXX, JYY, JZZ = range(10)
+
+# Fixed step schemes of integrate_fixed_step
+RK4, RK2, SEMI_IMPLICIT_EULER = range(3)
+
+
+def _jit(function):
+    """Compile with numba.njit when numba is importable, plain Python otherwise"""
+    if numba is None:
+        return function
+    return numba.njit(cache=True)(function)
+
+
+@_jit
+def derivative_kernel(state, total_thrust, desired_angular_acc, vehicle, state_dot, thrust):
+    """Fused moments, motor_thrust, acceleration and angular acceleration
+
+    Same equations as ``state_derivative``, writing the state rates into
+    ``state_dot`` (12) and the motor thrusts into ``thrust`` (4).
+    """
+    p = state[9]
+    q = state[10]
+    r = state[11]
+    ixx = vehicle[IXX]
+    iyy = vehicle[IYY]
+    izz = vehicle[IZZ]
+    jxx = vehicle[JXX]
+    jyy = vehicle[JYY]
+    jzz = vehicle[JZZ]
+    length = vehicle[LENGTH]
+    thrust_to_drag = vehicle[THRUST_TO_DRAG]
+
+    # moments
+    a0 = jxx * p
+    a1 = jyy * q
+    a2 = jzz * r
+    b0 = ixx * p
+    b1 = iyy * q
+    b2 = izz * r
+    m_p = ixx * (desired_angular_acc[0] + (a1 * b2 - a2 * b1))
+    m_q = iyy * (desired_angular_acc[1] + (a2 * b0 - a0 * b2))
+    m_r = izz * (desired_angular_acc[2] + (a0 * b1 - a1 * b0))
+
+    # motor_thrust
+    tmp1add = total_thrust + m_r / thrust_to_drag
+    tmp1sub = total_thrust - m_r / thrust_to_drag
+    tmp2p = 2 * m_p / length
+    tmp2q = 2 * m_q / length
+    t1 = (tmp1add - tmp2q) / 4.0
+    t2 = (tmp1sub + tmp2p) / 4.0
+    t3 = (tmp1add + tmp2q) / 4.0
+    t4 = (tmp1sub - tmp2p) / 4.0
+    thrust[0] = t1
+    thrust[1] = t2
+    thrust[2] = t3
+    thrust[3] = t4
+
+    cphi = math.cos(state[6])
+    sphi = math.sin(state[6])
+    cthe = math.cos(state[7])
+    sthe = math.sin(state[7])
+    cpsi = math.cos(state[8])
+    spsi = math.sin(state[8])
+
+    state_dot[0] = state[3]
+    state_dot[1] = state[4]
+    state_dot[2] = state[5]
+
+    # acceleration
+    force_z_body = (((t1 + t2) + t3) + t4) / vehicle[MASS]
+    state_dot[3] = (cphi * sthe * cpsi + sphi * spsi) * force_z_body
+    state_dot[4] = (cphi * sthe * spsi - sphi * cpsi) * force_z_body
+    state_dot[5] = (cthe * cphi) * force_z_body - vehicle[GRAVITY]
+
+    # angular_velocity_to_dt_eulerangles
+    det = cphi * cthe * cphi + cthe * sphi * sphi
+    psi_dot = (sphi * q + cphi * r) / det
+    state_dot[6] = p + sthe * psi_dot
+    state_dot[7] = (cthe * cphi * q - cthe * sphi * r) / det
+    state_dot[8] = psi_dot
+
+    # angular_acceleration
+    state_dot[9] = jxx * (length * (t2 - t4)) - (a1 * b2 - a2 * b1)
+    state_dot[10] = jyy * (length * (t3 - t1)) - (a2 * b0 - a0 * b2)
+    state_dot[11] = jzz * (thrust_to_drag * (t1 - t2 + t3 - t4)) - (a0 * b1 - a1 * b0)
+
+
+@_jit
+def integrate_fixed_step(scheme, y0, ts, total_thrust, desired_angular_acc, vehicle, states, thrusts):
+    """Integrate one section with one fixed step between consecutive ts
+
+    Parameters
+    ----------
+    scheme : int
+        RK4, RK2 or SEMI_IMPLICIT_EULER
+    y0 : numpy.array
+        Initial state (12)
+    ts : numpy.array
+        Sampling times
+    total_thrust : float
+        The total thrust generated by all motors
+    desired_angular_acc : numpy.array
+        The desired angular acceleration [dp/dt, dq/dt, dr/dt]
+    vehicle : numpy.array
+        See ``vehicle.vehicle_array``
+    states : numpy.array
+        (len(ts), 12) output states
+    thrusts : numpy.array
+        (len(ts), 4) output motor thrusts at each sample
+
+    Returns
+    -------
+    int
+        Number of evaluations of the dynamics
+    """
+    n_states = y0.shape[0]
+    k1 = np.empty(n_states)
+    k2 = np.empty(n_states)
+    k3 = np.empty(n_states)
+    k4 = np.empty(n_states)
+    tmp = np.empty(n_states)
+    thrust = np.empty(4)
+    nfev = 0
+
+    for j in range(n_states):
+        states[0, j] = y0[j]
+    for i in range(ts.shape[0] - 1):
+        h = ts[i + 1] - ts[i]
+        y = states[i]
+        y_new = states[i + 1]
+        derivative_kernel(y, total_thrust, desired_angular_acc, vehicle, k1, thrusts[i])
+        if scheme == RK4:
+            for j in range(n_states):
+                tmp[j] = y[j] + h / 2 * k1[j]
+            derivative_kernel(tmp, total_thrust, desired_angular_acc, vehicle, k2, thrust)
+            for j in range(n_states):
+                tmp[j] = y[j] + h / 2 * k2[j]
+            derivative_kernel(tmp, total_thrust, desired_angular_acc, vehicle, k3, thrust)
+            for j in range(n_states):
+                tmp[j] = y[j] + h * k3[j]
+            derivative_kernel(tmp, total_thrust, desired_angular_acc, vehicle, k4, thrust)
+            for j in range(n_states):
+                y_new[j] = y[j] + h / 6 * (k1[j] + 2 * k2[j] + 2 * k3[j] + k4[j])
+            nfev += 4
+        elif scheme == RK2:
+            for j in range(n_states):
+                tmp[j] = y[j] + h / 2 * k1[j]
+            derivative_kernel(tmp, total_thrust, desired_angular_acc, vehicle, k2, thrust)
+            for j in range(n_states):
+                y_new[j] = y[j] + h * k2[j]
+            nfev += 2
+        else:
+            # Velocities first, then positions and angles with the new velocities
+            for j in range(n_states):
+                y_new[j] = y[j]
+            for j in (3, 4, 5, 9, 10, 11):
+                y_new[j] = y[j] + h * k1[j]
+            derivative_kernel(y_new, total_thrust, desired_angular_acc, vehicle, k2, thrust)
+            for j in (0, 1, 2, 6, 7, 8):
+                y_new[j] = y[j] + h * k2[j]
+            nfev += 2
+
+    last = ts.shape[0] - 1
+    derivative_kernel(states[last], total_thrust, desired_angular_acc, vehicle, k1, thrusts[last])
+    return nfev
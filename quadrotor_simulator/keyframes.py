@@ -0,0 +1,195 @@
+# -*- coding: utf-8 -*-
+#       __KEYFRAMES__
+#       This file implements a streaming exporter of the
+#       flight as animation keyframes, e.g. for blender
+
+import math
+
+import numpy as np
+
+from quadrotor_simulator.quadrotor_dynamics import rotation_matrix
+
+ROTATION_CHANNELS = {
+    'quaternion': ('qw', 'qx', 'qy', 'qz'),
+    'matrix': ('r11', 'r12', 'r13', 'r21', 'r22', 'r23', 'r31', 'r32', 'r33'),
+}
+
+
+def quaternion_from_matrix(matrix):
+    """Unit quaternion [w, x, y, z] of a rotation matrix"""
+    (r11, r12, r13), (r21, r22, r23), (r31, r32, r33) = matrix.tolist()
+    trace = r11 + r22 + r33
+    if trace > 0:
+        s = 2.0 * math.sqrt(trace + 1.0)
+        q = [0.25 * s, (r32 - r23) / s, (r13 - r31) / s, (r21 - r12) / s]
+    elif r11 > r22 and r11 > r33:
+        s = 2.0 * math.sqrt(1.0 + r11 - r22 - r33)
+        q = [(r32 - r23) / s, 0.25 * s, (r12 + r21) / s, (r13 + r31) / s]
+    elif r22 > r33:
+        s = 2.0 * math.sqrt(1.0 + r22 - r11 - r33)
+        q = [(r13 - r31) / s, (r12 + r21) / s, 0.25 * s, (r23 + r32) / s]
+    else:
+        s = 2.0 * math.sqrt(1.0 + r33 - r11 - r22)
+        q = [(r21 - r12) / s, (r13 + r31) / s, (r23 + r32) / s, 0.25 * s]
+    return np.array(q)
+
+
+class KeyframeWriter(object):
+    def __init__(self, f, fps=24, position_tolerance=1e-3, rotation_tolerance=1e-3, rotation='quaternion',
+                 start_frame=1):
+        """Write keyframes of position and orientation as CSV rows
+
+        States are linearly resampled at fps, then a frame is only kept as a
+        keyframe when linear interpolation between the kept keyframes would
+        miss it by more than the tolerance on some channel. The decimation
+        is the swing door algorithm: a corridor of feasible slopes per
+        channel is narrowed by every frame, and a keyframe is written when
+        it becomes empty, so memory does not depend on the flight length.
+
+        Keyframe values may differ from the frames by up to the tolerance.
+        Quaternion signs are kept continuous so that the per channel
+        interpolation of the animation f-curves stays close to the rotation.
+
+        Parameters
+        ----------
+        f : file
+            Text file receiving the CSV rows
+        fps : float
+            Frame rate of the animation
+        position_tolerance : float
+            Maximum interpolation error of x, y and z in meters
+        rotation_tolerance : float
+            Maximum interpolation error of each quaternion or matrix element
+        rotation : str
+            'quaternion' for [qw, qx, qy, qz] or 'matrix' for the row-major
+            elements of rotation_matrix
+        start_frame : int
+            Frame number of t = 0
+        """
+        if rotation not in ROTATION_CHANNELS:
+            raise ValueError('rotation must be one of {}'.format(sorted(ROTATION_CHANNELS)))
+        self.f = f
+        self.fps = fps
+        self.rotation = rotation
+        self.start_frame = start_frame
+        n_rotation = len(ROTATION_CHANNELS[rotation])
+        self.tolerance = np.array([position_tolerance] * 3 + [rotation_tolerance] * n_rotation)
+
+        self.n_samples = 0
+        self.n_frames = 0
+        self.n_keyframes = 0
+
+        # Last sample, for the resampling
+        self._t = None
+        self._state = None
+        self._next_frame = None
+        # Last keyframe, last frame and the corridor of slopes between them
+        self._key = None
+        self._candidate = None
+        self._low = None
+        self._high = None
+        self._quaternion = None
+
+        self.f.write(','.join(('frame', 'x', 'y', 'z') + ROTATION_CHANNELS[rotation]) + '\n')
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def add_sample(self, t, state):
+        """Add a simulated state, frames up to t are processed"""
+        state = np.asarray(state, dtype=float)
+        self.n_samples += 1
+        if self._t is None:
+            self._next_frame = int(math.ceil(t * self.fps - 1e-9))
+            if self._next_frame / float(self.fps) <= t + 1e-12:
+                self._add_frame(self._next_frame, state)
+                self._next_frame += 1
+        else:
+            while self._next_frame / float(self.fps) <= t + 1e-12:
+                weight = (self._next_frame / float(self.fps) - self._t) / (t - self._t) if t > self._t else 1.0
+                self._add_frame(self._next_frame, self._state + weight * (state - self._state))
+                self._next_frame += 1
+        self._t = t
+        self._state = state
+
+    def close(self):
+        """Write the last frame as a keyframe"""
+        if self._candidate is not None:
+            self._write_candidate()
+            self._candidate = None
+
+    def _channels(self, state):
+        matrix = rotation_matrix(state[6], state[7], state[8])
+        if self.rotation == 'matrix':
+            rotation = matrix.ravel()
+        else:
+            rotation = quaternion_from_matrix(matrix)
+            if self._quaternion is not None and np.dot(rotation, self._quaternion) < 0:
+                rotation = -rotation
+            self._quaternion = rotation
+        return np.concatenate((state[:3], rotation))
+
+    def _add_frame(self, frame, state):
+        self.n_frames += 1
+        values = self._channels(state)
+        if self._key is None:
+            self._write(frame, values)
+            return
+        key_frame, key_values = self._key
+        span = float(frame - key_frame)
+        low = (values - self.tolerance - key_values) / span
+        high = (values + self.tolerance - key_values) / span
+        if self._candidate is not None:
+            narrowed_low = np.maximum(self._low, low)
+            narrowed_high = np.minimum(self._high, high)
+            if (narrowed_low <= narrowed_high).all():
+                low, high = narrowed_low, narrowed_high
+            else:
+                self._write_candidate()
+                key_frame, key_values = self._key
+                span = float(frame - key_frame)
+                low = (values - self.tolerance - key_values) / span
+                high = (values + self.tolerance - key_values) / span
+        self._low = low
+        self._high = high
+        self._candidate = frame
+
+    def _write_candidate(self):
+        """Keyframe at the last frame, on a line within the tolerance of all frames since the last keyframe"""
+        key_frame, key_values = self._key
+        slope = 0.5 * (self._low + self._high)
+        self._write(self._candidate, key_values + slope * (self._candidate - key_frame))
+
+    def _write(self, frame, values):
+        self._key = (frame, values)
+        self._candidate = None
+        self.n_keyframes += 1
+        self.f.write('{:d},'.format(frame + self.start_frame) + ','.join(repr(v) for v in values.tolist()) + '\n')
+
+
+def export_keyframes(samples, path, **kwargs):
+    """Write the keyframes of a flight to a CSV file
+
+    Parameters
+    ----------
+    samples : iterable
+        (t, state) pairs, typically QuadrotorDynamics.stream(sections) with
+        save_state=False so that the flight is never held in memory
+    path : str
+        Output file
+    kwargs :
+        Options of KeyframeWriter
+
+    Returns
+    -------
+    KeyframeWriter
+        The closed writer, with the n_samples, n_frames and n_keyframes counters
+    """
+    with open(path, 'w') as f:
+        with KeyframeWriter(f, **kwargs) as writer:
+            for t, state in samples:
+                writer.add_sample(t, state)
+    return writer
@@ -0,0 +1,242 @@
+# -*- coding: utf-8 -*-
+#       __LEARNING__
+#       This file implements the iterative learning of the
+#       multi-flip parameters p0..p4 of Lupashin et al.
+
+import multiprocessing
+from collections import OrderedDict, namedtuple
+
+import numpy as np
+
+from quadrotor_simulator.flips import SimulationParams
+from quadrotor_simulator.quadrotor_dynamics import QuadrotorDynamics
+
+LEARNED_PARAMETERS = ('p0', 'p1', 'p2', 'p3', 'p4')
+
+LearningResult = namedtuple('LearningResult', ['parameters', 'residual', 'cost', 'history'])
+
+
+def flip_residual(state, turns):
+    """Final state error of a multi-flip: position, velocity and wrapped attitude
+
+    The target is the starting point at rest with phi = 2 pi turns.
+    """
+    attitude = state[6:9] - np.array([2 * np.pi * turns, 0, 0])
+    attitude = (attitude + np.pi) % (2 * np.pi) - np.pi
+    return np.concatenate((state[:6], attitude))
+
+
+def _section_key(section):
+    return (float(section.total_thrust), tuple(float(a) for a in section.desired_angular_acc), float(section.t))
+
+
+_worker = {}
+
+
+def _init_worker(config, dt, integrator):
+    """Pool initializer, one QuadrotorDynamics per process"""
+    _worker['quadrotor'] = QuadrotorDynamics(save_state=False, config=config, dt=dt, integrator=integrator)
+
+
+def _run_tail(job):
+    """Final state of the sections run from a (t_start, state) starting point"""
+    t_start, state, sections = job
+    quadrotor = _worker['quadrotor']
+    quadrotor.t_start = t_start
+    quadrotor.current_state = state
+    return quadrotor.run_sections(sections)
+
+
+class FlipLearner(object):
+    def __init__(self, params=None, config=None, dt=0.005, integrator='odeint', weights=None, steps=None,
+                 processes=1, cache_size=256):
+        """Levenberg-Marquardt learning of p0..p4 from simulated flips
+
+        The parameters are corrected from the final position, velocity and
+        attitude errors using a forward difference Jacobian. Each perturbed
+        flip only changes the sections depending on the perturbed parameter,
+        so it starts from the cached state at the end of the sections it
+        shares with the current flip: perturbing p2 skips the first two
+        sections, perturbing p3 or p4 the first three.
+
+        Section durations are sampled on the dt grid, so the reachable error
+        is limited by dt and the time steps of the Jacobian are multiples of
+        it.
+
+        Parameters
+        ----------
+        params : SimulationParams, optional
+            The flip, a 5 turn SimulationParams by default
+        config : dict, optional
+            Vehicle configuration passed to QuadrotorDynamics
+        dt : float
+            Simulation step
+        integrator : str
+            Integrator of QuadrotorDynamics
+        weights : numpy.array, optional
+            Weights of the 9 residuals [position, velocity, attitude]
+        steps : numpy.array, optional
+            Forward difference steps of p0..p4
+        processes : int
+            Number of worker processes integrating the perturbed flips
+            during learn, 1 integrates them in the calling process
+        cache_size : int
+            Number of cached section prefix end states
+        """
+        self.params = params or SimulationParams()
+        self.config = config
+        self.dt = dt
+        self.integrator = integrator
+        self.weights = np.ones(9) if weights is None else np.asarray(weights, dtype=float)
+        self.steps = np.array([0.05, 2 * dt, 2 * dt, 0.05, 2 * dt]) if steps is None else np.asarray(steps)
+        self.processes = processes
+        self.cache_size = cache_size
+        self.lower_bounds = np.array([self.params.Bdown, 2 * dt, 2 * dt, self.params.Bdown, 2 * dt])
+        self.upper_bounds = np.array([self.params.Bup, np.inf, np.inf, self.params.Bup, np.inf])
+
+        # Number of sections integrated and reused from the cache
+        self.integrated_sections = 0
+        self.reused_sections = 0
+
+        self._quadrotor = QuadrotorDynamics(save_state=False, config=config, dt=dt, integrator=integrator)
+        # End state of each recently simulated prefix of sections
+        self._prefixes = OrderedDict()
+        self._pool = None
+
+    def final_state(self, parameters):
+        """Final state of the flip, integrating only the sections not cached"""
+        sections = self.params.get_sections(tuple(parameters))
+        t_start, state, start = self._cached_prefix(sections)
+        quadrotor = self._quadrotor
+        quadrotor.t_start = t_start
+        quadrotor.current_state = state
+        keys = tuple(_section_key(section) for section in sections)
+        for i in range(start, len(sections)):
+            quadrotor.run_sections(sections[i:i + 1])
+            self._store(keys[:i + 1], quadrotor.t_start, quadrotor.current_state)
+        self.integrated_sections += len(sections) - start
+        self.reused_sections += start
+        return quadrotor.current_state
+
+    def residual(self, parameters):
+        """flip_residual of the flip with the given p0..p4"""
+        return flip_residual(self.final_state(parameters), self.params.Cn)
+
+    def jacobian(self, parameters, residual=None):
+        """Forward difference Jacobian of residual with respect to p0..p4, a (9, 5) array"""
+        parameters = np.asarray(parameters, dtype=float)
+        if residual is None:
+            residual = self.residual(parameters)
+        perturbed = []
+        for i in range(len(LEARNED_PARAMETERS)):
+            p = parameters.copy()
+            # Step away from the upper bounds
+            p[i] += self.steps[i] if p[i] + self.steps[i] <= self.upper_bounds[i] else -self.steps[i]
+            perturbed.append(p)
+
+        if self._pool is None:
+            states = [self.final_state(p) for p in perturbed]
+        else:
+            jobs = []
+            for p in perturbed:
+                sections = self.params.get_sections(tuple(p))
+                t_start, state, start = self._cached_prefix(sections)
+                self.integrated_sections += len(sections) - start
+                self.reused_sections += start
+                jobs.append((t_start, state, sections[start:]))
+            states = self._pool.map(_run_tail, jobs)
+
+        jacobian = np.empty((len(residual), len(perturbed)))
+        for i, (p, state) in enumerate(zip(perturbed, states)):
+            jacobian[:, i] = (flip_residual(state, self.params.Cn) - residual) / (p[i] - parameters[i])
+        return jacobian
+
+    def learn(self, parameters=None, iterations=30, tolerance=1e-8, damping=1e-2):
+        """Drive the final flip errors towards zero
+
+        Parameters
+        ----------
+        parameters : tuple, optional
+            Initial p0..p4, get_initial_parameters by default
+        iterations : int
+            Maximum number of Jacobian updates
+        tolerance : float
+            Stop when the cost decreases by less than this relative amount
+        damping : float
+            Initial Levenberg-Marquardt damping
+
+        Returns
+        -------
+        LearningResult
+            The learned parameters, their residual, cost (the squared norm of
+            the weighted residual) and a DataFrame with one row per iteration
+        """
+        if parameters is None:
+            parameters = self.params.get_initial_parameters()
+        parameters = np.asarray(parameters, dtype=float)
+        residual = self.residual(parameters)
+        cost = self._cost(residual)
+        history = [self._history_row(0, parameters, residual, cost)]
+
+        if self.processes > 1:
+            self._pool = multiprocessing.Pool(self.processes, initializer=_init_worker,
+                                              initargs=(self.config, self.dt, self.integrator))
+        try:
+            for iteration in range(1, iterations + 1):
+                jacobian = self.weights[:, np.newaxis] * self.jacobian(parameters, residual)
+                normal = jacobian.T.dot(jacobian)
+                gradient = jacobian.T.dot(self.weights * residual)
+                while damping < 1e8:
+                    damped = normal + damping * np.diag(np.diag(normal)) + 1e-12 * np.eye(len(parameters))
+                    step = -np.linalg.lstsq(damped, gradient, rcond=None)[0]
+                    candidate = np.clip(parameters + step, self.lower_bounds, self.upper_bounds)
+                    candidate_residual = self.residual(candidate)
+                    candidate_cost = self._cost(candidate_residual)
+                    if candidate_cost < cost:
+                        damping = max(damping / 3.0, 1e-9)
+                        break
+                    damping *= 4.0
+                else:
+                    break
+                improvement = (cost - candidate_cost) / cost
+                parameters, residual, cost = candidate, candidate_residual, candidate_cost
+                history.append(self._history_row(iteration, parameters, residual, cost))
+                if improvement < tolerance:
+                    break
+        finally:
+            if self._pool is not None:
+                self._pool.close()
+                self._pool.join()
+                self._pool = None
+
+        import pandas as pd
+
+        return LearningResult(tuple(parameters), residual, cost, pd.DataFrame(history))
+
+    def _cost(self, residual):
+        weighted = self.weights * residual
+        return weighted.dot(weighted)
+
+    def _history_row(self, iteration, parameters, residual, cost):
+        row = OrderedDict([('iteration', iteration), ('cost', cost)])
+        row.update(zip(LEARNED_PARAMETERS, parameters))
+        row['position_error'] = np.linalg.norm(residual[:3])
+        row['velocity_error'] = np.linalg.norm(residual[3:6])
+        row['attitude_error'] = np.linalg.norm(residual[6:9])
+        return row
+
+    def _cached_prefix(self, sections):
+        """Starting time, state and index of the first section not cached"""
+        keys = tuple(_section_key(section) for section in sections)
+        for start in range(len(keys), 0, -1):
+            cached = self._prefixes.get(keys[:start])
+            if cached is not None:
+                self._prefixes.move_to_end(keys[:start])
+                return cached[0], cached[1], start
+        return 0, np.zeros(12), 0
+
+    def _store(self, key, t_start, state):
+        self._prefixes[key] = (t_start, state)
+        self._prefixes.move_to_end(key)
+        while len(self._prefixes) > self.cache_size:
+            self._prefixes.popitem(last=False)
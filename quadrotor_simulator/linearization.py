@@ -0,0 +1,249 @@
+# -*- coding: utf-8 -*-
+#       __LINEARIZATION__
+#       This file implements the analytic Jacobians of
+#       the quadrotor dynamics and their hover trim points
+#
+#       Every function is vectorized: the leading dimensions of the states
+#       or angles are batch dimensions, a single operating point gives
+#       plain (12, 12) and (12, 4) matrices. The inputs are ordered as
+#       [total_thrust, dp/dt, dq/dt, dr/dt].
+
+from collections import namedtuple
+
+import numpy as np
+
+LinearModel = namedtuple('LinearModel', ['state', 'inputs', 'state_dot', 'A', 'B'])
+LinearModel.__doc__ = """Dynamics linearized around an operating point
+
+state_dot + A (state' - state) + B (inputs' - inputs) approximates the rates
+of state' under inputs'.
+
+state : numpy.array
+    (12,) state of the operating point
+inputs : numpy.array
+    (4,) [total_thrust, dp/dt, dq/dt, dr/dt]
+state_dot : numpy.array
+    (12,) rates at the operating point, zero but for the position rates at
+    a trim point
+A, B : numpy.array
+    (12, 12) and (12, 4) Jacobians with respect to the state and the inputs
+"""
+
+
+def _trigonometry(phi, theta, psi):
+    return np.cos(phi), np.sin(phi), np.cos(theta), np.sin(theta), np.cos(psi), np.sin(psi)
+
+
+def _cross_gains(inertia):
+    """k such that cross(J omega, I omega) = k * [q r, r p, p q], J the inverse inertia"""
+    (ixx, iyy, izz) = inertia
+    return np.array([izz / iyy - iyy / izz, ixx / izz - izz / ixx, iyy / ixx - ixx / iyy])
+
+
+def _cross_jacobian(angular_vel, inertia):
+    """(..., 3, 3) Jacobian of cross(J omega, I omega) with respect to omega"""
+    angular_vel = np.asarray(angular_vel, dtype=float)
+    p, q, r = angular_vel[..., 0], angular_vel[..., 1], angular_vel[..., 2]
+    k = _cross_gains(inertia)
+    jacobian = np.zeros(angular_vel.shape[:-1] + (3, 3))
+    jacobian[..., 0, 1] = k[0] * r
+    jacobian[..., 0, 2] = k[0] * q
+    jacobian[..., 1, 0] = k[1] * r
+    jacobian[..., 1, 2] = k[1] * p
+    jacobian[..., 2, 0] = k[2] * q
+    jacobian[..., 2, 1] = k[2] * p
+    return jacobian
+
+
+def moments_jacobian(angular_vel, inertia):
+    """Jacobian of ``moments`` with respect to the angular velocity
+
+    The Jacobian with respect to the desired angular acceleration is the
+    constant inertia matrix.
+
+    Parameters
+    ----------
+    angular_vel : numpy.array
+        (..., 3) angular velocities [p, q, r]
+    inertia : numpy.array
+        Diagonal of the inertia matrix [Ixx, Iyy, Izz]
+
+    Returns
+    -------
+    numpy.array
+        (..., 3, 3) d[Mp, Mq, Mr] / d[p, q, r]
+    """
+    return np.asarray(inertia, dtype=float)[:, np.newaxis] * _cross_jacobian(angular_vel, inertia)
+
+
+def rotation_matrix_jacobian(phi, theta, psi):
+    """Derivatives of ``rotation_matrix``
+
+    Returns
+    -------
+    numpy.array
+        (..., 3, 3, 3) array whose [..., i, j, k] element is the derivative
+        of the (i, j) element with respect to the k-th angle of [phi, theta, psi]
+    """
+    cphi, sphi, cthe, sthe, cpsi, spsi = _trigonometry(phi, theta, psi)
+    jacobian = np.zeros(np.shape(phi) + (3, 3, 3))
+    # phi
+    jacobian[..., 0, 1, 0] = cphi * sthe * cpsi + sphi * spsi
+    jacobian[..., 0, 2, 0] = -sphi * sthe * cpsi + cphi * spsi
+    jacobian[..., 1, 1, 0] = cphi * sthe * spsi - sphi * cpsi
+    jacobian[..., 1, 2, 0] = -sphi * sthe * spsi - cphi * cpsi
+    jacobian[..., 2, 1, 0] = cthe * cphi
+    jacobian[..., 2, 2, 0] = -cthe * sphi
+    # theta
+    jacobian[..., 0, 0, 1] = -sthe * cpsi
+    jacobian[..., 0, 1, 1] = sphi * cthe * cpsi
+    jacobian[..., 0, 2, 1] = cphi * cthe * cpsi
+    jacobian[..., 1, 0, 1] = -sthe * spsi
+    jacobian[..., 1, 1, 1] = sphi * cthe * spsi
+    jacobian[..., 1, 2, 1] = cphi * cthe * spsi
+    jacobian[..., 2, 0, 1] = -cthe
+    jacobian[..., 2, 1, 1] = -sthe * sphi
+    jacobian[..., 2, 2, 1] = -sthe * cphi
+    # psi
+    jacobian[..., 0, 0, 2] = -cthe * spsi
+    jacobian[..., 0, 1, 2] = -sphi * sthe * spsi - cphi * cpsi
+    jacobian[..., 0, 2, 2] = -cphi * sthe * spsi + sphi * cpsi
+    jacobian[..., 1, 0, 2] = cthe * cpsi
+    jacobian[..., 1, 1, 2] = sphi * sthe * cpsi - cphi * spsi
+    jacobian[..., 1, 2, 2] = cphi * sthe * cpsi + sphi * spsi
+    return jacobian
+
+
+def angular_rotation_matrix_jacobian(phi, theta, psi):
+    """Derivatives of ``angular_rotation_matrix``, laid out as rotation_matrix_jacobian"""
+    cphi, sphi, cthe, sthe, _, _ = _trigonometry(phi, theta, psi)
+    jacobian = np.zeros(np.shape(phi) + (3, 3, 3))
+    jacobian[..., 1, 1, 0] = -sphi
+    jacobian[..., 1, 2, 0] = cthe * cphi
+    jacobian[..., 2, 1, 0] = -cphi
+    jacobian[..., 2, 2, 0] = -cthe * sphi
+    jacobian[..., 0, 2, 1] = -cthe
+    jacobian[..., 1, 2, 1] = -sthe * sphi
+    jacobian[..., 2, 2, 1] = -sthe * cphi
+    return jacobian
+
+
+def angular_acceleration_jacobian(angular_vel, vehicle):
+    """Jacobians of ``QuadrotorDynamics.angular_acceleration``
+
+    Parameters
+    ----------
+    angular_vel : numpy.array
+        (..., 3) angular velocities [p, q, r]
+    vehicle : VehicleParams
+        Constants of the vehicle
+
+    Returns
+    -------
+    tuple of numpy.array
+        (3, 4) Jacobian with respect to the motor thrusts [T1, T2, T3, T4]
+        and (..., 3, 3) Jacobian with respect to [p, q, r] at fixed thrusts
+    """
+    thrust_jacobian = vehicle.inverse_inertia[:, np.newaxis] * vehicle.mixer[1:]
+    return thrust_jacobian, -_cross_jacobian(angular_vel, vehicle.inertia)
+
+
+def state_jacobian(states, total_thrust, desired_angular_acc, vehicle):
+    """Jacobians of ``state_derivative``
+
+    Composed from the Jacobians of the moments, the mixer, the rotation
+    matrices and the angular acceleration, so that they follow the same
+    equations as the right-hand side.
+
+    Parameters
+    ----------
+    states : numpy.array
+        (..., 12) states [x, y, z, x_dot, y_dot, z_dot, phi, theta, psi, p, q, r]
+    total_thrust : float or numpy.array
+        (...) total thrusts
+    desired_angular_acc : numpy.array
+        (..., 3) desired angular accelerations
+    vehicle : VehicleParams
+        Constants of the vehicle
+
+    Returns
+    -------
+    tuple of numpy.array
+        (..., 12, 12) Jacobian A with respect to the state and (..., 12, 4)
+        Jacobian B with respect to [total_thrust, dp/dt, dq/dt, dr/dt]
+    """
+    states = np.asarray(states, dtype=float)
+    shape = states.shape[:-1]
+    phi, theta, psi = states[..., 6], states[..., 7], states[..., 8]
+    omega = states[..., 9:12]
+    p, q, r = omega[..., 0], omega[..., 1], omega[..., 2]
+    A = np.zeros(shape + (12, 12))
+    B = np.zeros(shape + (12, 4))
+    A[..., 0:3, 3:6] = np.eye(3)
+
+    # moments and motor thrusts
+    k = _cross_gains(vehicle.inertia)
+    commands = np.empty(shape + (4,))
+    commands[..., 0] = total_thrust
+    commands[..., 1:] = vehicle.inertia * (np.asarray(desired_angular_acc, dtype=float) +
+                                           k * np.stack((q * r, r * p, p * q), axis=-1))
+    thrust_omega = np.matmul(vehicle.inverse_mixer[:, 1:], moments_jacobian(omega, vehicle.inertia))
+    thrust_inputs = vehicle.inverse_mixer * np.concatenate(([1.0], vehicle.inertia))
+
+    # acceleration, only the last column of the rotation matrix is needed
+    cphi, sphi, cthe, sthe, cpsi, spsi = _trigonometry(phi, theta, psi)
+    column = np.stack((cphi * sthe * cpsi + sphi * spsi, cphi * sthe * spsi - sphi * cpsi, cthe * cphi), axis=-1)
+    force_z_body = np.dot(commands, vehicle.inverse_mixer.sum(axis=0))[..., np.newaxis, np.newaxis] / vehicle.mass
+    A[..., 3:6, 6:9] = rotation_matrix_jacobian(phi, theta, psi)[..., :, 2, :] * force_z_body
+    A[..., 3:6, 9:12] = column[..., :, np.newaxis] * (thrust_omega.sum(axis=-2) / vehicle.mass)[..., np.newaxis, :]
+    B[..., 3:6, :] = column[..., :, np.newaxis] * (thrust_inputs.sum(axis=0) / vehicle.mass)
+
+    # Euler rates W^-1 omega, W the angular_rotation_matrix
+    W = np.zeros(shape + (3, 3))
+    W[..., 0, 0] = 1
+    W[..., 0, 2] = -sthe
+    W[..., 1, 1] = cphi
+    W[..., 1, 2] = cthe * sphi
+    W[..., 2, 1] = -sphi
+    W[..., 2, 2] = cthe * cphi
+    inverse_W = np.linalg.inv(W)
+    rates = np.matmul(inverse_W, omega[..., np.newaxis])[..., 0]
+    A[..., 6:9, 6:9] = -np.einsum('...ij,...jlk,...l->...ik', inverse_W,
+                                  angular_rotation_matrix_jacobian(phi, theta, psi), rates)
+    A[..., 6:9, 9:12] = inverse_W
+
+    # angular acceleration
+    acc_thrust, acc_omega = angular_acceleration_jacobian(omega, vehicle)
+    A[..., 9:12, 9:12] = np.matmul(acc_thrust, thrust_omega) + acc_omega
+    B[..., 9:12, :] = np.dot(acc_thrust, thrust_inputs)
+    return A, B
+
+
+def hover_trim(vehicle, position=None, velocity=None, psi=0.0):
+    """Operating point holding the attitude, the body rates and the velocity
+
+    The model has no drag: the vehicle is level, the rotors carry its
+    weight and any constant velocity is a trim point.
+
+    Parameters
+    ----------
+    vehicle : VehicleParams
+        Constants of the vehicle
+    position, velocity : numpy.array, optional
+        [x, y, z] and [x_dot, y_dot, z_dot], zero by default
+    psi : float
+        Heading [rad]
+
+    Returns
+    -------
+    tuple of numpy.array
+        (12,) state and (4,) inputs [total_thrust, dp/dt, dq/dt, dr/dt]
+    """
+    state = np.zeros(12)
+    if position is not None:
+        state[0:3] = position
+    if velocity is not None:
+        state[3:6] = velocity
+    state[8] = psi
+    inputs = np.array([vehicle.mass * vehicle.gravity, 0.0, 0.0, 0.0])
+    return state, inputs
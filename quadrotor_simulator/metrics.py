@@ -0,0 +1,172 @@
+# -*- coding: utf-8 -*-
+#       __METRICS__
+#       This file implements the metrics derived from
+#       simulated trajectories, on raw arrays
+#
+#       Trajectories are the (T, 19) rows of df_state_history: the state, the
+#       motor thrusts and the desired angular accelerations, or (N, T, 19)
+#       batches of them. compute_metrics reduces whole trajectories and
+#       MetricsAccumulator the same rows chunk by chunk while simulating.
+
+import numpy as np
+
+# rotation_phi, rotation_theta, rotation_psi: change of the Euler angles from
+#     the first to the last sample [rad]
+# peak_p, peak_q, peak_r: largest absolute body rates [rad/s]
+# saturation_time_1..4: time each motor thrust spends outside the thrust
+#     limits [s], a sample counting until the next one
+# altitude_loss: largest drop of z below its first value [m]
+# position_error, velocity_error, attitude_error: norms of the last state
+#     minus the target, the attitude wrapped so that full turns do not count
+METRICS = ('rotation_phi', 'rotation_theta', 'rotation_psi', 'peak_p', 'peak_q', 'peak_r', 'saturation_time_1',
+           'saturation_time_2', 'saturation_time_3', 'saturation_time_4', 'altitude_loss', 'position_error',
+           'velocity_error', 'attitude_error')
+
+# Columns of METRICS
+ROTATION = slice(0, 3)
+PEAK_RATES = slice(3, 6)
+SATURATION_TIME = slice(6, 10)
+ALTITUDE_LOSS = 10
+FINAL_ERRORS = slice(11, 14)
+
+
+def _saturated(thrusts, thrust_limits):
+    low, high = thrust_limits
+    return (thrusts < low) | (thrusts > high)
+
+
+def _finish(first, last, peak_rates, saturation_time, min_z, target):
+    """METRICS of (..., 19) first and last rows and the accumulated reductions"""
+    metrics = np.empty(first.shape[:-1] + (len(METRICS),))
+    metrics[..., ROTATION] = last[..., 6:9] - first[..., 6:9]
+    metrics[..., PEAK_RATES] = peak_rates
+    metrics[..., SATURATION_TIME] = saturation_time
+    metrics[..., ALTITUDE_LOSS] = np.maximum(first[..., 2] - min_z, 0.0)
+    target = first[..., :12] if target is None else np.asarray(target, dtype=float)
+    error = last[..., :12] - target
+    attitude = (error[..., 6:9] + np.pi) % (2 * np.pi) - np.pi
+    metrics[..., 11] = np.linalg.norm(error[..., 0:3], axis=-1)
+    metrics[..., 12] = np.linalg.norm(error[..., 3:6], axis=-1)
+    metrics[..., 13] = np.linalg.norm(attitude, axis=-1)
+    return metrics
+
+
+def compute_metrics(rows, ts, lengths=None, target=None, thrust_limits=(0.0, np.inf)):
+    """METRICS of whole trajectories
+
+    Parameters
+    ----------
+    rows : numpy.array
+        (T, 19) rows of a trajectory or (N, T, 19) rows of N trajectories
+    ts : numpy.array
+        (T,) times shared by the trajectories or (N, T) times of each one
+    lengths : numpy.array, optional
+        (N,) number of valid samples of each trajectory, the following
+        ones are ignored, as returned by BatchQuadrotorDynamics.simulate
+    target : numpy.array, optional
+        (12,) or (N, 12) target of the final state, the first state by default
+    thrust_limits : tuple of float
+        Range of feasible motor thrusts [N]
+
+    Returns
+    -------
+    numpy.array
+        (len(METRICS),) or (N, len(METRICS)) metrics
+    """
+    rows = np.asarray(rows, dtype=float)
+    batched = rows.ndim == 3
+    if not batched:
+        rows = rows[np.newaxis]
+    n, length = rows.shape[:2]
+    ts = np.broadcast_to(np.asarray(ts, dtype=float), (n, length))
+    lengths = np.full(n, length) if lengths is None else np.asarray(lengths, dtype=np.int64)
+    valid = np.arange(length) < lengths[:, np.newaxis]
+
+    # Each sample counts until the next valid one, the times may repeat but not go back
+    weights = np.zeros((n, length))
+    weights[:, :-1] = np.maximum(np.diff(ts, axis=1), 0.0) * valid[:, 1:]
+    saturated = _saturated(rows[..., 12:16], thrust_limits)
+    saturation_time = (saturated * weights[..., np.newaxis]).sum(axis=1)
+
+    peak_rates = np.where(valid[..., np.newaxis], np.abs(rows[..., 9:12]), 0.0).max(axis=1)
+    min_z = np.where(valid, rows[..., 2], np.inf).min(axis=1)
+    last = rows[np.arange(n), lengths - 1]
+    metrics = _finish(rows[:, 0], last, peak_rates, saturation_time, min_z, target)
+    return metrics if batched else metrics[0]
+
+
+class MetricsAccumulator(object):
+    def __init__(self, target=None, thrust_limits=(0.0, np.inf)):
+        """Online compute_metrics, fed with the rows of a trajectory as they are simulated
+
+        Only the first and last rows and running reductions are kept, so
+        memory does not grow with the length of the trajectory. Rows may
+        hold a single trajectory, (k, 19), or a batch, (N, k, 19), sharing
+        the times of each chunk.
+
+        Parameters
+        ----------
+        target : numpy.array, optional
+            Target of the final state, see compute_metrics
+        thrust_limits : tuple of float
+            Range of feasible motor thrusts [N]
+
+        Attributes
+        ----------
+        n_samples : int
+            Number of samples accumulated
+        """
+        self.target = target
+        self.thrust_limits = thrust_limits
+        self.n_samples = 0
+        self._first = None
+        self._last = None
+        self._last_t = None
+        self._peak_rates = None
+        self._saturation_time = None
+        self._min_z = None
+
+    def update(self, ts, rows):
+        """Accumulate rows at times ts, samples not after the last accumulated time are skipped"""
+        ts = np.asarray(ts, dtype=float)
+        rows = np.asarray(rows, dtype=float)
+        if self._last_t is not None:
+            keep = ts > self._last_t
+            ts = ts[keep]
+            rows = rows[..., keep, :]
+        if not len(ts):
+            return
+        if self._first is None:
+            self._first = rows[..., 0, :].copy()
+            self._peak_rates = np.zeros(rows.shape[:-2] + (3,))
+            self._saturation_time = np.zeros(rows.shape[:-2] + (4,))
+            self._min_z = np.full(rows.shape[:-2], np.inf)
+            thrusts = rows[..., :-1, 12:16]
+            durations = np.diff(ts)
+        else:
+            # The last accumulated sample lasts until the first new one
+            thrusts = np.concatenate((self._last[..., np.newaxis, 12:16], rows[..., :-1, 12:16]), axis=-2)
+            durations = np.diff(ts, prepend=self._last_t)
+        saturated = _saturated(thrusts, self.thrust_limits)
+        self._saturation_time += (saturated * durations[:, np.newaxis]).sum(axis=-2)
+        self._peak_rates = np.maximum(self._peak_rates, np.abs(rows[..., 9:12]).max(axis=-2))
+        self._min_z = np.minimum(self._min_z, rows[..., 2].min(axis=-1))
+        self._last = rows[..., -1, :].copy()
+        self._last_t = ts[-1]
+        self.n_samples += len(ts)
+
+    def update_section(self, ts, states, total_thrust, desired_angular_acc, vehicle):
+        """Accumulate the samples of a section integrated with constant inputs"""
+        from quadrotor_simulator.batch import section_rows
+
+        self.update(ts, section_rows(states, total_thrust, desired_angular_acc, vehicle))
+
+    def result(self):
+        """METRICS of the rows accumulated so far"""
+        if self._first is None:
+            raise ValueError('No sample accumulated')
+        return _finish(self._first, self._last, self._peak_rates, self._saturation_time, self._min_z, self.target)
+
+    def to_dict(self):
+        """result as a {name: value} dict"""
+        return dict(zip(METRICS, self.result().T))
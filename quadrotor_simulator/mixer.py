@@ -0,0 +1,106 @@
+# -*- coding: utf-8 -*-
+#       __MIXER__
+#       This file implements the allocation between the
+#       rotor thrusts and the total thrust and moments
+
+import functools
+
+import numpy as np
+
+# Rotor angles from the body x axis [deg] and spin directions of each layout.
+# The '+' layout is the one of QuadrotorDynamics: rotor 1 on +x, rotor 2 on +y.
+LAYOUTS = {
+    '+': ((0, 90, 180, 270), (1, -1, 1, -1)),
+    'x': ((45, 135, 225, 315), (1, -1, 1, -1)),
+    'hexa': ((0, 60, 120, 180, 240, 300), (1, -1, 1, -1, 1, -1)),
+    'octo': ((0, 45, 90, 135, 180, 225, 270, 315), (1, -1, 1, -1, 1, -1, 1, -1)),
+}
+
+
+def _frozen(array):
+    array = np.array(array, dtype=float)
+    array.flags.writeable = False
+    return array
+
+
+class Mixer(object):
+    def __init__(self, angles, spins, length, thrust_to_drag, min_thrust=None, max_thrust=None):
+        """Allocation matrix of a rotor layout and its pseudo-inverse
+
+        The allocation matrix maps the rotor thrusts to [T, Mp, Mq, Mr]:
+        T = sum(t), Mp = length * sum(sin(a) t), Mq = -length * sum(cos(a) t)
+        and Mr = thrust_to_drag * sum(spin t).
+
+        Parameters
+        ----------
+        angles : sequence of float
+            Angle of each rotor arm from the body x axis [deg]
+        spins : sequence of int
+            Spin direction of each rotor, +1 or -1
+        length : float
+            Arm length [m]
+        thrust_to_drag : float
+            Thrust to drag constant [m]
+        min_thrust, max_thrust : float, optional
+            Saturation of each rotor applied by ``mix``
+        """
+        angles = np.radians(angles)
+        allocation = np.array([np.ones(len(angles)),
+                               length * np.sin(angles),
+                               -length * np.cos(angles),
+                               thrust_to_drag * np.asarray(spins, dtype=float)])
+        # Remove the rounding of sin(pi) and cos(pi/2)
+        allocation[np.abs(allocation) < 1e-12 * max(1, length)] = 0
+        self.allocation = _frozen(allocation)
+        self.pseudo_inverse = _frozen(np.linalg.pinv(allocation))
+        self.n_rotors = len(angles)
+        self.min_thrust = min_thrust
+        self.max_thrust = max_thrust
+
+    @classmethod
+    def from_layout(cls, layout, length, thrust_to_drag, min_thrust=None, max_thrust=None):
+        """Mixer of one of LAYOUTS"""
+        if layout not in LAYOUTS:
+            raise ValueError('Unknown layout {!r}, expected one of {}'.format(layout, ', '.join(sorted(LAYOUTS))))
+        angles, spins = LAYOUTS[layout]
+        return cls(angles, spins, length, thrust_to_drag, min_thrust, max_thrust)
+
+    def mix(self, commands, clip=True):
+        """Rotor thrusts of a batch of commands in one matmul
+
+        Parameters
+        ----------
+        commands : numpy.array
+            (..., 4) commands [T, Mp, Mq, Mr]
+        clip : bool
+            Clip the thrusts to [min_thrust, max_thrust]
+
+        Returns
+        -------
+        numpy.array
+            (..., n_rotors) rotor thrusts
+        """
+        thrusts = np.dot(commands, self.pseudo_inverse.T)
+        if clip and (self.min_thrust is not None or self.max_thrust is not None):
+            np.clip(thrusts, self.min_thrust, self.max_thrust, out=thrusts)
+        return thrusts
+
+    def saturation(self, commands):
+        """(..., n_rotors) mask of the rotors clipped by ``mix``"""
+        thrusts = self.mix(commands, clip=False)
+        saturated = np.zeros(thrusts.shape, dtype=bool)
+        if self.min_thrust is not None:
+            saturated |= thrusts < self.min_thrust
+        if self.max_thrust is not None:
+            saturated |= thrusts > self.max_thrust
+        return saturated
+
+    def wrench(self, thrusts):
+        """(..., 4) total thrust and moments [T, Mp, Mq, Mr] of (..., n_rotors) thrusts"""
+        return np.dot(thrusts, self.allocation.T)
+
+
+@functools.lru_cache(maxsize=64)
+def get_mixer(layout, length, thrust_to_drag):
+    """Cached unsaturated Mixer, for callers that only have a config"""
+    return Mixer.from_layout(layout, length, thrust_to_drag)
@@ -5,12 +5,32 @@
 #
 #       Largely based on the work of https://github.com/nikhilkalige
 
+import math
+from collections import OrderedDict, namedtuple
+
 import numpy as np
-import pandas as pd
-from scipy.integrate import odeint
+from quadrotor_simulator import instrumentation
+from quadrotor_simulator.attitude import euler_to_quaternion, quaternion_to_euler
+from quadrotor_simulator.events import DenseTrajectory
+from quadrotor_simulator.instrumentation import SimulationStats
+from quadrotor_simulator.integrators import CompiledIntegrator, SemiImplicitEulerIntegrator, get_integrator
+from quadrotor_simulator.linearization import LinearModel, hover_trim, state_jacobian
+from quadrotor_simulator.metrics import MetricsAccumulator
+from quadrotor_simulator.mixer import get_mixer
+from quadrotor_simulator.recorder import StateRecorder, column_index
+from quadrotor_simulator.section_cache import SectionEntry
+from quadrotor_simulator.state_bus import StatePublisher
+from quadrotor_simulator.trajectory_io import TrajectoryWriter
+from quadrotor_simulator.vehicle import VehicleConfig, VehicleParams
+
+# Rate [s^-1] at which quaternion_state_derivative pulls the quaternion norm back to 1
+QUATERNION_NORM_GAIN = 10.0
 
+# Number of operating points whose LinearModel QuadrotorDynamics.linearize keeps
+LINEAR_MODEL_CACHE_SIZE = 128
 
-def moments(ref_acc, angular_vel, inertia_matrix):
+
+def moments(ref_acc, angular_vel, inertia_matrix, inverse_inertia_matrix=None):
     """Compute the moments
 
     Parameters
@@ -21,13 +41,19 @@ def moments(ref_acc, angular_vel, inertia_matrix):
     angular_vel : numpy.array
         The current angular velocity of the system. This
         should be of form [p, q, r]
+    inertia_matrix : numpy.array
+        The 3x3 inertia matrix
+    inverse_inertia_matrix : numpy.array, optional
+        Its precomputed inverse, see VehicleParams
 
     Returns
     -------
     numpy.array
         The desired moments of the system
     """
-    inverse_inertia = np.linalg.inv(inertia_matrix)
+    if inverse_inertia_matrix is None:
+        inverse_inertia_matrix = np.linalg.inv(inertia_matrix)
+    inverse_inertia = inverse_inertia_matrix
     p1 = np.dot(inverse_inertia, angular_vel)
     p2 = np.dot(inertia_matrix, angular_vel)
     cross = np.cross(p1, p2)
@@ -46,16 +72,17 @@ def angular_velocity_to_dt_eulerangles(angular_rotation_matrix, angular_vel):
 def angular_rotation_matrix(phi, theta, psi):
     """Rotation matix for Angular Velocity <-> Euler Angles Conversion
     Use inverse of the matrix to convert from angular velocity to euler rates
+
+    The body rates of the ZYX Euler rates, [p, q, r] = W [phi_dot,
+    theta_dot, psi_dot], which does not depend on psi.
     """
     cphi = np.cos(phi)
     sphi = np.sin(phi)
     cthe = np.cos(theta)
     sthe = np.sin(theta)
-    cpsi = np.cos(psi)
-    spsi = np.sin(psi)
     RotMatAngV = np.array([[1, 0, -sthe],
                            [0, cphi, cthe * sphi],
-                           [0, -spsi, cthe * cphi]
+                           [0, -sphi, cthe * cphi]
                            ])
     return RotMatAngV
 
@@ -90,78 +117,332 @@ def motor_thrust(config, moments, total_thrust):
         The thrust generated by each motor [T1, T2, T3, T4]
     """
     [Mp, Mq, Mr] = moments
-    thrust = np.zeros(4)
-    tmp1add = total_thrust + Mr / config['thrustToDrag']
-    tmp1sub = total_thrust - Mr / config['thrustToDrag']
+    mixer = get_mixer('+', float(config['length']), float(config['thrustToDrag']))
+    return mixer.mix([total_thrust, Mp, Mq, Mr])
+
+
+def state_derivative(state, total_thrust, desired_angular_acc, vehicle, row=None):
+    """Right-hand side of the quadrotor dynamics on plain arrays
+
+    Same equations as ``moments``, ``motor_thrust``, ``rotation_matrix``,
+    ``angular_rotation_matrix`` and ``QuadrotorDynamics.angular_acceleration``
+    but evaluated with scalar arithmetic, sharing the trigonometric terms and
+    without any DataFrame.
+
+    Parameters
+    ----------
+    state : numpy.array
+        System State: [x, y, z, x_dot, y_dot, z_dot, phi, theta, psi, p, q, r]
+    total_thrust : float
+        The total thrust generated by all motors
+    desired_angular_acc : numpy.array
+        The desired angular acceleration [dp/dt, dq/dt, dr/dt]
+    vehicle : VehicleParams
+        Constants of the vehicle, see ``QuadrotorDynamics.vehicle``
+    row : numpy.array, optional
+        Buffer of 19 elements filled with [state, thrust, desired_angular_acc]
+
+    Returns
+    -------
+    numpy.array
+        Rates of the input state:
+        [x_dot, y_dot, z_dot, xd_dot, yd_dot, zd_dot, phi_dot, theta_dot, psi_dot, p_dot, q_dot, r_dot]
+    """
+    (x, y, z, vx, vy, vz, phi, theta, psi, p, q, r) = state.tolist()
+    (ixx, iyy, izz) = vehicle.inertia.tolist()
+    (jxx, jyy, jzz) = vehicle.inverse_inertia.tolist()
+    (dp, dq, dr) = desired_angular_acc
+    length = vehicle.length
+    thrust_to_drag = vehicle.thrust_to_drag
+
+    # moments
+    a0, a1, a2 = jxx * p, jyy * q, jzz * r
+    b0, b1, b2 = ixx * p, iyy * q, izz * r
+    m_p = ixx * (dp + (a1 * b2 - a2 * b1))
+    m_q = iyy * (dq + (a2 * b0 - a0 * b2))
+    m_r = izz * (dr + (a0 * b1 - a1 * b0))
+
+    # motor_thrust
+    tmp1add = total_thrust + m_r / thrust_to_drag
+    tmp1sub = total_thrust - m_r / thrust_to_drag
+    tmp2p = 2 * m_p / length
+    tmp2q = 2 * m_q / length
+    t1 = (tmp1add - tmp2q) / 4.0
+    t2 = (tmp1sub + tmp2p) / 4.0
+    t3 = (tmp1add + tmp2q) / 4.0
+    t4 = (tmp1sub - tmp2p) / 4.0
+
+    cphi = math.cos(phi)
+    sphi = math.sin(phi)
+    cthe = math.cos(theta)
+    sthe = math.sin(theta)
+    cpsi = math.cos(psi)
+    spsi = math.sin(psi)
+
+    # acceleration, only the last column of the rotation matrix is needed
+    force_z_body = (((t1 + t2) + t3) + t4) / vehicle.mass
+    ax = (cphi * sthe * cpsi + sphi * spsi) * force_z_body
+    ay = (cphi * sthe * spsi - sphi * cpsi) * force_z_body
+    az = (cthe * cphi) * force_z_body - vehicle.gravity
+
+    # angular_velocity_to_dt_eulerangles, closed form inverse of angular_rotation_matrix
+    det = cphi * cthe * cphi + cthe * sphi * sphi
+    theta_dot = (cthe * cphi * q - cthe * sphi * r) / det
+    psi_dot = (sphi * q + cphi * r) / det
+    phi_dot = p + sthe * psi_dot
+
+    # angular_acceleration
+    p_dot = jxx * (length * (t2 - t4)) - (a1 * b2 - a2 * b1)
+    q_dot = jyy * (length * (t3 - t1)) - (a2 * b0 - a0 * b2)
+    r_dot = jzz * (thrust_to_drag * (t1 - t2 + t3 - t4)) - (a0 * b1 - a1 * b0)
+
+    if row is not None:
+        row[:12] = state
+        row[12:16] = (t1, t2, t3, t4)
+        row[16:19] = desired_angular_acc
+
+    return np.array([vx, vy, vz, ax, ay, az, phi_dot, theta_dot, psi_dot, p_dot, q_dot, r_dot])
+
+
+def quaternion_state_derivative(state, total_thrust, desired_angular_acc, vehicle, row=None):
+    """Right-hand side of the dynamics with a quaternion attitude
+
+    Same forces and moments as ``state_derivative``, the attitude is the
+    quaternion [qw, qx, qy, qz] rotating the body frame to the world frame
+    as ``rotation_matrix`` does, so there is neither a trigonometric
+    function nor a singularity. A term proportional to 1 - |q|^2 keeps the
+    quaternion on the unit sphere.
+
+    Parameters
+    ----------
+    state : numpy.array
+        [x, y, z, x_dot, y_dot, z_dot, qw, qx, qy, qz, p, q, r]
+    row : numpy.array, optional
+        Buffer of 20 elements filled with [state, thrust, desired_angular_acc]
+
+    Returns
+    -------
+    numpy.array
+        Rates of the input state
+    """
+    (x, y, z, vx, vy, vz, qw, qx, qy, qz, p, q, r) = state.tolist()
+    (ixx, iyy, izz) = vehicle.inertia.tolist()
+    (jxx, jyy, jzz) = vehicle.inverse_inertia.tolist()
+    (dp, dq, dr) = desired_angular_acc
+    length = vehicle.length
+    thrust_to_drag = vehicle.thrust_to_drag
+
+    # moments
+    a0, a1, a2 = jxx * p, jyy * q, jzz * r
+    b0, b1, b2 = ixx * p, iyy * q, izz * r
+    m_p = ixx * (dp + (a1 * b2 - a2 * b1))
+    m_q = iyy * (dq + (a2 * b0 - a0 * b2))
+    m_r = izz * (dr + (a0 * b1 - a1 * b0))
+
+    # motor_thrust
+    tmp1add = total_thrust + m_r / thrust_to_drag
+    tmp1sub = total_thrust - m_r / thrust_to_drag
+    tmp2p = 2 * m_p / length
+    tmp2q = 2 * m_q / length
+    t1 = (tmp1add - tmp2q) / 4.0
+    t2 = (tmp1sub + tmp2p) / 4.0
+    t3 = (tmp1add + tmp2q) / 4.0
+    t4 = (tmp1sub - tmp2p) / 4.0
+
+    # acceleration, last column of the rotation matrix of the normalized quaternion
+    norm2 = qw * qw + qx * qx + qy * qy + qz * qz
+    force_z_body = (((t1 + t2) + t3) + t4) / (vehicle.mass * norm2)
+    ax = 2 * (qx * qz + qw * qy) * force_z_body
+    ay = 2 * (qy * qz - qw * qx) * force_z_body
+    az = (qw * qw - qx * qx - qy * qy + qz * qz) * force_z_body - vehicle.gravity
+
+    # quaternion kinematics, q * [0, p, q, r] / 2
+    k = QUATERNION_NORM_GAIN * (1.0 - norm2)
+    qw_dot = 0.5 * (-qx * p - qy * q - qz * r) + k * qw
+    qx_dot = 0.5 * (qw * p + qy * r - qz * q) + k * qx
+    qy_dot = 0.5 * (qw * q + qz * p - qx * r) + k * qy
+    qz_dot = 0.5 * (qw * r + qx * q - qy * p) + k * qz
+
+    # angular_acceleration
+    p_dot = jxx * (length * (t2 - t4)) - (a1 * b2 - a2 * b1)
+    q_dot = jyy * (length * (t3 - t1)) - (a2 * b0 - a0 * b2)
+    r_dot = jzz * (thrust_to_drag * (t1 - t2 + t3 - t4)) - (a0 * b1 - a1 * b0)
+
+    if row is not None:
+        row[:13] = state
+        row[13:17] = (t1, t2, t3, t4)
+        row[17:20] = desired_angular_acc
+
+    return np.array([vx, vy, vz, ax, ay, az, qw_dot, qx_dot, qy_dot, qz_dot, p_dot, q_dot, r_dot])
+
+
+def default_config():
+    """Default vehicle configuration, a new dict on each call"""
+    return {
+        # Define constants
+        'gravity': 9.81,  # Earth gravity [m s^-2]
+        # Define Vehicle Parameters
+        'mass': 1,  # Mass [kg]
+        'length': 0.2,  # Arm length [m]
+        # Cross-Intertia [Ixx, Iyy, Izz]
+        'inertia': np.array([0.0053, 0.0053, 0.0086]),  # [kg m^2]
+        'thrustToDrag': 0.018  # thrust to drag constant [m]
+    }
+
+
+StateSample = namedtuple('StateSample', ['t', 'state'])
 
-    tmp2p = 2 * Mp / config['length']
-    tmp2q = 2 * Mq / config['length']
+# Column schemas of df_state, df_state_history and df_current_state_dot as (variable, axis) pairs,
+# see recorder.column_index for their pandas.MultiIndex
+STATE_COLUMNS = tuple(zip(
+    ['position', 'position', 'position', 'velocity', 'velocity', 'velocity', 'orientation', 'orientation',
+     'orientation', 'omega', 'omega', 'omega'],
+    ['x', 'y', 'z', 'x', 'y', 'z', 'phi', 'theta', 'psi', 'phi_dot', 'theta_dot', 'psi_dot']
+))
 
-    thrust[0] = tmp1add - tmp2q
-    thrust[1] = tmp1sub + tmp2p
-    thrust[2] = tmp1add + tmp2q
-    thrust[3] = tmp1sub - tmp2p
+STATE_HISTORY_COLUMNS = STATE_COLUMNS + tuple(zip(
+    ['thrust', 'thrust', 'thrust', 'thrust', 'desired_angular_acc', 'desired_angular_acc', 'desired_angular_acc'],
+    ['1', '2', '3', '4', 'dp/dt', 'dq/dt', 'dr/dt']
+))
 
-    return thrust / 4.0
+STATE_DOT_COLUMNS = tuple(zip(
+    ['velocity', 'velocity', 'velocity', 'acceleration', 'acceleration', 'acceleration', 'omega', 'omega',
+     'omega', 'omega_dot', 'omega_dot', 'omega_dot'],
+    ['x', 'y', 'z', 'x', 'y', 'z', 'phi_dot', 'theta_dot', 'psi_dot', 'phi_dot_dot', 'theta_dot_dot',
+     'psi_dot_dot']
+))
 
 
 class QuadrotorDynamics(object):
-    def __init__(self, save_state=True, config=None, dt=0.005):
+    def __init__(self, save_state=True, config=None, dt=0.005, max_history=None, integrator='odeint',
+                 section_cache=None, attitude='euler', analytic_jacobian=False):
         """
         Quadrotor Dynamics Parameters
         ----------
         save_state: Boolean
             Decides whether the state of the system should be saved
             and returned at the end
+        max_history: int
+            When given, only the last max_history rows of df_state and
+            df_state_history are kept so memory stays bounded on long flights
+        integrator: str or Integrator
+            Integration scheme, 'odeint' (default), a solve_ivp method such
+            as 'RK45', or one of the fixed step schemes 'rk4', 'rk2' and
+            'semi_implicit_euler' taking exactly one step per dt. See
+            quadrotor_simulator.integrators
+        section_cache: SectionCache
+            When given, update_state replays the sections already integrated
+            from the same state, see quadrotor_simulator.section_cache
+        attitude: str
+            'euler' integrates the ZYX Euler angles, 'quaternion' integrates
+            a unit quaternion of the same rotation instead, which has no
+            singularity and no trigonometry per evaluation. The Euler angles of current_state,
+            df_state and df_state_history are then computed from it, at the
+            sampling times or when the DataFrames are built
+        analytic_jacobian: Boolean
+            Pass the analytic Jacobian of the dynamics to the integrator,
+            odeint's Dfun or the jac of the implicit solve_ivp methods, so
+            that stiff steps do not estimate it by finite differences. See
+            quadrotor_simulator.linearization. Euler attitude only
         """
-        self.config = {
-            # Define constants
-            'gravity': 9.81,  # Earth gravity [m s^-2]
-            # Define Vehicle Parameters
-            'mass': 1,  # Mass [kg]
-            'length': 0.2,  # Arm length [m]
-            # Cross-Intertia [Ixx, Iyy, Izz]
-            'inertia': np.array([0.0053, 0.0053, 0.0086]),  # [kg m^2]
-            'thrustToDrag': 0.018  # thrust to drag constant [m]
-        }
+        if attitude not in ('euler', 'quaternion'):
+            raise ValueError("attitude must be 'euler' or 'quaternion'")
+        self.config = default_config()
+        self._vehicle = None
 
         self.save_state = save_state
         self._dt = dt  # Simulation Step
+        self.integrator = get_integrator(integrator)
+        self.attitude = attitude
+        if attitude == 'quaternion' and isinstance(self.integrator, (CompiledIntegrator,
+                                                                     SemiImplicitEulerIntegrator)):
+            raise ValueError('The {} integrator only supports the euler attitude'.format(self.integrator.name))
+        if analytic_jacobian and attitude != 'euler':
+            raise ValueError('analytic_jacobian only supports the euler attitude')
+        self.analytic_jacobian = analytic_jacobian
+        # SimulationStats when instrumented, see enable_instrumentation
+        self.stats = None
+        self._section_stats = None
+        # TrajectoryWriter receiving every integrated section, see record_trajectory
+        self.trajectory_writer = None
+        # StatePublisher receiving every sample, see publish_states
+        self.state_publisher = None
+        # MetricsAccumulator receiving every sample, see track_metrics
+        self.metrics = None
+        self.section_cache = section_cache
         if config:
             self.config.update(config)
 
-        state_columns = pd.MultiIndex.from_tuples(list(zip(
-            ['position', 'position', 'position', 'velocity', 'velocity', 'velocity', 'orientation', 'orientation',
-             'orientation', 'omega', 'omega', 'omega'],
-            ['x', 'y', 'z', 'x', 'y', 'z', 'phi', 'theta', 'psi', 'phi_dot', 'theta_dot', 'psi_dot']
-        )), names=['variable', 'axis'])
-
-        self.df_state = pd.DataFrame(columns=state_columns)
-
-        state_columns = pd.MultiIndex.from_tuples(list(zip(
-            ['position', 'position', 'position', 'velocity', 'velocity', 'velocity', 'orientation', 'orientation',
-             'orientation', 'omega', 'omega', 'omega', 'thrust', 'thrust', 'thrust', 'thrust', 'desired_angular_acc',
-             'desired_angular_acc', 'desired_angular_acc'],
-            ['x', 'y', 'z', 'x', 'y', 'z', 'phi', 'theta', 'psi', 'phi_dot', 'theta_dot', 'psi_dot', '1', '2', '3', '4',
-             'dp/dt', 'dq/dt', 'dr/dt']
-        )), names=['variable', 'axis'])
-
-        self.df_current_state = pd.DataFrame(np.zeros((1, 19)),
-                                             columns=state_columns)
-        self.df_state_history = pd.DataFrame(columns=state_columns)
+        self._state_recorder = StateRecorder(STATE_COLUMNS, maxlen=max_history)
+        if attitude == 'quaternion':
+            # Rows hold the quaternion, converted when df_state_history is built
+            self._state_history_recorder = StateRecorder(STATE_HISTORY_COLUMNS, maxlen=max_history, width=20,
+                                                         transform=self._euler_rows)
+        else:
+            self._state_history_recorder = StateRecorder(STATE_HISTORY_COLUMNS, maxlen=max_history)
         self.t_start = 0
         self.current_state = np.zeros((12))
 
-        state_dot_columns = pd.MultiIndex.from_tuples(list(zip(
-            ['velocity', 'velocity', 'velocity', 'acceleration', 'acceleration', 'acceleration', 'omega', 'omega',
-             'omega', 'omega_dot', 'omega_dot', 'omega_dot'],
-            ['x', 'y', 'z', 'x', 'y', 'z', 'phi_dot', 'theta_dot', 'psi_dot', 'phi_dot_dot', 'theta_dot_dot',
-             'psi_dot_dot'])),
-            names=['variable', 'axis'])
+        # Scratch buffers of the last right-hand side evaluation:
+        # [state (12 or 13 with a quaternion), thrust (4), desired_angular_acc (3)] and its time
+        self._current_row = np.zeros(19 if attitude == 'euler' else 20)
+        self._current_t = 0
+        self.current_state_dot = np.zeros(12)
+        # Quaternion state integrated from current_state, while it is not replaced
+        self._quaternion_state = None
+        self._quaternion_source = None
+        # LinearModel of each operating point and the vehicle they were computed for, see linearize
+        self._linear_models = OrderedDict()
+        self._linear_models_vehicle = None
 
-        self.df_current_state_dot = pd.DataFrame(np.zeros((1, 12)),
-                                                 index=[0],
-                                                 columns=state_dot_columns)
+    @property
+    def df_state(self):
+        """States sampled every self._dt seconds, built from the recorder on access"""
+        return self._state_recorder.to_dataframe()
+
+    @property
+    def df_state_history(self):
+        """States seen by each evaluation of the integrator, built from the recorder on access"""
+        return self._state_history_recorder.to_dataframe()
+
+    @property
+    def config(self):
+        """Vehicle configuration, assigning to its keys invalidates self.vehicle"""
+        return self._config
+
+    @config.setter
+    def config(self, config):
+        self._config = VehicleConfig(config)
+
+    @property
+    def vehicle(self):
+        """VehicleParams derived from self.config, cached until the config is updated"""
+        if self._vehicle is None or self._vehicle_version != (id(self._config), self._config.version):
+            self._vehicle = VehicleParams.from_config(self._config)
+            self._vehicle_version = (id(self._config), self._config.version)
+        return self._vehicle
+
+    @property
+    def df_current_state(self):
+        """Last state seen by the integrator as a one row DataFrame"""
+        import pandas as pd
+
+        row = self._current_row[np.newaxis, :]
+        if self.attitude == 'quaternion':
+            row = self._euler_rows(row, reference=self.current_state[6:9])
+        return pd.DataFrame(row, index=[self._current_t], columns=column_index(STATE_HISTORY_COLUMNS))
+
+    @property
+    def df_current_state_dot(self):
+        """Last state derivative computed by the integrator as a one row DataFrame"""
+        import pandas as pd
+
+        state_dot = self.current_state_dot
+        if self.attitude == 'quaternion':
+            # Euler rates of the last evaluation
+            row = self._euler_rows(self._current_row[np.newaxis, :])[0]
+            state_dot = state_derivative(row[:12], row[12:16].sum(), row[16:19], self.vehicle)
+        return pd.DataFrame(state_dot[np.newaxis, :], index=[0], columns=column_index(STATE_DOT_COLUMNS))
 
     def motor_thrust(self, moments, total_thrust):
         """Compute Motor Thrusts
@@ -179,19 +460,7 @@ class QuadrotorDynamics(object):
             The thrust generated by each motor [T1, T2, T3, T4]
         """
         [Mp, Mq, Mr] = moments
-        thrust = np.zeros(4)
-        tmp1add = total_thrust + Mr / self.config['thrustToDrag']
-        tmp1sub = total_thrust - Mr / self.config['thrustToDrag']
-
-        tmp2p = 2 * Mp / self.config['length']
-        tmp2q = 2 * Mq / self.config['length']
-
-        thrust[0] = tmp1add - tmp2q
-        thrust[1] = tmp1sub + tmp2p
-        thrust[2] = tmp1add + tmp2q
-        thrust[3] = tmp1sub - tmp2p
-
-        return thrust / 4.0
+        return np.dot(self.vehicle.inverse_mixer, [total_thrust, Mp, Mq, Mr])
 
     def dt_eulerangles_to_angular_velocity(self, dtEuler, EulerAngles):
         """Euler angles derivatives TO angular velocities
@@ -203,21 +472,18 @@ class QuadrotorDynamics(object):
         """Compute the acceleration in inertial reference frame
         thrust = np.array([Motor1, .... Motor4])
         """
-        force_z_body = np.sum(thrusts) / self.config['mass']
+        force_z_body = np.sum(thrusts) / self.vehicle.mass
         rotation_mat = rotation_matrix(*df_state.orientation.values[0])
         force_body = np.array([0, 0, force_z_body])
-        return np.dot(rotation_mat, force_body) - np.array([0, 0, self.config['gravity']])
+        return np.dot(rotation_mat, force_body) - self.vehicle.gravity_vector
 
     def angular_acceleration(self, df_state, thrust):
         """Compute the angular acceleration in body frame
         omega = angular velocity :- np.array([p, q, r])
         """
-        [t1, t2, t3, t4] = thrust
-        thrust_matrix = np.array([self.config['length'] * (t2 - t4),
-                                  self.config['length'] * (t3 - t1),
-                                  self.config['thrustToDrag'] * (t1 - t2 + t3 - t4)])
+        thrust_matrix = np.dot(self.vehicle.mixer[1:], thrust)
 
-        inverse_inertia = np.linalg.inv(self.inertia_matrix)
+        inverse_inertia = self.vehicle.inverse_inertia_matrix
         p1 = np.dot(inverse_inertia, thrust_matrix)
         p2 = np.dot(inverse_inertia, df_state.omega.values[0])
         p3 = np.dot(self.inertia_matrix, df_state.omega.values[0])
@@ -225,14 +491,14 @@ class QuadrotorDynamics(object):
         return p1 - cross
 
     def moments(self, ref_acc, df_state):
-        return moments(ref_acc, df_state.omega.values[0], self.inertia_matrix)
+        return moments(ref_acc, df_state.omega.values[0], self.inertia_matrix, self.vehicle.inverse_inertia_matrix)
 
     def angular_rotation_matrix(self, df_state):
         return angular_rotation_matrix(*df_state.orientation.values[0])
 
     @property
     def inertia_matrix(self):
-        return np.diag(self.config['inertia'])
+        return self.vehicle.inertia_matrix
 
     def update_state(self, piecewise_args):
         """Run the state update equations for self._dt seconds
@@ -254,6 +520,28 @@ class QuadrotorDynamics(object):
             t: float
                 Time for which this section should run and should be atleast twice
                 self._dt
+
+        Returns
+        -------
+        pandas.DataFrame
+            self.df_state, None when save_state is off so that no DataFrame
+            is built, see run_sections
+        """
+        self.run_sections(piecewise_args)
+        return self.df_state if self.save_state else None
+
+    def run_sections(self, piecewise_args):
+        """Run the sections like update_state without building any DataFrame
+
+        Parameters
+        ----------
+        piecewise_args : array
+            The sections of the flight, see update_state
+
+        Returns
+        -------
+        numpy.array
+            The final state, also available as self.current_state
         """
         if self.save_state:
             overall_time = 0
@@ -268,24 +556,439 @@ class QuadrotorDynamics(object):
                 continue
 
             ts = np.arange(self.t_start, self.t_start + section.t, self._dt)
-
-            output = odeint(self._integrator, self.current_state, ts,
-                            args=(section.total_thrust, section.desired_angular_acc))
+            if self.section_cache is not None:
+                output = self._cached_section(ts, section.total_thrust, section.desired_angular_acc)
+            else:
+                output = self._integrate_section(ts, section.total_thrust, section.desired_angular_acc)
 
             if self.save_state:
                 # Final state update
-                self.df_state = self.df_state.append(pd.DataFrame(output, index=ts, columns=self.df_state.columns))
+                self._state_recorder.extend(ts, output)
+
+        return self.current_state
+
+    def step(self, total_thrust, desired_angular_acc):
+        """Advance the system by a single self._dt step
+
+        Parameters
+        ----------
+        total_thrust : float
+            The collective thrust generated by all motors
+        desired_angular_acc : numpy.array
+            The desired angular acceleration [dp/dt, dq/dt, dr/dt]
+
+        Returns
+        -------
+        numpy.array
+            The new state, also available as self.current_state
+        """
+        ts = np.array([self.t_start, self.t_start + self._dt])
+        output = self._integrate_section(ts, total_thrust, desired_angular_acc)
+
+        if self.save_state:
+            if not len(self._state_recorder):
+                self._state_recorder.append(ts[0], output[0])
+            self._state_recorder.append(ts[1], output[1])
+        return self.current_state
+
+    def stream(self, piecewise_args):
+        """Generator running the sections one self._dt step at a time
+
+        Sections are sampled on the same grid as update_state, but each
+        state is produced as soon as its step is integrated and the
+        boundary sample between two sections is yielded only once.
+
+        Parameters
+        ----------
+        piecewise_args : array
+            The sections of the flight, see update_state
+
+        Yields
+        ------
+        StateSample
+            The time and the state of each sample, starting with the current one
+        """
+        if self.save_state and not len(self._state_recorder):
+            self._state_recorder.append(self.t_start, self.current_state)
+        yield StateSample(self.t_start, self.current_state)
+        for section in piecewise_args:
+            if section.t < (2 * self._dt):
+                continue
+            ts = np.arange(self.t_start, self.t_start + section.t, self._dt)
+            for t in ts[1:]:
+                # Step to the sampling time so that the grid of update_state is kept
+                output = self._integrate_section(np.array([self.t_start, t]), section.total_thrust,
+                                                 section.desired_angular_acc)
+                if self.save_state:
+                    self._state_recorder.append(t, output[1])
+                yield StateSample(t, self.current_state)
+
+    def update_state_dense(self, piecewise_args, t_eval=None, events=(), method='RK45', **options):
+        """Integrate each section with dense output, detecting events
+
+        Unlike update_state, each section is integrated over its exact
+        duration with adaptive steps, no section is skipped, and states are
+        only interpolated at the requested times, once per time.
+
+        Parameters
+        ----------
+        piecewise_args : array
+            The sections of the flight, see update_state
+        t_eval : numpy.array, optional
+            Times at which states are interpolated and recorded in df_state,
+            none by default
+        events : list
+            Event instances, see quadrotor_simulator.events. A terminal
+            event stops the flight at its time
+        method : str
+            solve_ivp method producing the dense output
+        options :
+            Passed to scipy.integrate.solve_ivp, e.g. rtol and atol
+
+        Returns
+        -------
+        DenseTrajectory
+            The interpolated states, the fired events and the dense output
+            of every section
+        """
+        import pandas as pd
+        from scipy.integrate import solve_ivp
+
+        if self.attitude != 'euler':
+            raise ValueError('update_state_dense only supports the euler attitude')
+        events = list(events)
+        result = DenseTrajectory()
+        # Refresh the constants used by _integrator
+        self.vehicle
+        integrated = []
+        rows = []
+        for index, section in enumerate(piecewise_args):
+            if section.t <= 0:
+                continue
+            args = (section.total_thrust, section.desired_angular_acc)
+            solution = solve_ivp(lambda t, y: self._integrator(y, t, *args), (self.t_start, self.t_start + section.t),
+                                 self.current_state, method=method, dense_output=True, events=events or None,
+                                 **options)
+            if solution.status == -1:
+                raise RuntimeError(solution.message)
+            result.nfev += solution.nfev
+            result.solutions.append((self.t_start, solution.t[-1], solution.sol))
+            integrated.append(section)
+            for event, t_events, y_events in zip(events, solution.t_events or [], solution.y_events or []):
+                rows.extend([t, index, event.name] + list(y) for t, y in zip(t_events, y_events))
+            self.t_start = solution.t[-1]
+            self.current_state = solution.y[:, -1]
+            if solution.status == 1:
+                result.terminated = True
+                break
+
+        result.events = pd.DataFrame(rows, columns=result.events.columns).sort_values('t', kind='stable')
+        if t_eval is not None and result.solutions:
+            ts = np.asarray(t_eval, dtype=float)
+            ts = ts[(ts >= result.t_start - 1e-9) & (ts <= result.t_end + 1e-9)]
+            result.ts = ts
+            result.states = result(ts)
+            if self.save_state:
+                self._state_recorder.extend(result.ts, result.states)
+            if self.trajectory_writer is not None or self.state_publisher is not None or self.metrics is not None:
+                ends = np.array([t_end for _, t_end, _ in result.solutions])
+                sections = np.minimum(np.searchsorted(ends, ts, side='right'), len(ends) - 1)
+                for i, section in enumerate(integrated):
+                    mask = sections == i
+                    if mask.any():
+                        self._output_section(ts[mask], result.states[mask], section.total_thrust,
+                                             section.desired_angular_acc)
+        return result
+
+    def enable_instrumentation(self, callback=None):
+        """Collect per section statistics from now on
+
+        Each integrated section (each call for step) records its right-hand
+        side evaluations, the time spent in the right-hand side and in the
+        history recording, the integrator step sizes and the odeint
+        infodict. When disabled the plain _integrator runs and odeint is not
+        asked for its infodict, so there is no overhead.
+
+        Parameters
+        ----------
+        callback : callable, optional
+            Called with the SectionStats of each section once integrated
+
+        Returns
+        -------
+        SimulationStats
+            The statistics, also available as self.stats
+        """
+        self.stats = SimulationStats(callback)
+        return self.stats
+
+    def disable_instrumentation(self):
+        self.stats = None
+
+    def track_metrics(self, target=None, thrust_limits=(0.0, np.inf)):
+        """Accumulate the trajectory metrics of the samples of every integrated section
+
+        The metrics are updated while update_state, step, stream and
+        update_state_dense run, without keeping the trajectory, see
+        quadrotor_simulator.metrics.
+
+        Parameters
+        ----------
+        target : numpy.array, optional
+            Target of the final state, the first sampled state by default
+        thrust_limits : tuple of float
+            Range of feasible motor thrusts [N]
+
+        Returns
+        -------
+        MetricsAccumulator
+            The accumulator, also available as self.metrics
+        """
+        self.metrics = MetricsAccumulator(target, thrust_limits)
+        return self.metrics
+
+    def linearize(self, state, total_thrust, desired_angular_acc):
+        """Dynamics linearized around an operating point
+
+        The models are cached per operating point until the config changes,
+        the LINEAR_MODEL_CACHE_SIZE most recently used are kept.
+
+        Parameters
+        ----------
+        state : numpy.array
+            System State: [x, y, z, x_dot, y_dot, z_dot, phi, theta, psi, p, q, r]
+        total_thrust : float
+            The collective thrust generated by all motors
+        desired_angular_acc : numpy.array
+            The desired angular acceleration [dp/dt, dq/dt, dr/dt]
+
+        Returns
+        -------
+        LinearModel
+            The operating point, its rates and the Jacobians A and B
+        """
+        vehicle = self.vehicle
+        if self._linear_models_vehicle is not vehicle:
+            self._linear_models.clear()
+            self._linear_models_vehicle = vehicle
+        state = np.array(state, dtype=float)
+        inputs = np.concatenate(([total_thrust], desired_angular_acc)).astype(float)
+        key = state.tobytes() + inputs.tobytes()
+        model = self._linear_models.get(key)
+        if model is not None:
+            self._linear_models.move_to_end(key)
+            return model
+        A, B = state_jacobian(state, inputs[0], inputs[1:], vehicle)
+        model = LinearModel(state, inputs, state_derivative(state, inputs[0], inputs[1:], vehicle), A, B)
+        self._linear_models[key] = model
+        if len(self._linear_models) > LINEAR_MODEL_CACHE_SIZE:
+            self._linear_models.popitem(last=False)
+        return model
 
-            self.t_start = ts[-1]
-            self.current_state = output[-1]
+    def trim(self, position=None, velocity=None, psi=0.0):
+        """Linearized dynamics around the hover trim point
 
-            self.df_state_history.drop(self.df_state_history.index[len(self.df_state_history) - 1], inplace=True)
+        Parameters
+        ----------
+        position, velocity : numpy.array, optional
+            [x, y, z] and [x_dot, y_dot, z_dot] of the trim point, zero by default
+        psi : float
+            Heading [rad]
 
-        return self.df_state
+        Returns
+        -------
+        LinearModel
+            The trim state and inputs with their Jacobians, see linearize
+        """
+        state, inputs = hover_trim(self.vehicle, position, velocity, psi)
+        return self.linearize(state, inputs[0], inputs[1:])
+
+    def record_trajectory(self, path, dtype='float64', metadata=None):
+        """Stream the samples of every integrated section to a trajectory file
+
+        The file is written while update_state, step and stream run, see
+        quadrotor_simulator.trajectory_io. Close the returned writer, or
+        use it as a context manager, once the flight is over.
+
+        Parameters
+        ----------
+        path : str
+            Output file
+        dtype : str
+            'float64' or 'float32' for the values, run and t are always int64 and float64
+        metadata : dict, optional
+            JSON serializable data stored in the header
+
+        Returns
+        -------
+        TrajectoryWriter
+            The writer, also available as self.trajectory_writer
+        """
+        self.trajectory_writer = TrajectoryWriter(path, config=self.config, dtype=dtype, metadata=metadata)
+        return self.trajectory_writer
+
+    def publish_states(self, capacity=4096, name=None):
+        """Publish the samples of every integrated section to other processes
+
+        The samples are written to a shared memory ring buffer while
+        update_state, step, stream and update_state_dense run, readers in
+        other processes attach it by name with StateSubscriber, see
+        quadrotor_simulator.state_bus. Use the returned publisher as a
+        context manager, or finish, unlink and close it, once the flight is
+        over.
+
+        Parameters
+        ----------
+        capacity : int
+            Number of samples kept in the ring
+        name : str, optional
+            Name of the shared memory block
+
+        Returns
+        -------
+        StatePublisher
+            The publisher, also available as self.state_publisher
+        """
+        self.state_publisher = StatePublisher(capacity, name)
+        return self.state_publisher
+
+    def _cached_section(self, ts, total_thrust, desired_angular_acc):
+        """_integrate_section replaying the section from self.section_cache when it is there"""
+        cache = self.section_cache
+        key = cache.key(self.current_state, total_thrust, desired_angular_acc, len(ts), self._dt, self.vehicle,
+                        self.integrator, self.save_state, self.attitude)
+        entry = cache.get(key)
+        if entry is None:
+            recorder = self._state_history_recorder
+            n_recorded = recorder.n_recorded
+            output = self._integrate_section(ts, total_thrust, desired_angular_acc)
+            history_t = history = None
+            if self.save_state:
+                n_rows = recorder.n_recorded - n_recorded
+                if n_rows > len(recorder):
+                    # Part of the section was evicted from the bounded history
+                    return output
+                history_t = recorder.index[len(recorder) - n_rows:] - ts[0]
+                history = recorder.values[len(recorder) - n_rows:].copy()
+            # The model keeps output[-1] and current_state_dot as its current state, the entry owns copies
+            cache.put(key, SectionEntry(output.copy(), history_t, history, self._current_row.copy(),
+                                        self._current_t - ts[0], self.current_state_dot.copy()))
+            return output
+
+        output = entry.states
+        if self.save_state:
+            self._state_history_recorder.extend(ts[0] + entry.history_t, entry.history)
+        self._current_row[:] = entry.current_row
+        self._current_t = ts[0] + entry.current_t
+        self.current_state_dot = entry.current_state_dot.copy()
+        self.t_start = ts[-1]
+        self.current_state = output[-1].copy()
+        self._output_section(ts, output, total_thrust, desired_angular_acc)
+        return output
+
+    def _integrate_section(self, ts, total_thrust, desired_angular_acc):
+        """Integrate over ts with constant inputs and move the current state to ts[-1]"""
+        output = self._integrate_section_timed(ts, total_thrust, desired_angular_acc)
+        self._output_section(ts, output, total_thrust, desired_angular_acc)
+        return output
+
+    def _output_section(self, ts, states, total_thrust, desired_angular_acc):
+        """Send the samples of a section to the trajectory writer, the state publisher and the metrics"""
+        if self.trajectory_writer is not None:
+            self.trajectory_writer.write_section(ts, states, total_thrust, desired_angular_acc, self.vehicle)
+        if self.state_publisher is not None:
+            self.state_publisher.publish_section(ts, states, total_thrust, desired_angular_acc)
+        if self.metrics is not None:
+            self.metrics.update_section(ts, states, total_thrust, desired_angular_acc, self.vehicle)
+
+    def _integrate_section_timed(self, ts, total_thrust, desired_angular_acc):
+        if self.stats is not None:
+            self._section_stats = self.stats.begin_section(total_thrust, desired_angular_acc, ts)
+            start = instrumentation.clock()
+            nfev = self.integrator.nfev
+            self.integrator.full_output = True
+            try:
+                output = self._integrate_section_with(ts, total_thrust, desired_angular_acc,
+                                                      self._instrumented_integrator)
+            finally:
+                self.integrator.full_output = False
+            stats = self._section_stats
+            stats.wall_time = instrumentation.clock() - start
+            stats.rhs_evaluations = self.integrator.nfev - nfev
+            stats.step_sizes = self.integrator.step_sizes(ts)
+            stats.info = self.integrator.last_info
+            self._section_stats = None
+            self.stats.end_section(stats)
+            return output
+        fun = self._integrator if self.attitude == 'euler' else self._quaternion_integrator
+        return self._integrate_section_with(ts, total_thrust, desired_angular_acc, fun)
+
+    def _integrate_section_with(self, ts, total_thrust, desired_angular_acc, fun):
+        # Refresh the constants used by _integrator if the config changed
+        vehicle = self.vehicle
+        if isinstance(self.integrator, CompiledIntegrator):
+            # The compiled kernels bypass _integrator, the history holds one row per sample
+            output, thrust = self.integrator.integrate_section(self.current_state, ts, total_thrust,
+                                                               desired_angular_acc, vehicle.array)
+            if self.save_state:
+                history = np.empty((len(ts) - 1, 19))
+                history[:, :12] = output[:-1]
+                history[:, 12:16] = thrust[:-1]
+                history[:, 16:19] = desired_angular_acc
+                self._state_history_recorder.extend(ts[:-1], history)
+            self._current_row[:12] = output[-1]
+            self._current_row[12:16] = thrust[-1]
+            self._current_row[16:19] = desired_angular_acc
+            self._current_t = ts[-1]
+        elif self.attitude == 'quaternion':
+            quaternion_output = self.integrator.integrate(fun, self._current_quaternion_state(), ts,
+                                                          args=(total_thrust, desired_angular_acc))
+            quaternion_output[:, 6:10] /= np.linalg.norm(quaternion_output[:, 6:10], axis=1)[:, np.newaxis]
+            if self.save_state:
+                self._state_history_recorder.drop_last(self._current_t)
+            output = np.empty((len(ts), 12))
+            output[:, :6] = quaternion_output[:, :6]
+            output[:, 6:9] = quaternion_to_euler(quaternion_output[:, 6:10], reference=self.current_state[6:9])
+            output[:, 9:] = quaternion_output[:, 10:]
+            self._quaternion_state = quaternion_output[-1]
+            self._quaternion_source = output[-1]
+        else:
+            jac = self._jacobian if self.analytic_jacobian else None
+            output = self.integrator.integrate(fun, self.current_state, ts, args=(total_thrust, desired_angular_acc),
+                                               jac=jac)
+            if self.save_state:
+                # Evaluations at the time of the last one of the section are dropped
+                self._state_history_recorder.drop_last(self._current_t)
+
+        self.t_start = ts[-1]
+        self.current_state = output[-1]
+        return output
+
+    def _current_quaternion_state(self):
+        """current_state with the quaternion [w, x, y, z] in place of the Euler angles"""
+        if self._quaternion_source is not None and self._quaternion_source is self.current_state:
+            return self._quaternion_state
+        state = np.empty(13)
+        state[:6] = self.current_state[:6]
+        state[6:10] = euler_to_quaternion(*self.current_state[6:9])
+        state[10:] = self.current_state[9:]
+        return state
+
+    def _euler_rows(self, rows, reference=None):
+        """(n, 20) rows holding a quaternion as the (n, 19) rows of df_state_history"""
+        euler = np.empty((len(rows), 19))
+        euler[:, :6] = rows[:, :6]
+        euler[:, 6:9] = quaternion_to_euler(rows[:, 6:10], reference)
+        euler[:, 9:] = rows[:, 10:]
+        return euler
+
+    def _jacobian(self, state, t, total_thrust, desired_angular_acc):
+        """Jacobian of _integrator with respect to the state, the Dfun of odeint"""
+        return state_jacobian(state, total_thrust, desired_angular_acc, self._vehicle)[0]
 
     def _integrator(self, state, t, total_thrust, desired_angular_acc):
-        """Callback function for scipy.integrate.odeint.
-            At this point scipy is used to execute the forward integration
+        """Callback function for the integrator, scipy.integrate.odeint by default.
+            At this point the integrator executes the forward integration
 
         Parameters
         ----------
@@ -300,25 +1003,40 @@ class QuadrotorDynamics(object):
             Rates of the input state:
             [x_dot, y_dot, z_dot, xd_dot, yd_dot, zd_dot, phi_dot, theta_dot, psi_dot, p_dot, q_dot, r_dot]
         """
-        self.df_current_state.loc[:, :12] = state
-        self.df_current_state.set_index([[t]], inplace=True)
-        self.df_current_state.loc[:, ('desired_angular_acc')] = desired_angular_acc
-
-        # omega = self.dt_eulerangles_to_angular_velocity(omega, euler)
-        my_moments = moments(desired_angular_acc, self.df_current_state.omega.values[0], self.inertia_matrix)
-        self.df_current_state.loc[:, ('thrust')] = motor_thrust(self.config, my_moments, total_thrust)
-        # Acceleration in inertial frame
-        self.df_current_state_dot.loc[:, ('velocity')] = self.df_current_state.velocity.values[0]
-        self.df_current_state_dot.loc[:, ('acceleration')] = self.acceleration(self.df_current_state.thrust.values[0],
-                                                                               self.df_current_state)
-        self.df_current_state_dot.loc[:, ('omega')] = angular_velocity_to_dt_eulerangles(
-            angular_rotation_matrix(*self.df_current_state.orientation.values[0]),
-            self.df_current_state.omega.values[0])
-        self.df_current_state_dot.loc[:, ('omega_dot')] = self.angular_acceleration(self.df_current_state,
-                                                                                    self.df_current_state.thrust.values[
-                                                                                        0])
+        state_dot = state_derivative(state, total_thrust, desired_angular_acc, self._vehicle, self._current_row)
+        self._current_t = t
+        self.current_state_dot = state_dot
+
+        if self.save_state:
+            self._state_history_recorder.append(t, self._current_row)
+
+        return state_dot
+
+    def _quaternion_integrator(self, state, t, total_thrust, desired_angular_acc):
+        """_integrator of the quaternion state [x, y, z, x_dot, y_dot, z_dot, qw, qx, qy, qz, p, q, r]"""
+        state_dot = quaternion_state_derivative(state, total_thrust, desired_angular_acc, self._vehicle,
+                                                self._current_row)
+        self._current_t = t
+        self.current_state_dot = state_dot
+
+        if self.save_state:
+            self._state_history_recorder.append(t, self._current_row)
+
+        return state_dot
+
+    def _instrumented_integrator(self, state, t, total_thrust, desired_angular_acc):
+        """_integrator or _quaternion_integrator timing each call into the current SectionStats"""
+        stats = self._section_stats
+        derivative = state_derivative if self.attitude == 'euler' else quaternion_state_derivative
+        start = instrumentation.clock()
+        state_dot = derivative(state, total_thrust, desired_angular_acc, self._vehicle, self._current_row)
+        rhs_end = instrumentation.clock()
+        stats.stage_times[0] += rhs_end - start
+        self._current_t = t
+        self.current_state_dot = state_dot
 
         if self.save_state:
-            self.df_state_history = self.df_state_history.append(self.df_current_state)
+            self._state_history_recorder.append(t, self._current_row)
+            stats.stage_times[1] += instrumentation.clock() - rhs_end
 
-        return self.df_current_state_dot.values[0]
+        return state_dot
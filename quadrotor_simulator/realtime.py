@@ -0,0 +1,154 @@
+# -*- coding: utf-8 -*-
+#       __REALTIME__
+#       This file implements an asyncio loop running
+#       the simulation in wall clock time
+
+import asyncio
+import time
+
+import numpy as np
+
+from quadrotor_simulator.quadrotor_dynamics import StateSample
+
+
+class DeadlineStats(object):
+    def __init__(self, period, jitter_bins=None):
+        """Timing statistics of a soft real-time loop, in constant memory
+
+        Parameters
+        ----------
+        period : float
+            Nominal step period [s]
+        jitter_bins : numpy.array, optional
+            Edges of the jitter histogram [s], by default 0 to one period in
+            20 bins, later steps are counted in the last bin
+        """
+        self.period = period
+        if jitter_bins is None:
+            jitter_bins = np.linspace(0, period, 21)
+        self.jitter_bins = np.asarray(jitter_bins, dtype=float)
+        self.jitter_counts = np.zeros(len(self.jitter_bins) - 1, dtype=np.int64)
+        self.steps = 0
+        self.deadline_misses = 0
+        self.max_jitter = 0.0
+        self.compute_time_total = 0.0
+        self.compute_time_max = 0.0
+
+    def record(self, jitter, compute_time):
+        """Record one step
+
+        Parameters
+        ----------
+        jitter : float
+            Delay between the deadline of the step and its start [s]
+        compute_time : float
+            Time spent integrating and publishing the step [s]
+        """
+        self.steps += 1
+        if jitter + compute_time > self.period:
+            self.deadline_misses += 1
+        self.max_jitter = max(self.max_jitter, jitter)
+        self.compute_time_total += compute_time
+        self.compute_time_max = max(self.compute_time_max, compute_time)
+        position = np.searchsorted(self.jitter_bins, jitter, side='right') - 1
+        self.jitter_counts[min(max(position, 0), len(self.jitter_counts) - 1)] += 1
+
+    @property
+    def compute_time_mean(self):
+        return self.compute_time_total / self.steps if self.steps else 0.0
+
+    def summary(self):
+        return {
+            'steps': self.steps,
+            'deadline_misses': self.deadline_misses,
+            'max_jitter': self.max_jitter,
+            'compute_time_mean': self.compute_time_mean,
+            'compute_time_max': self.compute_time_max,
+        }
+
+
+class AsyncSimulationRunner(object):
+    def __init__(self, quadrotor, period=None, clock=time.monotonic):
+        """Step a QuadrotorDynamics at a fixed wall clock rate from asyncio
+
+        Commands are read from the ``commands`` queue, the last one received
+        before a step is applied and held until the next one. Every new
+        state is published to the subscriber queues without ever waiting
+        on a slow subscriber: its oldest sample is dropped instead.
+
+        Parameters
+        ----------
+        quadrotor : QuadrotorDynamics
+            The simulated vehicle, use save_state=False or max_history for
+            long runs so that memory stays bounded
+        period : float, optional
+            Step period in wall clock time, quadrotor._dt by default (200 Hz
+            for the default dt)
+        clock : callable
+            Monotonic clock in seconds
+        """
+        self.quadrotor = quadrotor
+        self.period = period or quadrotor._dt
+        self.clock = clock
+        self.commands = asyncio.Queue()
+        self.stats = DeadlineStats(self.period)
+        self._subscribers = []
+        self._running = False
+        # Hover until the first command
+        self.total_thrust = quadrotor.config['mass'] * quadrotor.config['gravity']
+        self.desired_angular_acc = np.zeros(3)
+
+    def send(self, total_thrust, desired_angular_acc):
+        """Queue a command without waiting"""
+        self.commands.put_nowait((total_thrust, np.asarray(desired_angular_acc, dtype=float)))
+
+    def subscribe(self, maxsize=1):
+        """Queue receiving a StateSample after each step"""
+        queue = asyncio.Queue(maxsize)
+        self._subscribers.append(queue)
+        return queue
+
+    def unsubscribe(self, queue):
+        self._subscribers.remove(queue)
+
+    def stop(self):
+        """Make run return after the current step"""
+        self._running = False
+
+    async def run(self, steps=None):
+        """Run until stop() is called or for the given number of steps
+
+        Returns
+        -------
+        DeadlineStats
+            The timing statistics of the run
+        """
+        self._running = True
+        deadline = self.clock()
+        count = 0
+        while self._running and (steps is None or count < steps):
+            start = self.clock()
+            jitter = max(0.0, start - deadline)
+
+            while not self.commands.empty():
+                self.total_thrust, self.desired_angular_acc = self.commands.get_nowait()
+            state = self.quadrotor.step(self.total_thrust, self.desired_angular_acc)
+            self._publish(StateSample(self.quadrotor.t_start, state))
+
+            self.stats.record(jitter, self.clock() - start)
+            count += 1
+
+            deadline += self.period
+            now = self.clock()
+            if now > deadline + self.period:
+                # Too late, skip the missed deadlines instead of bursting to catch up
+                deadline += (now - deadline) // self.period * self.period
+            await asyncio.sleep(max(0.0, deadline - now))
+        self._running = False
+        return self.stats
+
+    def _publish(self, sample):
+        for queue in self._subscribers:
+            if queue.full():
+                queue.get_nowait()
+            queue.put_nowait(sample)
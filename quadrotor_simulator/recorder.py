@@ -0,0 +1,171 @@
+# -*- coding: utf-8 -*-
+#       __RECORDER__
+#       This file implements an array backed recorder
+#       for the states produced by the simulation
+
+import functools
+
+import numpy as np
+
+
+def column_index(columns):
+    """pandas.MultiIndex of a schema of (variable, axis) pairs
+
+    The index of each schema is built once and shared by all the
+    DataFrames using it, a pandas Index is returned as is.
+    """
+    import pandas as pd
+
+    if isinstance(columns, pd.Index):
+        return columns
+    return _column_index(tuple(columns))
+
+
+@functools.lru_cache(maxsize=None)
+def _column_index(columns):
+    import pandas as pd
+
+    return pd.MultiIndex.from_tuples(columns, names=['variable', 'axis'])
+
+
+class StateRecorder(object):
+    def __init__(self, columns, maxlen=None, capacity=256, width=None, transform=None):
+        """Growable, array backed storage of time indexed rows
+
+        Rows are stored in a preallocated numpy buffer whose capacity doubles
+        when it is full, so appending is amortized O(1). The pandas DataFrame
+        is only built, and pandas imported, when ``to_dataframe`` is called.
+
+        Parameters
+        ----------
+        columns : tuple or pandas.MultiIndex
+            Columns of the DataFrame built by ``to_dataframe``, as (variable,
+            axis) pairs or as an index
+        maxlen : int, optional
+            When given, the recorder is a ring buffer keeping only the last
+            ``maxlen`` rows and its memory stays bounded
+        capacity : int
+            Initial number of rows allocated
+        width : int, optional
+            Number of values per row, len(columns) by default
+        transform : callable, optional
+            Maps the (n, width) recorded rows to the (n, len(columns))
+            values of the DataFrame, applied by ``to_dataframe`` only
+        """
+        self.columns = columns
+        self.transform = transform
+        self.maxlen = maxlen
+        if maxlen is not None:
+            capacity = maxlen
+        self._index = np.empty(capacity)
+        self._values = np.empty((capacity, len(columns) if width is None else width))
+        # Position of the oldest row and number of rows stored
+        self._start = 0
+        self._size = 0
+        # Rows recorded since the creation, dropped rows excluded, evicted ones included
+        self.n_recorded = 0
+        self._dataframe = None
+
+    def __len__(self):
+        return self._size
+
+    def append(self, t, row):
+        """Record a single row at time t"""
+        if self.maxlen is None:
+            if self._size == len(self._index):
+                self._grow(self._size + 1)
+            position = self._size
+            self._size += 1
+        else:
+            position = (self._start + self._size) % self.maxlen
+            if self._size == self.maxlen:
+                self._start = (self._start + 1) % self.maxlen
+            else:
+                self._size += 1
+        self._index[position] = t
+        self._values[position] = row
+        self.n_recorded += 1
+        self._dataframe = None
+
+    def extend(self, ts, rows):
+        """Record several rows at times ts"""
+        ts = np.asarray(ts)
+        rows = np.asarray(rows)
+        self.n_recorded += len(ts)
+        if self.maxlen is not None:
+            if len(ts) >= self.maxlen:
+                # Only the last maxlen rows survive
+                ts = ts[-self.maxlen:]
+                rows = rows[-self.maxlen:]
+                self._start = 0
+                self._size = 0
+            positions = (self._start + self._size + np.arange(len(ts))) % self.maxlen
+            self._index[positions] = ts
+            self._values[positions] = rows
+            size = self._size + len(ts)
+            if size > self.maxlen:
+                self._start = (self._start + size - self.maxlen) % self.maxlen
+                size = self.maxlen
+            self._size = size
+            self._dataframe = None
+            return
+        if self._size + len(ts) > len(self._index):
+            self._grow(self._size + len(ts))
+        self._index[self._size:self._size + len(ts)] = ts
+        self._values[self._size:self._size + len(ts)] = rows
+        self._size += len(ts)
+        self._dataframe = None
+
+    def drop_last(self, t):
+        """Remove the most recent rows recorded at time t
+
+        Rows are looked up from the newest one, at the head of the ring when
+        the oldest rows have been evicted.
+        """
+        capacity = len(self._index)
+        n = self._size
+        while n > 0 and self._index[(self._start + n - 1) % capacity] == t:
+            n -= 1
+        if n != self._size:
+            self.n_recorded -= self._size - n
+            self._size = n
+            self._dataframe = None
+
+    def clear(self):
+        self._start = 0
+        self._size = 0
+        self.n_recorded = 0
+        self._dataframe = None
+
+    @property
+    def index(self):
+        """Recorded times, oldest first"""
+        return self._ordered(self._index)
+
+    @property
+    def values(self):
+        """Recorded rows, oldest first"""
+        return self._ordered(self._values)
+
+    def to_dataframe(self):
+        """Recorded rows as a DataFrame, cached until the next change"""
+        import pandas as pd
+
+        if self._dataframe is None:
+            values = self.values.copy() if self.transform is None else self.transform(self.values)
+            self._dataframe = pd.DataFrame(values, index=self.index.copy(), columns=column_index(self.columns))
+        return self._dataframe
+
+    def _ordered(self, buffer):
+        if self._start + self._size <= len(buffer):
+            return buffer[self._start:self._start + self._size]
+        return np.roll(buffer, -self._start, axis=0)[:self._size]
+
+    def _grow(self, size):
+        capacity = max(size, 2 * len(self._index))
+        index = np.empty(capacity)
+        values = np.empty((capacity, self._values.shape[1]))
+        index[:self._size] = self._index[:self._size]
+        values[:self._size] = self._values[:self._size]
+        self._index = index
+        self._values = values
@@ -0,0 +1,390 @@
+# -*- coding: utf-8 -*-
+#       __SCENARIOS__
+#       This file implements the maneuvers flown by the
+#       simulator and their packed piecewise schedules
+#
+#       A Schedule holds the sections of N runs as padded (N, K) arrays
+#       instead of tuples of Section. Every maneuver parameter may be an
+#       (N,) array, so thousands of distinct schedules are generated by
+#       array operations, and compile_schedule turns them into the step
+#       indices consumed by BatchQuadrotorDynamics.simulate.
+
+from collections import namedtuple
+
+import numpy as np
+
+from quadrotor_simulator.flips import Section
+from quadrotor_simulator.quadrotor_dynamics import default_config
+
+Schedule = namedtuple('Schedule', ['t', 'total_thrust', 'desired_angular_acc', 'n_sections'])
+Schedule.__doc__ = """Piecewise inputs of N runs, padded to K sections
+
+t : numpy.array
+    (N, K) duration of each section [s]
+total_thrust : numpy.array
+    (N, K) total thrust of each section
+desired_angular_acc : numpy.array
+    (N, K, 3) [dp/dt, dq/dt, dr/dt] of each section
+n_sections : numpy.array
+    (N,) number of sections of each run, the following ones are padding
+"""
+
+CompiledSchedule = namedtuple('CompiledSchedule', ['t_start', 'section_end', 'total_thrust', 'desired_angular_acc',
+                                                   'n_steps'])
+CompiledSchedule.__doc__ = """Schedule sampled like ``QuadrotorDynamics.update_state``
+
+The sections shorter than 2 * dt are dropped and the kept ones moved first.
+
+t_start : numpy.array
+    (N, K) time at which each section starts
+section_end : numpy.array
+    (N, K) step at which each section ends, n_steps for the padding
+total_thrust, desired_angular_acc : numpy.array
+    (N, K) and (N, K, 3) inputs of the kept sections, zero for the padding
+n_steps : numpy.array
+    (N,) number of dt steps of each run
+"""
+
+# Directions of the flips in the body x-y plane
+FLIP_AXES = {
+    'roll': (1.0, 0.0),
+    'pitch': (0.0, 1.0),
+}
+
+
+def pack_sections(schedules):
+    """Schedule of tuples of Section
+
+    Parameters
+    ----------
+    schedules : list of tuple of Section
+        One piecewise schedule per run, or a single schedule
+
+    Returns
+    -------
+    Schedule
+    """
+    if schedules and hasattr(schedules[0], 'total_thrust'):
+        schedules = [schedules]
+    n = len(schedules)
+    k = max(len(schedule) for schedule in schedules)
+    t = np.zeros((n, k))
+    total_thrust = np.zeros((n, k))
+    desired_angular_acc = np.zeros((n, k, 3))
+    for i, schedule in enumerate(schedules):
+        for j, section in enumerate(schedule):
+            t[i, j] = section.t
+            total_thrust[i, j] = section.total_thrust
+            desired_angular_acc[i, j] = section.desired_angular_acc
+    return Schedule(t, total_thrust, desired_angular_acc, np.array([len(s) for s in schedules], dtype=np.int64))
+
+
+def schedule_sections(schedule, run=0):
+    """Tuple of Section of one run of a Schedule, for QuadrotorDynamics.update_state"""
+    return tuple(Section(total_thrust=float(schedule.total_thrust[run, j]),
+                         desired_angular_acc=schedule.desired_angular_acc[run, j].tolist(),
+                         t=float(schedule.t[run, j]))
+                 for j in range(schedule.n_sections[run]))
+
+
+def broadcast_schedule(schedule, n):
+    """Schedule repeated for n runs, schedule holding a single run or n runs"""
+    if len(schedule.t) == n:
+        return schedule
+    if len(schedule.t) != 1:
+        raise ValueError('Expected 1 or {} runs, got {}'.format(n, len(schedule.t)))
+    return Schedule(*(np.repeat(array, n, axis=0) for array in schedule))
+
+
+def concatenate_schedules(schedules):
+    """Schedule flying the schedules one after the other
+
+    Schedules holding a single run are repeated for the runs of the others.
+    """
+    n = max(len(schedule.t) for schedule in schedules)
+    schedules = [broadcast_schedule(schedule, n) for schedule in schedules]
+    valid = np.concatenate([np.arange(s.t.shape[1]) < s.n_sections[:, np.newaxis] for s in schedules], axis=1)
+    # Stable sort of the padding after the sections of each run
+    order = np.argsort(~valid, axis=1, kind='stable')
+    rows = np.arange(n)[:, np.newaxis]
+    t, total_thrust, desired_angular_acc = (
+        np.concatenate([getattr(s, name) for s in schedules], axis=1)[rows, order]
+        for name in ('t', 'total_thrust', 'desired_angular_acc'))
+    return Schedule(t, total_thrust, desired_angular_acc, valid.sum(axis=1))
+
+
+def compile_schedule(schedule, dt, t_start=0.0):
+    """Sample the sections of all runs at once
+
+    Each section lasts ``len(np.arange(t_start, t_start + section.t, dt)) - 1``
+    steps and the next one starts at the last time of that range, which
+    is reproduced with the arithmetic of np.arange so that the steps match
+    ``QuadrotorDynamics.update_state`` exactly. The only loop is over the
+    K section slots, shared by all runs.
+
+    Parameters
+    ----------
+    schedule : Schedule
+        Sections of N runs
+    dt : float
+        Sampling step
+    t_start : float
+        Time at which the runs start
+
+    Returns
+    -------
+    CompiledSchedule
+    """
+    n, k = schedule.t.shape
+    keep = (np.arange(k) < schedule.n_sections[:, np.newaxis]) & ~(schedule.t < (2 * dt))
+    starts = np.empty((n, k))
+    steps = np.zeros((n, k), dtype=np.int64)
+    start = np.full(n, float(t_start))
+    for j in range(k):
+        starts[:, j] = start
+        length = np.ceil(((start + schedule.t[:, j]) - start) / dt)
+        # np.arange fills start + i * ((start + dt) - start)
+        end = start + (length - 1) * ((start + dt) - start)
+        steps[:, j] = np.where(keep[:, j], length - 1, 0)
+        start = np.where(keep[:, j], end, start)
+
+    order = np.argsort(~keep, axis=1, kind='stable')
+    rows = np.arange(n)[:, np.newaxis]
+    kept = keep[rows, order]
+    section_end = np.cumsum(steps[rows, order], axis=1)
+    return CompiledSchedule(
+        t_start=np.where(kept, starts[rows, order], start[:, np.newaxis]),
+        section_end=section_end,
+        total_thrust=np.where(kept, schedule.total_thrust[rows, order], 0.0),
+        desired_angular_acc=np.where(kept[..., np.newaxis], schedule.desired_angular_acc[rows, order], 0.0),
+        n_steps=section_end[:, -1].copy() if k else np.zeros(n, dtype=np.int64))
+
+
+def _full_config(config):
+    full_config = default_config()
+    if config:
+        full_config.update(config)
+    return full_config
+
+
+def _broadcast(*values):
+    """Parameters as float arrays of a common (N,) shape"""
+    return np.broadcast_arrays(*(np.atleast_1d(np.asarray(value, dtype=float)) for value in values))
+
+
+class Maneuver(object):
+    """Piecewise inputs with a fixed number of sections
+
+    Subclasses implement ``arrays``, whose parameters may be (N,) arrays
+    giving N variants of the maneuver.
+    """
+
+    def arrays(self, config):
+        """(N, k) durations, (N, k) thrusts and (N, k, 3) angular accelerations
+
+        Parameters
+        ----------
+        config : dict
+            Full vehicle config, see ``default_config``
+        """
+        raise NotImplementedError
+
+    def schedule(self, config=None):
+        """Schedule of the maneuver for a vehicle config updating ``default_config()``"""
+        t, total_thrust, desired_angular_acc = self.arrays(_full_config(config))
+        return Schedule(t, total_thrust, desired_angular_acc, np.full(len(t), t.shape[1], dtype=np.int64))
+
+    def sections(self, config=None, run=0):
+        """Tuple of Section of one variant, for QuadrotorDynamics.update_state"""
+        return schedule_sections(self.schedule(config), run)
+
+
+class Hover(Maneuver):
+    def __init__(self, t=1.0):
+        """Hold the vehicle level, the rotors carrying its weight
+
+        Parameters
+        ----------
+        t : float or numpy.array
+            Duration [s]
+        """
+        self.t = t
+
+    def arrays(self, config):
+        (t,) = _broadcast(self.t)
+        total_thrust = np.full_like(t, config['mass'] * config['gravity'])
+        return t[:, np.newaxis], total_thrust[:, np.newaxis], np.zeros((len(t), 1, 3))
+
+
+class Climb(Maneuver):
+    def __init__(self, height=1.0, t=1.0):
+        """Climb from rest to rest, accelerating then braking for t / 2 each
+
+        Parameters
+        ----------
+        height : float or numpy.array
+            Height gained [m], negative to descend
+        t : float or numpy.array
+            Duration [s]
+        """
+        if np.any(np.asarray(t) <= 0):
+            raise ValueError('Climb duration must be positive, got {!r}'.format(t))
+        self.height = height
+        self.t = t
+
+    def arrays(self, config):
+        height, t = _broadcast(self.height, self.t)
+        acceleration = 4 * height / t ** 2
+        weight = config['mass'] * config['gravity']
+        total_thrust = np.stack((weight + config['mass'] * acceleration, weight - config['mass'] * acceleration), axis=1)
+        return np.stack((t / 2, t / 2), axis=1), total_thrust, np.zeros((len(t), 2, 3))
+
+
+class Flip(Maneuver):
+    def __init__(self, turns=5, axis='roll', Bup=21.58, Bdown=3.92, Cpmax=np.pi * 1800 / 180,
+                 p0=np.nan, p1=np.nan, p2=np.nan, p3=np.nan, p4=np.nan):
+        """Multi-flip of Lupashin et al. about an axis of the body x-y plane
+
+        The 5 sections of the flip, also built by ``flips.SimulationParams``
+        for a roll. Other axes use the inertia about them, so that a direction
+        between roll and pitch flips about both body axes at once.
+
+        Parameters
+        ----------
+        turns : float or numpy.array
+            Number of flips, Cn
+        axis : str or numpy.array
+            'roll', 'pitch', an [x, y] direction or (N, 2) directions
+        Bup, Bdown : float or numpy.array
+            Reduced max and min collective accelerations
+        Cpmax : float or numpy.array
+            Max rate about the axis [rad s^-1]
+        p0, p1, p2, p3, p4 : float or numpy.array
+            Flip parameters, missing (NaN) ones take their initial value
+        """
+        self.turns = turns
+        self.axis = axis
+        self.Bup = Bup
+        self.Bdown = Bdown
+        self.Cpmax = Cpmax
+        self.parameters = (p0, p1, p2, p3, p4)
+
+    def initial_parameters(self, config=None):
+        """(N, 5) p0..p4 of the variants, missing (NaN) ones replaced by their initial value
+
+        p0 and p3 start at 0.9 Bup, p1 and p4 at 0.2 s, and p2 coasts for the
+        turns left once Cpmax is reached.
+        """
+        return self._resolve(_full_config(config))[3]
+
+    def accelerations(self, config=None):
+        """(N, 5) angular accelerations about the flip axis of the 5 sections"""
+        config = _full_config(config)
+        _, Bup, Bdown, parameters, inertia, _, _ = self._resolve(config)
+        return self._accelerations(config, Bup, Bdown, parameters[:, 0], parameters[:, 3], inertia)
+
+    def _resolve(self, config):
+        """Broadcast Cpmax, Bup, Bdown, (N, 5) p0..p4, inertia about the axis and axis components"""
+        if isinstance(self.axis, str) and self.axis not in FLIP_AXES:
+            raise ValueError('Unknown flip axis: {}'.format(self.axis))
+        axis = np.asarray(FLIP_AXES[self.axis] if isinstance(self.axis, str) else self.axis, dtype=float)
+        if axis.ndim not in (1, 2) or axis.shape[-1] != 2:
+            raise ValueError('Expected an [x, y] flip axis, got {!r}'.format(self.axis))
+        axis = axis / np.linalg.norm(axis, axis=-1, keepdims=True)
+        turns, Bup, Bdown, Cpmax, p0, p1, p2, p3, p4, ux, uy = _broadcast(
+            self.turns, self.Bup, self.Bdown, self.Cpmax, *self.parameters, axis[..., 0], axis[..., 1])
+        mass, length = config['mass'], config['length']
+        inertia = ux ** 2 * config['inertia'][0] + uy ** 2 * config['inertia'][1]
+
+        acc_start = mass * length * (Bup - Bdown) / (4 * inertia)
+        p0 = np.where(np.isnan(p0), 0.9 * Bup, p0)
+        p3 = np.where(np.isnan(p3), 0.9 * Bup, p3)
+        p1 = np.where(np.isnan(p1), 0.2, p1)
+        p4 = np.where(np.isnan(p4), 0.2, p4)
+        p2 = np.where(np.isnan(p2), (2 * np.pi * turns / Cpmax) - (Cpmax / acc_start), p2)
+        return Cpmax, Bup, Bdown, np.stack((p0, p1, p2, p3, p4), axis=1), inertia, ux, uy
+
+    @staticmethod
+    def _accelerations(config, Bup, Bdown, p0, p3, inertia):
+        mass, length = config['mass'], config['length']
+        acc = -mass * length * (Bup - p0) / (4 * inertia)
+        start = mass * length * (Bup - Bdown) / (4 * inertia)
+        stop = -mass * length * (Bup - Bdown) / (4 * inertia)
+        recover = mass * length * (Bup - p3) / (4 * inertia)
+        return np.stack((acc, start, np.zeros_like(acc), stop, recover), axis=1)
+
+    def arrays(self, config):
+        Cpmax, Bup, Bdown, parameters, inertia, ux, uy = self._resolve(config)
+        p0, p1, p2, p3, p4 = parameters.T
+        rates = self._accelerations(config, Bup, Bdown, p0, p3, inertia)
+        acc, start, _, stop, recover = rates.T
+        mass, length = config['mass'], config['length']
+
+        T2 = (Cpmax - p1 * acc) / start
+        T4 = -(Cpmax + p4 * recover) / stop
+
+        t = np.stack((p1, T2, p2, T4, p4), axis=1)
+        total_thrust = np.stack((mass * p0,
+                                 mass * Bup - 2 * abs(start) * inertia / length,
+                                 mass * Bdown,
+                                 mass * Bup - 2 * abs(stop) * inertia / length,
+                                 mass * p3), axis=1)
+        desired_angular_acc = np.zeros(t.shape + (3,))
+        desired_angular_acc[..., 0] = rates * ux[:, np.newaxis]
+        desired_angular_acc[..., 1] = rates * uy[:, np.newaxis]
+        return t, total_thrust, desired_angular_acc
+
+
+class YawFlip(Maneuver):
+    def __init__(self, turns=1, rate=np.pi, acceleration=5.0):
+        """Full turns about the body z axis while hovering
+
+        Spin up, coast at the rate and spin down. When the turns are too few
+        to reach the rate, the vehicle spins down as soon as it is half way.
+
+        Parameters
+        ----------
+        turns : float or numpy.array
+            Number of turns, negative to turn clockwise
+        rate : float or numpy.array
+            Max yaw rate [rad s^-1]
+        acceleration : float or numpy.array
+            Yaw acceleration while spinning up and down [rad s^-2]
+        """
+        if np.any(np.asarray(turns) == 0):
+            raise ValueError('YawFlip turns must be non zero, got {!r}'.format(turns))
+        if np.any(np.asarray(rate) <= 0) or np.any(np.asarray(acceleration) <= 0):
+            raise ValueError('YawFlip rate and acceleration must be positive')
+        self.turns = turns
+        self.rate = rate
+        self.acceleration = acceleration
+
+    def arrays(self, config):
+        turns, rate, acceleration = _broadcast(self.turns, self.rate, self.acceleration)
+        angle = 2 * np.pi * np.abs(turns)
+        rate = np.minimum(rate, np.sqrt(angle * acceleration))
+        spin = rate / acceleration
+        t = np.stack((spin, angle / rate - spin, spin), axis=1)
+        total_thrust = np.full(t.shape, config['mass'] * config['gravity'])
+        desired_angular_acc = np.zeros(t.shape + (3,))
+        desired_angular_acc[..., 2] = np.sign(turns)[:, np.newaxis] * acceleration[:, np.newaxis] * [1, 0, -1]
+        return t, total_thrust, desired_angular_acc
+
+
+class Scenario(Maneuver):
+    def __init__(self, maneuvers):
+        """Maneuvers flown one after the other
+
+        Parameters
+        ----------
+        maneuvers : list of Maneuver
+            Maneuvers with N variants or a single one, repeated for the
+            variants of the others
+        """
+        self.maneuvers = list(maneuvers)
+
+    def arrays(self, config):
+        arrays = [maneuver.arrays(config) for maneuver in self.maneuvers]
+        n = max(len(t) for t, _, _ in arrays)
+        return tuple(np.concatenate([np.broadcast_to(a[i], (n,) + a[i].shape[1:]) for a in arrays], axis=1)
+                     for i in range(3))
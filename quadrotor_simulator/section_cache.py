@@ -0,0 +1,144 @@
+# -*- coding: utf-8 -*-
+#       __SECTION_CACHE__
+#       This file implements a content addressed cache of
+#       the sections integrated by QuadrotorDynamics.update_state
+
+import hashlib
+import os
+from collections import OrderedDict, namedtuple
+
+import numpy as np
+
+SectionEntry = namedtuple('SectionEntry', [
+    'states', 'history_t', 'history', 'current_row', 'current_t', 'current_state_dot'])
+SectionEntry.__doc__ = """Outcome of integrating a section
+
+states : numpy.array
+    (n, 12) states at the sampling times of the section
+history_t, history : numpy.array
+    Times relative to the start of the section and (k, 19) rows recorded
+    in df_state_history, None when they were not recorded
+current_row, current_t, current_state_dot :
+    Last right-hand side evaluation, current_t relative to the start
+"""
+
+
+def _entry_bytes(entry):
+    return sum(value.nbytes for value in entry if isinstance(value, np.ndarray))
+
+
+class SectionCache(object):
+    def __init__(self, max_bytes=64 * 2 ** 20, directory=None, resolution=1e-9):
+        """LRU cache of integrated sections with an optional disk tier
+
+        Entries are keyed by the initial state quantized to resolution, the
+        section inputs, its number of samples, dt, the vehicle constants,
+        the integrator, the attitude model and whether df_state_history
+        rows are stored. A hit replays the stored trajectory, so states
+        closer than resolution share their trajectories.
+
+        Parameters
+        ----------
+        max_bytes : int
+            Memory budget of the arrays held in memory, least recently used
+            entries are evicted beyond it
+        directory : str, optional
+            When given, every entry is also saved there as a .npz file and
+            entries missing from memory are looked up on disk
+        resolution : float
+            Quantization step of the initial state
+
+        Attributes
+        ----------
+        hits, disk_hits, misses, evictions : int
+            Lookups served from memory, from disk and not served, and
+            entries evicted from memory
+        """
+        self.max_bytes = max_bytes
+        self.directory = directory
+        self.resolution = resolution
+        self.nbytes = 0
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._entries = OrderedDict()
+        if directory is not None and not os.path.isdir(directory):
+            os.makedirs(directory)
+
+    def __len__(self):
+        return len(self._entries)
+
+    def key(self, state, total_thrust, desired_angular_acc, n_samples, dt, vehicle, integrator, history=True,
+            attitude='euler'):
+        """Hex digest identifying a section integrated from state"""
+        digest = hashlib.sha1()
+        digest.update(np.round(np.asarray(state) / self.resolution).astype(np.int64).tobytes())
+        digest.update(np.array([total_thrust] + list(desired_angular_acc) + [n_samples, dt], dtype=float).tobytes())
+        digest.update(vehicle.array.tobytes())
+        options = sorted(getattr(integrator, 'options', {}).items())
+        digest.update(repr((integrator.name, options, bool(history), attitude)).encode('utf-8'))
+        return digest.hexdigest()
+
+    def get(self, key):
+        """The SectionEntry stored under key or None"""
+        entry = self._entries.get(key)
+        if entry is not None:
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry
+        if self.directory is not None:
+            path = self._path(key)
+            if os.path.exists(path):
+                with np.load(path) as data:
+                    entry = SectionEntry(*(data[name] if name in data else None for name in SectionEntry._fields))
+                entry = entry._replace(current_t=float(entry.current_t))
+                self._remember(key, entry)
+                self.disk_hits += 1
+                return entry
+        self.misses += 1
+        return None
+
+    def put(self, key, entry):
+        self._remember(key, entry)
+        if self.directory is not None:
+            arrays = {name: value for name, value in zip(SectionEntry._fields, entry) if value is not None}
+            # Written then renamed so that concurrent readers never see a partial file
+            path = self._path(key)
+            with open(path + '.tmp', 'wb') as f:
+                np.savez(f, **arrays)
+            os.replace(path + '.tmp', path)
+
+    def clear(self):
+        """Empty the memory tier, the disk tier is kept"""
+        self._entries.clear()
+        self.nbytes = 0
+
+    def stats(self):
+        """Hit and miss counters and memory use"""
+        lookups = self.hits + self.disk_hits + self.misses
+        return {
+            'hits': self.hits,
+            'disk_hits': self.disk_hits,
+            'misses': self.misses,
+            'hit_rate': (self.hits + self.disk_hits) / float(lookups) if lookups else 0.0,
+            'evictions': self.evictions,
+            'entries': len(self._entries),
+            'nbytes': self.nbytes,
+        }
+
+    def _remember(self, key, entry):
+        size = _entry_bytes(entry)
+        if size > self.max_bytes:
+            return
+        if key in self._entries:
+            self.nbytes -= _entry_bytes(self._entries.pop(key))
+        self._entries[key] = entry
+        self.nbytes += size
+        while self.nbytes > self.max_bytes:
+            _, evicted = self._entries.popitem(last=False)
+            self.nbytes -= _entry_bytes(evicted)
+            self.evictions += 1
+
+    def _path(self, key):
+        return os.path.join(self.directory, key + '.npz')
@@ -0,0 +1,237 @@
+# -*- coding: utf-8 -*-
+#       __STATE_BUS__
+#       This file implements a shared memory ring buffer
+#       publishing the simulated states to other processes
+#
+#       One StatePublisher writes, any number of StateSubscriber read, without
+#       locks: each slot carries a sequence number (a seqlock) that is odd
+#       while the slot is written and equal to 2 * (n + 1) once it holds the
+#       n-th published row. A reader copies a slot between two reads of its
+#       sequence number and drops the copy when they differ or when the slot
+#       was overwritten since. Memory layout, 8 byte words:
+#
+#           header : magic, version, capacity, width, head, closed, 0, 0
+#           slots  : capacity x [sequence (int64), row (width float64)]
+#
+#       head is the number of rows published so far, updated after the row.
+#       Aligned 8 byte stores are atomic and stay in program order on x86-64,
+#       the platforms with a weaker memory model are not supported.
+
+from collections import namedtuple
+from multiprocessing import shared_memory
+
+import numpy as np
+
+MAGIC = 0x5154524255530001  # 'QTRBUS' and version 1
+VERSION = 1
+HEADER_WORDS = 8
+
+COLUMNS = ('t', 'x', 'y', 'z', 'x_dot', 'y_dot', 'z_dot', 'phi', 'theta', 'psi', 'p', 'q', 'r', 'total_thrust',
+           'dp/dt', 'dq/dt', 'dr/dt')
+# Columns of the rows
+T = 0
+STATE = slice(1, 13)
+TOTAL_THRUST = 13
+DESIRED_ANGULAR_ACC = slice(14, 17)
+
+# Header words
+_MAGIC, _VERSION, _CAPACITY, _WIDTH, _HEAD, _CLOSED = range(6)
+
+BusSample = namedtuple('BusSample', ['index', 't', 'state', 'total_thrust', 'desired_angular_acc'])
+BusSample.__doc__ = """A row read from the bus
+
+index : int
+    Number of rows published before it
+t : float
+    Simulation time
+state : numpy.array
+    The 12 states
+total_thrust, desired_angular_acc :
+    The inputs of the section the state belongs to
+"""
+
+
+class _SharedRing(object):
+    def __init__(self, shm, capacity, width):
+        self.shm = shm
+        self.capacity = capacity
+        self.width = width
+        self._header = np.ndarray(HEADER_WORDS, dtype=np.int64, buffer=shm.buf)
+        slots = np.ndarray((capacity, width + 1), dtype=np.float64, buffer=shm.buf, offset=HEADER_WORDS * 8)
+        # The sequence numbers share the slots with the rows, viewed as integers
+        self._sequences = slots[:, 0].view(np.int64)
+        self._rows = slots[:, 1:]
+
+    @property
+    def name(self):
+        """Name under which subscribers attach the bus"""
+        return self.shm.name
+
+    @property
+    def head(self):
+        """Number of rows published so far"""
+        return int(self._header[_HEAD])
+
+    @property
+    def closed(self):
+        """Whether the publisher announced that no row will follow"""
+        return bool(self._header[_CLOSED])
+
+    def close(self):
+        """Release the mapping of this process"""
+        if self.shm is None:
+            return
+        # The views must go before the buffer they are made from
+        self._header = self._sequences = self._rows = None
+        self.shm.close()
+        self.shm = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+class StatePublisher(_SharedRing):
+    def __init__(self, capacity=4096, name=None):
+        """Single writer of a state bus
+
+        Parameters
+        ----------
+        capacity : int
+            Number of rows kept, older rows are overwritten
+        name : str, optional
+            Name of the shared memory block, a random one by default
+        """
+        width = len(COLUMNS)
+        shm = shared_memory.SharedMemory(name=name, create=True, size=(HEADER_WORDS + capacity * (width + 1)) * 8)
+        super(StatePublisher, self).__init__(shm, capacity, width)
+        self._header[:] = 0
+        self._sequences[:] = 0
+        self._header[_VERSION] = VERSION
+        self._header[_CAPACITY] = capacity
+        self._header[_WIDTH] = width
+        # Written last, subscribers refuse a block without it
+        self._header[_MAGIC] = MAGIC
+        self._head = 0
+        self._last_t = None
+
+    def publish(self, t, state, total_thrust, desired_angular_acc):
+        """Append one row, overwriting the oldest one when the ring is full"""
+        slot = self._head % self.capacity
+        self._sequences[slot] = 2 * self._head + 1
+        row = self._rows[slot]
+        row[T] = t
+        row[STATE] = state
+        row[TOTAL_THRUST] = total_thrust
+        row[DESIRED_ANGULAR_ACC] = desired_angular_acc
+        self._sequences[slot] = 2 * self._head + 2
+        self._head += 1
+        self._header[_HEAD] = self._head
+        self._last_t = t
+
+    def publish_section(self, ts, states, total_thrust, desired_angular_acc):
+        """Append the samples of a section, those not after the last published time are skipped"""
+        for t, state in zip(ts, states):
+            if self._last_t is None or t > self._last_t:
+                self.publish(t, state, total_thrust, desired_angular_acc)
+
+    def finish(self):
+        """Tell the subscribers that no row will follow"""
+        self._header[_CLOSED] = 1
+
+    def unlink(self):
+        """Remove the name of the block, call it before close
+
+        Subscribers already attached keep their mapping.
+        """
+        self.shm.unlink()
+
+    def __exit__(self, *exc):
+        self.finish()
+        self.unlink()
+        self.close()
+
+
+class StateSubscriber(_SharedRing):
+    def __init__(self, name):
+        """Reader of the state bus published under name, from any process
+
+        Parameters
+        ----------
+        name : str
+            StatePublisher.name
+
+        Attributes
+        ----------
+        rows : numpy.array
+            (capacity, len(COLUMNS)) view of the ring itself, row n % capacity
+            holds the n-th published row. Reading it is zero-copy but not
+            checked against concurrent writes, see read and latest.
+        """
+        shm = shared_memory.SharedMemory(name=name)
+        header = np.ndarray(HEADER_WORDS, dtype=np.int64, buffer=shm.buf)
+        if header[_MAGIC] != MAGIC or header[_VERSION] != VERSION:
+            del header
+            shm.close()
+            raise ValueError('{} is not a state bus'.format(name))
+        capacity, width = int(header[_CAPACITY]), int(header[_WIDTH])
+        del header
+        super(StateSubscriber, self).__init__(shm, capacity, width)
+
+    @property
+    def rows(self):
+        return self._rows
+
+    def latest(self, retries=100):
+        """The last published row as a BusSample, None before the first one"""
+        for _ in range(retries):
+            head = self.head
+            if not head:
+                return None
+            index = head - 1
+            row = self._read(index)
+            if row is not None:
+                return BusSample(index, row[T], row[STATE], row[TOTAL_THRUST], row[DESIRED_ANGULAR_ACC])
+        raise RuntimeError('The publisher kept overwriting the last row')
+
+    def read(self, start=0):
+        """Rows published from index start on, as far as the ring still holds them
+
+        Parameters
+        ----------
+        start : int
+            Index of the first wanted row, the next index returned by the
+            previous call to follow the bus without missing rows
+
+        Returns
+        -------
+        indices : numpy.array
+            (n,) indices of the rows, rows overwritten before they could be
+            copied are missing
+        rows : numpy.array
+            (n, len(COLUMNS)) copy of the rows
+        next : int
+            Index following the last published row
+        """
+        head = self.head
+        indices = np.arange(max(start, head - self.capacity), head)
+        slots = indices % self.capacity
+        expected = 2 * indices + 2
+        before = self._sequences[slots]
+        rows = self._rows[slots]
+        after = self._sequences[slots]
+        valid = (before == expected) & (after == expected)
+        return indices[valid], rows[valid], head
+
+    def _read(self, index):
+        """Copy of the row index or None when it is being or was overwritten"""
+        slot = index % self.capacity
+        expected = 2 * index + 2
+        if self._sequences[slot] != expected:
+            return None
+        row = self._rows[slot].copy()
+        if self._sequences[slot] != expected:
+            return None
+        return row
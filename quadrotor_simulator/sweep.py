@@ -0,0 +1,215 @@
+# -*- coding: utf-8 -*-
+#       __SWEEP__
+#       This file implements parameter sweeps of
+#       multi-flips spread over a process pool
+
+import itertools
+import multiprocessing
+from multiprocessing import shared_memory
+
+import numpy as np
+
+from quadrotor_simulator.flips import FLIP_PARAMETERS, SimulationParams, flip_sections
+from quadrotor_simulator.learning import flip_residual
+from quadrotor_simulator.metrics import FINAL_ERRORS, METRICS
+from quadrotor_simulator.quadrotor_dynamics import QuadrotorDynamics
+from quadrotor_simulator.section_cache import SectionCache
+
+# Columns written by each run in the shared result array, then the trajectory metrics
+# accumulated while simulating, the final errors being the first columns
+RESULT_COLUMNS = ('position_error', 'velocity_error', 'attitude_error', 'x', 'y', 'z', 'x_dot', 'y_dot', 'z_dot',
+                  'phi', 'theta', 'psi', 'p', 'q', 'r') + METRICS[:FINAL_ERRORS.start]
+
+
+def grid(**values):
+    """Cartesian product of flip parameter values
+
+    >>> grid(Bup=[20, 21.58], p1=[0.1, 0.2])  # 4 runs
+
+    Returns
+    -------
+    pandas.DataFrame
+        One run per row, missing parameters are filled by ``run_sweep``
+    """
+    import pandas as pd
+
+    names = list(values)
+    return pd.DataFrame(list(itertools.product(*(np.atleast_1d(values[name]) for name in names))),
+                        columns=names, dtype=float)
+
+
+def random_sample(n, bounds, seed=None):
+    """Uniform random sample of flip parameters
+
+    Parameters
+    ----------
+    n : int
+        Number of runs
+    bounds : dict
+        {name: (low, high)} for each sampled parameter
+    seed : int, optional
+        Seed of the random generator
+    """
+    import pandas as pd
+
+    rng = np.random.RandomState(seed)
+    return pd.DataFrame({name: rng.uniform(low, high, n) for name, (low, high) in bounds.items()})
+
+
+def _complete_parameters(parameters):
+    """Parameters as an (n, 9) array in FLIP_PARAMETERS order
+
+    Missing or NaN p0..p4 are replaced by the initial parameters of the run.
+    """
+    gen = SimulationParams()
+    defaults = {'Bup': gen.Bup, 'Bdown': gen.Bdown, 'Cpmax': gen.Cpmax, 'Cn': gen.Cn}
+    unknown = set(parameters.columns) - set(FLIP_PARAMETERS)
+    if unknown:
+        raise ValueError('Unknown flip parameters: {}'.format(', '.join(sorted(unknown))))
+    array = np.empty((len(parameters), len(FLIP_PARAMETERS)))
+    for i, name in enumerate(FLIP_PARAMETERS):
+        if name in parameters:
+            array[:, i] = parameters[name].values
+        else:
+            array[:, i] = defaults.get(name, np.nan)
+    flip_times = array[:, 4:]
+    for row in np.flatnonzero(np.isnan(flip_times).any(axis=1)):
+        gen = SimulationParams(turns=array[row, 3], Bup=array[row, 0], Bdown=array[row, 1], Cpmax=array[row, 2])
+        missing = np.isnan(flip_times[row])
+        flip_times[row, missing] = np.array(gen.get_initial_parameters())[missing]
+    return array
+
+
+def flip_errors(state, turns):
+    """Final position, velocity and attitude errors of a multi-flip
+
+    The norms of the parts of ``flip_residual``, the error learned by
+    FlipLearner.
+    """
+    residual = flip_residual(state, turns)
+    return np.linalg.norm(residual[:3]), np.linalg.norm(residual[3:6]), np.linalg.norm(residual[6:9])
+
+
+_worker = {}
+
+
+def _attach(parameters_name, results_name, n_runs, config, dt, section_cache):
+    """Pool initializer, maps the shared arrays once per process"""
+    _worker['parameters_shm'] = shared_memory.SharedMemory(name=parameters_name)
+    _worker['results_shm'] = shared_memory.SharedMemory(name=results_name)
+    _worker['parameters'] = np.ndarray((n_runs, len(FLIP_PARAMETERS)), buffer=_worker['parameters_shm'].buf)
+    _worker['results'] = np.ndarray((n_runs, len(RESULT_COLUMNS)), buffer=_worker['results_shm'].buf)
+    # One model per process, reset before each run. Runs sharing leading sections replay them
+    _worker['quadrotor'] = QuadrotorDynamics(save_state=False, config=config, dt=dt,
+                                             section_cache=SectionCache() if section_cache else None)
+
+
+def _detach():
+    parameters_shm = _worker['parameters_shm']
+    results_shm = _worker['results_shm']
+    _worker.clear()
+    parameters_shm.close()
+    results_shm.close()
+
+
+def _run_chunk(bounds):
+    start, stop = bounds
+    for i in range(start, stop):
+        _worker['results'][i] = _simulate(_worker['quadrotor'], _worker['parameters'][i])
+    return stop - start
+
+
+def simulate_flip(parameters, config=None, dt=0.005, section_cache=None):
+    """Run one multi-flip and return its RESULT_COLUMNS row
+
+    Parameters
+    ----------
+    parameters : numpy.array
+        Values in FLIP_PARAMETERS order
+    section_cache : SectionCache, optional
+        Cache shared by the runs, see QuadrotorDynamics
+    """
+    quadrotor = QuadrotorDynamics(save_state=False, config=config, dt=dt, section_cache=section_cache)
+    return _simulate(quadrotor, parameters)
+
+
+def _simulate(quadrotor, parameters):
+    """simulate_flip flown by a model reset to rest at the origin"""
+    flip = dict(zip(FLIP_PARAMETERS, parameters))
+    quadrotor.t_start = 0
+    quadrotor.current_state = np.zeros(12)
+    metrics = quadrotor.track_metrics()
+    state = quadrotor.run_sections(flip_sections(**flip))
+    return np.concatenate((flip_errors(state, flip['Cn']), state, metrics.result()[:FINAL_ERRORS.start]))
+
+
+def run_sweep(parameters, processes=None, chunksize=None, config=None, dt=0.005, section_cache=False):
+    """Simulate every multi-flip of a sweep over a process pool
+
+    Runs are dispatched to the workers by chunks of consecutive rows. The
+    parameters and the results live in shared memory, so only the chunk
+    bounds are pickled.
+
+    Parameters
+    ----------
+    parameters : pandas.DataFrame or dict
+        One run per row with columns among FLIP_PARAMETERS, see ``grid`` and
+        ``random_sample``. Missing Bup, Bdown, Cpmax, Cn take the default of
+        SimulationParams and missing p0..p4 their initial value.
+    processes : int, optional
+        Number of worker processes, all the cores by default. With 1 the
+        sweep runs in the calling process.
+    chunksize : int, optional
+        Number of runs per task, by default about 4 tasks per process
+    config : dict, optional
+        Vehicle configuration passed to QuadrotorDynamics
+    dt : float
+        Simulation step
+    section_cache : bool
+        Replay the sections shared by the runs of each worker from a
+        SectionCache. Its keys quantize the states, so the results may then
+        depend on the chunking and not only on the parameters, the sweep is
+        only deterministic without it.
+
+    Returns
+    -------
+    pandas.DataFrame
+        The parameters of each run followed by its RESULT_COLUMNS
+    """
+    import pandas as pd
+
+    parameters = pd.DataFrame(parameters)
+    array = _complete_parameters(parameters)
+    n_runs = len(array)
+    processes = processes or multiprocessing.cpu_count()
+    if chunksize is None:
+        chunksize = max(1, int(np.ceil(n_runs / (4.0 * processes))))
+
+    parameters_shm = shared_memory.SharedMemory(create=True, size=max(1, array.nbytes))
+    results_shm = shared_memory.SharedMemory(create=True, size=max(1, n_runs * len(RESULT_COLUMNS) * 8))
+    try:
+        np.ndarray(array.shape, buffer=parameters_shm.buf)[:] = array
+        init_args = (parameters_shm.name, results_shm.name, n_runs, config, dt, section_cache)
+        chunks = [(start, min(start + chunksize, n_runs)) for start in range(0, n_runs, chunksize)]
+        if processes == 1:
+            _attach(*init_args)
+            try:
+                for chunk in chunks:
+                    _run_chunk(chunk)
+            finally:
+                _detach()
+        else:
+            with multiprocessing.Pool(processes, initializer=_attach, initargs=init_args) as pool:
+                for _ in pool.imap_unordered(_run_chunk, chunks):
+                    pass
+        results = np.ndarray((n_runs, len(RESULT_COLUMNS)), buffer=results_shm.buf).copy()
+    finally:
+        parameters_shm.close()
+        parameters_shm.unlink()
+        results_shm.close()
+        results_shm.unlink()
+
+    summary = pd.DataFrame(array, columns=FLIP_PARAMETERS, index=parameters.index)
+    for i, name in enumerate(RESULT_COLUMNS):
+        summary[name] = results[:, i]
+    return summary
@@ -0,0 +1,277 @@
+# -*- coding: utf-8 -*-
+#       __TRAJECTORY_IO__
+#       This file implements a compact binary trajectory
+#       format, written while simulating and memory-mapped to read
+#
+#       Layout: 8 bytes magic, the header size, the number of rows and the
+#       number of sections as 8 bytes integers, the JSON header, the rows
+#       and a trailing table of sections. Each row holds the run as an
+#       int64, t as a float64 and the VALUES in the dtype of the file. The
+#       number of sections is -1 while rows are appended after the last
+#       flush, the table being overwritten by them.
+
+import json
+import os
+import struct
+
+import numpy as np
+from quadrotor_simulator.recorder import column_index
+
+MAGIC = b'QTRAJ002'
+
+PREFIX = struct.Struct('<Qqq')
+
+CHANNELS = ('run', 't', 'x', 'y', 'z', 'x_dot', 'y_dot', 'z_dot', 'phi', 'theta', 'psi', 'p', 'q', 'r',
+            'thrust_1', 'thrust_2', 'thrust_3', 'thrust_4', 'dp/dt', 'dq/dt', 'dr/dt')
+
+# Channels stored in the 'values' field of a row, the rows of df_state_history
+VALUES = CHANNELS[2:]
+
+# Slices of VALUES
+STATE = slice(0, 12)
+THRUST = slice(12, 16)
+DESIRED_ANGULAR_ACC = slice(16, 19)
+
+SECTION_DTYPE = np.dtype([('run', '<i8'), ('t_start', '<f8'), ('t', '<f8'), ('total_thrust', '<f8'),
+                          ('desired_angular_acc', '<f8', (3,))])
+
+
+def row_dtype(dtype):
+    """Structured dtype of the rows of a file whose values are stored as dtype"""
+    return np.dtype([('run', '<i8'), ('t', '<f8'), ('values', np.dtype(dtype).newbyteorder('<'), (len(VALUES),))])
+
+
+def _to_json(value):
+    if isinstance(value, np.ndarray):
+        return value.tolist()
+    if isinstance(value, np.generic):
+        return value.item()
+    raise TypeError('{!r} is not JSON serializable'.format(value))
+
+
+class TrajectoryWriter(object):
+    def __init__(self, path, config=None, dtype='float64', metadata=None):
+        """Stream rows of CHANNELS to a file
+
+        The header holds the config and the metadata, it is written once
+        when the file is created, so that a config or metadata which is
+        not JSON serializable fails before any row is written. The
+        sections are kept in a binary table after the rows, rewritten by
+        ``flush`` and ``close``, so there is no limit on their number.
+
+        Parameters
+        ----------
+        path : str
+            Output file
+        config : dict, optional
+            Vehicle configuration stored in the header
+        dtype : str
+            'float64' or 'float32', the run and t channels are always
+            int64 and float64
+        metadata : dict, optional
+            Any JSON serializable data stored in the header
+        """
+        self.path = path
+        self.dtype = np.dtype(dtype)
+        if self.dtype not in (np.dtype('float64'), np.dtype('float32')):
+            raise ValueError('dtype must be float64 or float32')
+        self.row_dtype = row_dtype(self.dtype)
+        self.config = dict(config) if config else {}
+        self.metadata = metadata or {}
+        header = json.dumps({
+            'channels': CHANNELS,
+            'dtype': self.dtype.name,
+            'config': self.config,
+            'metadata': self.metadata,
+        }, default=_to_json).encode('utf-8')
+        self.header_size = len(header)
+        self.sections = []
+        self.n_rows = 0
+        self.run = 0
+        self._last_t = None
+        self._file = open(path, 'wb')
+        self._file.write(MAGIC + PREFIX.pack(self.header_size, 0, 0) + header)
+        self._rows_offset = self._file.tell()
+        self._table_valid = True
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def new_run(self, run=None):
+        """Following rows belong to a new run, runs must be written one after the other"""
+        self.run = self.run + 1 if run is None else run
+        self._last_t = None
+
+    def write(self, ts, states, thrusts, desired_angular_acc):
+        """Append rows, samples not after the last written time of the run are skipped
+
+        Parameters
+        ----------
+        ts : numpy.array
+            (n,) times
+        states : numpy.array
+            (n, 12) states
+        thrusts : numpy.array
+            (n, 4) motor thrusts
+        desired_angular_acc : numpy.array
+            (n, 3) or (3,) desired angular accelerations
+        """
+        ts = np.asarray(ts, dtype=float)
+        keep = slice(None) if self._last_t is None else ts > self._last_t
+        ts = ts[keep]
+        if not len(ts):
+            return
+        rows = np.empty(len(ts), dtype=self.row_dtype)
+        rows['run'] = self.run
+        rows['t'] = ts
+        values = rows['values']
+        values[:, STATE] = np.asarray(states)[keep]
+        values[:, THRUST] = np.asarray(thrusts)[keep]
+        desired_angular_acc = np.asarray(desired_angular_acc, dtype=float)
+        values[:, DESIRED_ANGULAR_ACC] = desired_angular_acc[keep] if desired_angular_acc.ndim == 2 \
+            else desired_angular_acc
+        if self._table_valid:
+            # The rows replace the section table until the next flush
+            self._write_prefix(-1)
+            self._file.truncate()
+            self._table_valid = False
+        self._file.write(rows.tobytes())
+        self.n_rows += len(ts)
+        self._last_t = ts[-1]
+
+    def write_section(self, ts, states, total_thrust, desired_angular_acc, vehicle):
+        """Append the samples of a section integrated with constant inputs
+
+        The motor thrusts of each sample are computed from the state and the
+        section is added to the section table.
+        """
+        from quadrotor_simulator.batch import section_rows
+
+        states = np.asarray(states)
+        desired_angular_acc = [float(a) for a in desired_angular_acc]
+        thrusts = section_rows(states, total_thrust, desired_angular_acc, vehicle)[:, 12:16]
+        self.write(ts, states, thrusts, desired_angular_acc)
+
+        section = {'run': self.run, 't_start': float(ts[0]), 't': float(ts[-1] - ts[0]),
+                   'total_thrust': float(total_thrust), 'desired_angular_acc': desired_angular_acc}
+        last = self.sections[-1] if self.sections else None
+        if (last is not None and last['run'] == self.run and last['total_thrust'] == section['total_thrust'] and
+                last['desired_angular_acc'] == desired_angular_acc and
+                np.isclose(last['t_start'] + last['t'], section['t_start'])):
+            # Consecutive steps with the same inputs, as produced by step(), form one section
+            last['t'] = section['t_start'] + section['t'] - last['t_start']
+        else:
+            self.sections.append(section)
+
+    def flush(self):
+        """Write the section table and the number of rows, and flush the file"""
+        table = np.empty(len(self.sections), dtype=SECTION_DTYPE)
+        for i, section in enumerate(self.sections):
+            table[i] = (section['run'], section['t_start'], section['t'], section['total_thrust'],
+                        section['desired_angular_acc'])
+        rows_end = self._rows_offset + self.n_rows * self.row_dtype.itemsize
+        self._file.seek(rows_end)
+        self._file.write(table.tobytes())
+        self._file.truncate()
+        self._write_prefix(len(table))
+        self._table_valid = True
+        self._file.seek(rows_end)
+        self._file.flush()
+
+    def close(self):
+        if not self._file.closed:
+            self.flush()
+            self._file.close()
+
+    def _write_prefix(self, n_sections):
+        position = self._file.tell()
+        self._file.seek(len(MAGIC))
+        self._file.write(PREFIX.pack(self.header_size, self.n_rows, n_sections))
+        self._file.seek(position)
+
+
+class Trajectory(object):
+    def __init__(self, path):
+        """Memory-mapped view of a file written by TrajectoryWriter
+
+        Attributes
+        ----------
+        header : dict
+            The JSON header
+        data : numpy.memmap
+            (n_rows,) rows of row_dtype, with the 'run', 't' and 'values'
+            fields, nothing is read before it is accessed
+        sections : numpy.array
+            Sections of SECTION_DTYPE, empty when the file is read while
+            rows are appended after the last flush
+        """
+        with open(path, 'rb') as f:
+            magic = f.read(len(MAGIC))
+            if magic != MAGIC:
+                raise ValueError('{} is not a trajectory file'.format(path))
+            header_size, n_rows, n_sections = PREFIX.unpack(f.read(PREFIX.size))
+            self.header = json.loads(f.read(header_size).decode('utf-8'))
+        dtype = row_dtype(self.header['dtype'])
+        offset = len(MAGIC) + PREFIX.size + header_size
+        if n_sections < 0:
+            # Rows written after the last flush are readable as well
+            n_rows = (os.path.getsize(path) - offset) // dtype.itemsize
+        self.n_rows = n_rows
+        self.data = self._map(path, dtype, offset, n_rows)
+        if n_sections > 0:
+            self.sections = np.fromfile(path, dtype=SECTION_DTYPE, count=n_sections,
+                                        offset=offset + n_rows * dtype.itemsize)
+        else:
+            self.sections = np.empty(0, dtype=SECTION_DTYPE)
+
+    @staticmethod
+    def _map(path, dtype, offset, n):
+        if n:
+            return np.memmap(path, dtype=dtype, mode='r', offset=offset, shape=(n,))
+        return np.empty(0, dtype=dtype)
+
+    def __len__(self):
+        return len(self.data)
+
+    @property
+    def config(self):
+        return self.header['config']
+
+    def channel(self, name):
+        """Strided view of one of CHANNELS"""
+        if name in ('run', 't'):
+            return self.data[name]
+        return self.data['values'][:, VALUES.index(name)]
+
+    def runs(self):
+        return np.unique(self.data['run'])
+
+    def select(self, run=None, t_start=None, t_end=None):
+        """Rows of a run within [t_start, t_end], as a view
+
+        Runs are contiguous and sorted by time, so only the bounds are
+        searched.
+        """
+        data = self.data
+        if run is not None:
+            runs = data['run']
+            start = np.searchsorted(runs, run, side='left')
+            stop = np.searchsorted(runs, run, side='right')
+            data = data[start:stop]
+        ts = data['t']
+        start = 0 if t_start is None else np.searchsorted(ts, t_start, side='left')
+        stop = len(ts) if t_end is None else np.searchsorted(ts, t_end, side='right')
+        return data[start:stop]
+
+    def to_dataframe(self, run=None, t_start=None, t_end=None):
+        """Selected rows with the columns of QuadrotorDynamics.df_state_history"""
+        import pandas as pd
+
+        from quadrotor_simulator.quadrotor_dynamics import STATE_HISTORY_COLUMNS
+
+        rows = self.select(run, t_start, t_end)
+        return pd.DataFrame(np.asarray(rows['values'], dtype=float), index=np.array(rows['t']),
+                            columns=column_index(STATE_HISTORY_COLUMNS))
@@ -0,0 +1,118 @@
+# -*- coding: utf-8 -*-
+#       __VEHICLE__
+#       This file implements the constants of a vehicle
+#       derived once from its configuration
+
+from collections import namedtuple
+
+import numpy as np
+
+from quadrotor_simulator.mixer import get_mixer
+
+
+def vehicle_array(config):
+    """Pack a QuadrotorDynamics config into the float array used by quadrotor_simulator.kernels
+
+    The layout is given by kernels.MASS, GRAVITY, ..., JZZ. It is packed
+    here so that building a vehicle does not import the kernels and numba.
+    """
+    (ixx, iyy, izz) = config['inertia']
+    return np.array([config['mass'], config['gravity'], config['length'], config['thrustToDrag'],
+                     ixx, iyy, izz, 1.0 / ixx, 1.0 / iyy, 1.0 / izz], dtype=float)
+
+
+def _frozen(array):
+    array = np.array(array, dtype=float)
+    array.flags.writeable = False
+    return array
+
+
+class VehicleParams(namedtuple('VehicleParams', [
+        'mass', 'gravity', 'length', 'thrust_to_drag', 'inertia', 'inverse_inertia', 'inertia_matrix',
+        'inverse_inertia_matrix', 'mixer', 'inverse_mixer', 'gravity_vector', 'array'])):
+    """Immutable vehicle constants computed from a config
+
+    mass, gravity, length, thrust_to_drag : float
+        Copied from the config
+    inertia, inverse_inertia : numpy.array
+        [Ixx, Iyy, Izz] and [1/Ixx, 1/Iyy, 1/Izz]
+    inertia_matrix, inverse_inertia_matrix : numpy.array
+        The 3x3 diagonal matrices
+    mixer : numpy.array
+        4x4 allocation matrix of the '+' layout mapping the motor thrusts
+        [T1, T2, T3, T4] to the total thrust and the moments [T, Mp, Mq, Mr]
+    inverse_mixer : numpy.array
+        Inverse of mixer, used by motor_thrust
+    gravity_vector : numpy.array
+        [0, 0, gravity]
+    array : numpy.array
+        Packed constants consumed by quadrotor_simulator.kernels
+    """
+    __slots__ = ()
+
+    @classmethod
+    def from_config(cls, config):
+        inertia = _frozen(config['inertia'])
+        length = float(config['length'])
+        thrust_to_drag = float(config['thrustToDrag'])
+        mixer = get_mixer('+', length, thrust_to_drag)
+        return cls(
+            mass=float(config['mass']),
+            gravity=float(config['gravity']),
+            length=length,
+            thrust_to_drag=thrust_to_drag,
+            inertia=inertia,
+            inverse_inertia=_frozen(1.0 / inertia),
+            inertia_matrix=_frozen(np.diag(inertia)),
+            inverse_inertia_matrix=_frozen(np.diag(1.0 / inertia)),
+            mixer=mixer.allocation,
+            inverse_mixer=mixer.pseudo_inverse,
+            gravity_vector=_frozen([0, 0, config['gravity']]),
+            array=_frozen(vehicle_array(config)),
+        )
+
+
+class VehicleConfig(dict):
+    """Config dict counting its updates so that derived constants can be cached
+
+    Only assignments to the dict are tracked, replace arrays such as
+    'inertia' instead of modifying them in place.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super(VehicleConfig, self).__init__(*args, **kwargs)
+        self.version = 0
+
+    def _changed(self):
+        self.version += 1
+
+    def __setitem__(self, key, value):
+        super(VehicleConfig, self).__setitem__(key, value)
+        self._changed()
+
+    def __delitem__(self, key):
+        super(VehicleConfig, self).__delitem__(key)
+        self._changed()
+
+    def update(self, *args, **kwargs):
+        super(VehicleConfig, self).update(*args, **kwargs)
+        self._changed()
+
+    def setdefault(self, key, default=None):
+        value = super(VehicleConfig, self).setdefault(key, default)
+        self._changed()
+        return value
+
+    def pop(self, *args):
+        value = super(VehicleConfig, self).pop(*args)
+        self._changed()
+        return value
+
+    def popitem(self):
+        item = super(VehicleConfig, self).popitem()
+        self._changed()
+        return item
+
+    def clear(self):
+        super(VehicleConfig, self).clear()
+        self._changed()
@@ -0,0 +1,92 @@
+import numpy as np
+import pytest
+from scipy.linalg import expm
+
+from quadrotor_simulator.attitude import euler_to_quaternion, quaternion_to_euler
+from quadrotor_simulator.flips import Section, SimulationParams
+from quadrotor_simulator.quadrotor_dynamics import QuadrotorDynamics, rotation_matrix
+
+gen = SimulationParams(turns=2)
+sections = gen.get_sections(gen.get_initial_parameters())
+
+
+def test_conversions():
+    angles = np.array([[0.3, -0.2, 1.0], [2.5, 1.2, -3.0], [-0.1, 0.0, 0.2]])
+    quaternions = np.array([euler_to_quaternion(*a) for a in angles])
+    np.testing.assert_allclose(np.linalg.norm(quaternions, axis=1), 1)
+    # Each row on its own, no unwrapping between unrelated rows
+    for a, q in zip(angles, quaternions):
+        np.testing.assert_allclose(quaternion_to_euler(q[np.newaxis]), [a], atol=1e-12)
+    # phi keeps increasing through several turns
+    phis = np.linspace(0, 6 * np.pi, 50)
+    rolled = np.array([euler_to_quaternion(phi, 0, 0) for phi in phis])
+    np.testing.assert_allclose(quaternion_to_euler(rolled)[:, 0], phis, atol=1e-12)
+    np.testing.assert_allclose(quaternion_to_euler(rolled[1:], reference=[phis[0], 0, 0])[:, 0], phis[1:],
+                               atol=1e-12)
+
+
+def test_quaternion_matches_euler_flip():
+    expected = QuadrotorDynamics()
+    expected.update_state(sections)
+    quadrotor = QuadrotorDynamics(attitude='quaternion')
+    quadrotor.update_state(sections)
+
+    np.testing.assert_allclose(quadrotor.df_state.values, expected.df_state.values, atol=1e-5)
+    assert list(quadrotor.df_state_history.columns) == list(expected.df_state_history.columns)
+    # The Euler angles of the history are unwrapped
+    assert np.abs(np.diff(quadrotor.df_state_history.orientation.phi.values)).max() < 1
+    # The last evaluation, at a time chosen by the integrator, in the Euler schema
+    current = quadrotor.df_current_state
+    assert list(current.columns) == list(expected.df_current_state.columns)
+    assert current.orientation.phi.values[0] == pytest.approx(quadrotor.current_state[6], abs=0.1)
+    phi_dot = quadrotor.df_current_state_dot.omega.phi_dot.values[0]
+    assert phi_dot == pytest.approx(current.omega.phi_dot.values[0])
+    assert quadrotor.current_state[6] > 3 * np.pi
+    assert quadrotor.integrator.nfev <= expected.integrator.nfev
+
+
+def test_constant_body_rates():
+    # Without desired angular acceleration the body rates stay constant
+    omega = np.array([3.0, 7.0, -2.0])
+    quadrotor = QuadrotorDynamics(attitude='quaternion', dt=0.01)
+    quadrotor.current_state[9:] = omega
+    quadrotor.update_state([Section(total_thrust=9.81, desired_angular_acc=[0, 0, 0], t=2.0)])
+    t = quadrotor.t_start
+
+    skew = np.array([[0, -omega[2], omega[1]], [omega[2], 0, -omega[0]], [-omega[1], omega[0], 0]])
+    np.testing.assert_allclose(rotation_matrix(*quadrotor.current_state[6:9]), expm(skew * t), atol=1e-5)
+    np.testing.assert_allclose(quadrotor.current_state[9:], omega)
+
+
+@pytest.mark.parametrize('attitude', ['euler', 'quaternion'])
+def test_pitch_and_yaw_rates_are_one_model(attitude):
+    # Coupled body rates, away from the theta = pi / 2 singularity of the Euler angles
+    omega = np.array([0.0, 2.0, 1.0])
+    quadrotor = QuadrotorDynamics(attitude=attitude, dt=0.01, save_state=False, integrator='RK45')
+    quadrotor.integrator.options.update(rtol=1e-10, atol=1e-10)
+    quadrotor.current_state[9:] = omega
+    quadrotor.update_state([Section(total_thrust=9.81, desired_angular_acc=[0, 0, 0], t=0.5)])
+    t = quadrotor.t_start
+
+    skew = np.array([[0, -omega[2], omega[1]], [omega[2], 0, -omega[0]], [-omega[1], omega[0], 0]])
+    np.testing.assert_allclose(rotation_matrix(*quadrotor.current_state[6:9]), expm(skew * t), atol=1e-8)
+
+
+def test_quaternion_is_restarted_from_assigned_states():
+    quadrotor = QuadrotorDynamics(save_state=False, attitude='quaternion')
+    quadrotor.update_state(sections[:2])
+    state = quadrotor.current_state.copy()
+    quadrotor.update_state(sections[2:])
+    end = quadrotor.current_state
+
+    restarted = QuadrotorDynamics(save_state=False, attitude='quaternion')
+    restarted.current_state = state
+    restarted.update_state(sections[2:])
+    np.testing.assert_allclose(restarted.current_state, end, atol=1e-6)
+
+
+def test_unsupported():
+    with pytest.raises(ValueError):
+        QuadrotorDynamics(attitude='matrix')
+    with pytest.raises(ValueError):
+        QuadrotorDynamics(attitude='quaternion', integrator='rk4_compiled')
@@ -0,0 +1,70 @@
+from collections import namedtuple
+
+import numpy as np
+
+from quadrotor_simulator.batch import (BatchQuadrotorDynamics, batch_angular_rotation_matrix, batch_moments,
+                                       batch_motor_thrust, batch_rotation_matrix)
+from quadrotor_simulator.quadrotor_dynamics import (QuadrotorDynamics, angular_rotation_matrix, default_config,
+                                                     moments, motor_thrust, rotation_matrix)
+from quadrotor_simulator.vehicle import VehicleParams
+
+Section = namedtuple('Section', ['total_thrust', 'desired_angular_acc', 't'])
+
+sections = (
+    Section(total_thrust=19.422, desired_angular_acc=[-20.36, 0, 0], t=0.2),
+    Section(total_thrust=19.46, desired_angular_acc=[165.1, 0, 0], t=0.21),
+)
+
+
+def unique_samples(df_state):
+    index = df_state.index.values
+    return df_state.values[np.r_[True, np.diff(index) != 0]]
+
+
+def test_vectorized_functions_match_scalar_ones():
+    rng = np.random.RandomState(1)
+    config = default_config()
+    angles = rng.uniform(-3, 3, (5, 3))
+    omega = rng.uniform(-10, 10, (5, 3))
+    ref_acc = rng.uniform(-100, 100, (5, 3))
+    inertia = np.tile(config['inertia'], (5, 1))
+    total_thrust = rng.uniform(0, 20, 5)
+
+    batch_m = batch_moments(ref_acc, omega, inertia)
+    batch_t = batch_motor_thrust(batch_m, total_thrust, VehicleParams.from_config(config).inverse_mixer)
+    rot = batch_rotation_matrix(*angles.T)
+    arm = batch_angular_rotation_matrix(*angles.T)
+    for i in range(5):
+        m = moments(ref_acc[i], omega[i], np.diag(config['inertia']))
+        np.testing.assert_allclose(batch_m[i], m)
+        np.testing.assert_allclose(batch_t[i], motor_thrust(config, m, total_thrust[i]))
+        np.testing.assert_allclose(rot[i], rotation_matrix(*angles[i]))
+        np.testing.assert_allclose(arm[i], angular_rotation_matrix(*angles[i]))
+
+
+def test_batch_matches_single_vehicle():
+    quadrotor = QuadrotorDynamics()
+    expected = unique_samples(quadrotor.update_state(sections))
+
+    batch = BatchQuadrotorDynamics(3)
+    ts, states, n_samples = batch.simulate(sections)
+    assert states.shape == (3, len(expected), 12)
+    np.testing.assert_array_equal(n_samples, len(expected))
+    np.testing.assert_allclose(ts[-1], quadrotor.t_start)
+    for i in range(3):
+        np.testing.assert_allclose(states[i], expected, atol=1e-6)
+
+
+def test_batch_with_own_configs_and_schedules():
+    configs = [None, {'mass': 1.2, 'inertia': np.array([0.006, 0.0055, 0.009])}]
+    schedules = [sections, sections[:1]]
+    batch = BatchQuadrotorDynamics(2, configs=configs)
+    ts, states, n_samples = batch.simulate(schedules)
+
+    for i in range(2):
+        quadrotor = QuadrotorDynamics(config=configs[i])
+        expected = unique_samples(quadrotor.update_state(schedules[i]))
+        assert n_samples[i] == len(expected)
+        np.testing.assert_allclose(states[i, :n_samples[i]], expected, atol=1e-6)
+        # Shorter schedules hold their final state
+        np.testing.assert_array_equal(states[i, n_samples[i]:], states[i, n_samples[i] - 1:-1])
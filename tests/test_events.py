@@ -0,0 +1,66 @@
+import numpy as np
+import pytest
+
+from quadrotor_simulator.events import AttitudeRecovered, GroundContact, flip_events
+from quadrotor_simulator.flips import Section, SimulationParams
+from quadrotor_simulator.quadrotor_dynamics import QuadrotorDynamics
+
+gen = SimulationParams(turns=2)
+sections = gen.get_sections(gen.get_initial_parameters())
+
+
+def test_dense_matches_sampled_sections():
+    dt = 0.005
+    expected = QuadrotorDynamics(dt=dt)
+    expected.update_state(sections)
+    # update_state integrates each section up to its last sample
+    sampled = [section._replace(t=(len(np.arange(0, section.t, dt)) - 1) * dt) for section in sections]
+
+    quadrotor = QuadrotorDynamics()
+    t_eval = np.unique(expected.df_state.index)
+    result = quadrotor.update_state_dense(sampled, t_eval=t_eval, rtol=1e-10, atol=1e-12)
+    assert quadrotor.t_start == pytest.approx(expected.t_start)
+    np.testing.assert_allclose(quadrotor.current_state, expected.current_state, atol=1e-5)
+    np.testing.assert_allclose(result.states, expected.df_state[~expected.df_state.index.duplicated()].values,
+                               atol=1e-5)
+    # Boundary samples are recorded once
+    assert not quadrotor.df_state.index.duplicated().any()
+    np.testing.assert_array_equal(result(result.ts), result.states)
+
+
+def test_short_sections_are_integrated():
+    kick = Section(total_thrust=9.81, desired_angular_acc=[400.0, 0, 0], t=0.004)
+    quadrotor = QuadrotorDynamics(dt=0.005)
+    quadrotor.update_state([kick])
+    assert not quadrotor.current_state.any()
+
+    result = quadrotor.update_state_dense([kick])
+    assert quadrotor.t_start == pytest.approx(0.004)
+    assert quadrotor.current_state[9] == pytest.approx(1.6)
+    assert result.ts.size == 0 and len(quadrotor.df_state) == 0
+
+
+def test_events():
+    quadrotor = QuadrotorDynamics(save_state=False)
+    result = quadrotor.update_state_dense(sections, events=flip_events(2) + [AttitudeRecovered(np.pi / 6)],
+                                          rtol=1e-9, atol=1e-12)
+    assert not result.terminated
+    # The initial parameters of the two turns flip stop short of 4 pi
+    assert 2 * np.pi < quadrotor.current_state[6] < 4 * np.pi
+    crossings = result.events[result.events.event.str.startswith('phi')]
+    np.testing.assert_allclose(crossings.phi, [2 * np.pi], atol=1e-9)
+    assert list(crossings.section) == [2]
+    recovered = result.events[result.events.event == 'attitude_recovered']
+    assert len(recovered)
+    np.testing.assert_allclose(np.cos(recovered.phi) * np.cos(recovered.theta), np.cos(np.pi / 6))
+    assert result.events.t.is_monotonic_increasing
+
+    falling = QuadrotorDynamics(save_state=False)
+    falling.current_state[2] = 1.0
+    result = falling.update_state_dense([Section(total_thrust=0, desired_angular_acc=[0, 0, 0], t=5)],
+                                        events=[GroundContact()])
+    assert result.terminated
+    assert falling.t_start == pytest.approx(np.sqrt(2 / 9.81))
+    assert falling.current_state[2] == pytest.approx(0, abs=1e-9)
+    with pytest.raises(ValueError):
+        result(falling.t_start + 1)
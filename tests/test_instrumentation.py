@@ -0,0 +1,61 @@
+import numpy as np
+
+from quadrotor_simulator.flips import SimulationParams
+from quadrotor_simulator.instrumentation import STAGES
+from quadrotor_simulator.quadrotor_dynamics import QuadrotorDynamics
+
+gen = SimulationParams(turns=1)
+sections = gen.get_sections(gen.get_initial_parameters())
+
+
+def test_instrumentation_does_not_change_trajectories():
+    expected = QuadrotorDynamics()
+    expected.update_state(sections)
+
+    quadrotor = QuadrotorDynamics()
+    received = []
+    stats = quadrotor.enable_instrumentation(callback=received.append)
+    quadrotor.update_state(sections)
+
+    np.testing.assert_array_equal(quadrotor.df_state.values, expected.df_state.values)
+    np.testing.assert_array_equal(quadrotor.df_state_history.values, expected.df_state_history.values)
+    assert received == stats.sections
+    assert sum(section.rhs_evaluations for section in stats.sections) == quadrotor.integrator.nfev
+    for section in stats.sections:
+        assert section.info['nfe'][-1] <= section.rhs_evaluations
+        assert len(section.step_sizes) == round((section.t_end - section.t_start) / quadrotor._dt)
+        assert (section.stage_times > 0).all()
+
+    summary = stats.to_dataframe()
+    assert list(summary.columns[-len(STAGES):]) == list(STAGES)
+    assert len(summary) == len(stats.sections)
+
+
+def test_disabled_and_compiled():
+    quadrotor = QuadrotorDynamics(integrator='rk4_compiled')
+    stats = quadrotor.enable_instrumentation()
+    quadrotor.update_state(sections[:2])
+    assert [section.rhs_evaluations for section in stats.sections] == [
+        4 * len(section.step_sizes) for section in stats.sections]
+    quadrotor.disable_instrumentation()
+    quadrotor.update_state(sections[2:])
+    assert len(stats.sections) == 2
+
+
+def test_quaternion_attitude_is_timed():
+    quadrotor = QuadrotorDynamics(attitude='quaternion')
+    stats = quadrotor.enable_instrumentation()
+    quadrotor.update_state(sections[:2])
+    for section in stats.sections:
+        assert (section.stage_times > 0).all()
+        assert section.info is not None
+
+
+def test_infodict_only_while_instrumented():
+    quadrotor = QuadrotorDynamics(save_state=False)
+    quadrotor.update_state(sections[:1])
+    assert quadrotor.integrator.last_info is None
+    stats = quadrotor.enable_instrumentation()
+    quadrotor.update_state(sections[1:2])
+    assert stats.sections[0].info['nfe'][-1] > 0
+    assert not quadrotor.integrator.full_output
@@ -0,0 +1,57 @@
+import numpy as np
+import pytest
+
+from quadrotor_simulator.flips import Section
+from quadrotor_simulator.integrators import RK4Integrator, get_integrator
+from quadrotor_simulator.quadrotor_dynamics import QuadrotorDynamics
+
+sections = (
+    Section(total_thrust=19.422, desired_angular_acc=[-20.36, 0, 0], t=0.2),
+    Section(total_thrust=19.46, desired_angular_acc=[165.1, 0, 0], t=0.21),
+)
+
+reference = QuadrotorDynamics().update_state(sections).values
+
+
+@pytest.mark.parametrize("integrator, evaluations_per_step, tolerance", [
+    ('rk4', 4, 1e-6),
+    ('rk2', 2, 1e-2),
+    ('semi_implicit_euler', 2, 1e-1),
+])
+def test_fixed_step_integrators(integrator, evaluations_per_step, tolerance):
+    quadrotor = QuadrotorDynamics(integrator=integrator)
+    state = quadrotor.update_state(sections)
+    assert quadrotor.integrator.nfev == evaluations_per_step * (len(state) - 2)
+    np.testing.assert_allclose(state.values, reference, atol=tolerance)
+
+
+@pytest.mark.parametrize("method", ['RK45', 'DOP853'])
+def test_solve_ivp_integrators(method):
+    quadrotor = QuadrotorDynamics(integrator=get_integrator(method, rtol=1e-10, atol=1e-10))
+    state = quadrotor.update_state(sections)
+    assert quadrotor.integrator.nfev > 0
+    np.testing.assert_allclose(state.values, reference, atol=1e-6)
+
+
+def test_odeint_counts_evaluations():
+    quadrotor = QuadrotorDynamics()
+    quadrotor.update_state(sections)
+    assert quadrotor.integrator.nfev >= len(quadrotor.df_state_history)
+
+
+def test_get_integrator():
+    integrator = RK4Integrator()
+    assert get_integrator(integrator) is integrator
+    with pytest.raises(ValueError):
+        get_integrator('euler')
+
+
+@pytest.mark.parametrize("name", ['rk4', 'rk2', 'semi_implicit_euler', 'rk4_compiled'])
+def test_fixed_step_integrators_reject_options(name):
+    with pytest.raises(ValueError, match='{} does not accept rtol'.format(name)):
+        get_integrator(name, rtol=1e-3)
+    assert get_integrator(name).name == name
+
+
+def test_odeint_forwards_options():
+    assert get_integrator('odeint', rtol=1e-3).options == {'rtol': 1e-3}
@@ -0,0 +1,46 @@
+import numpy as np
+import pytest
+
+from quadrotor_simulator import kernels
+from quadrotor_simulator.flips import SimulationParams
+from quadrotor_simulator.quadrotor_dynamics import QuadrotorDynamics, default_config, state_derivative
+from quadrotor_simulator.vehicle import VehicleParams, vehicle_array
+
+gen = SimulationParams()
+sections = gen.get_sections(gen.get_initial_parameters())
+
+
+@pytest.mark.parametrize("kernel", [
+    kernels.derivative_kernel,
+    getattr(kernels.derivative_kernel, 'py_func', kernels.derivative_kernel),
+])
+def test_derivative_kernel_matches_state_derivative(kernel):
+    rng = np.random.RandomState(0)
+    config = default_config()
+    vehicle = vehicle_array(config)
+    state_dot = np.empty(12)
+    thrust = np.empty(4)
+    row = np.empty(19)
+    for _ in range(20):
+        state = rng.uniform(-2, 2, 12)
+        desired_angular_acc = rng.uniform(-50, 50, 3)
+        total_thrust = rng.uniform(0, 20)
+        kernel(state, total_thrust, desired_angular_acc, vehicle, state_dot, thrust)
+        expected = state_derivative(state, total_thrust, desired_angular_acc, VehicleParams.from_config(config), row)
+        np.testing.assert_allclose(state_dot, expected, rtol=1e-12)
+        np.testing.assert_allclose(thrust, row[12:16], rtol=1e-12)
+
+
+@pytest.mark.parametrize("scheme", ['rk4', 'rk2', 'semi_implicit_euler'])
+def test_compiled_integrators_match_python_ones(scheme):
+    expected = QuadrotorDynamics(integrator=scheme)
+    expected.update_state(sections)
+    compiled = QuadrotorDynamics(integrator=scheme + '_compiled')
+    compiled.update_state(sections)
+
+    np.testing.assert_allclose(compiled.df_state.values, expected.df_state.values, rtol=1e-9, atol=1e-12)
+    assert compiled.integrator.nfev == expected.integrator.nfev
+    # One history row per sample, without the last sample of each section
+    history = compiled.df_state_history
+    assert len(history) == len(compiled.df_state) - len(sections)
+    np.testing.assert_allclose(history.thrust.values.sum(axis=1)[0], sections[0].total_thrust)
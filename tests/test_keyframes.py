@@ -0,0 +1,71 @@
+import io
+
+import numpy as np
+import pytest
+
+from quadrotor_simulator.flips import Section, SimulationParams
+from quadrotor_simulator.keyframes import KeyframeWriter, export_keyframes, quaternion_from_matrix
+from quadrotor_simulator.quadrotor_dynamics import QuadrotorDynamics, rotation_matrix
+
+gen = SimulationParams(turns=1)
+sections = gen.get_sections(gen.get_initial_parameters())
+
+
+def frames(fps):
+    """Every frame of the flip, resampled from the update_state samples"""
+    quadrotor = QuadrotorDynamics()
+    df_state = quadrotor.update_state(sections)
+    df_state = df_state[~df_state.index.duplicated()]
+    ts = np.arange(0, df_state.index[-1] + 1e-9, 1.0 / fps)
+    return np.array([np.interp(ts, df_state.index, column) for column in df_state.values.T]).T
+
+
+def test_quaternion_from_matrix():
+    for angles in [(0, 0, 0), (0.3, -0.2, 1.0), (np.pi, 0, 0), (0, np.pi / 2 - 1e-3, 0), (0, 0, np.pi)]:
+        q = quaternion_from_matrix(rotation_matrix(*angles))
+        w, x, y, z = q
+        expected = np.array([
+            [1 - 2 * (y * y + z * z), 2 * (x * y - z * w), 2 * (x * z + y * w)],
+            [2 * (x * y + z * w), 1 - 2 * (x * x + z * z), 2 * (y * z - x * w)],
+            [2 * (x * z - y * w), 2 * (y * z + x * w), 1 - 2 * (x * x + y * y)]])
+        np.testing.assert_allclose(expected, rotation_matrix(*angles), atol=1e-12)
+        assert np.isclose(np.linalg.norm(q), 1)
+
+
+@pytest.mark.parametrize('rotation', ['quaternion', 'matrix'])
+def test_decimation_is_error_bounded(tmp_path, rotation):
+    fps = 120
+    path = str(tmp_path / 'flip.csv')
+    quadrotor = QuadrotorDynamics(save_state=False)
+    writer = export_keyframes(quadrotor.stream(sections), path, fps=fps, position_tolerance=1e-3,
+                              rotation_tolerance=1e-2, rotation=rotation, start_frame=0)
+    keyframes = np.loadtxt(path, delimiter=',', skiprows=1)
+
+    expected = frames(fps)
+    assert writer.n_frames == len(expected)
+    assert writer.n_keyframes == len(keyframes) < writer.n_frames / 2
+    np.testing.assert_array_equal(keyframes[[0, -1], 0], [0, len(expected) - 1])
+
+    channels = np.array([np.interp(np.arange(len(expected)), keyframes[:, 0], column)
+                         for column in keyframes[:, 1:].T]).T
+    np.testing.assert_allclose(channels[:, :3], expected[:, :3], atol=1e-3 + 1e-9)
+    for values, state in zip(channels[:, 3:], expected):
+        matrix = rotation_matrix(*state[6:9])
+        if rotation == 'matrix':
+            np.testing.assert_allclose(values, matrix.ravel(), atol=1e-2 + 1e-9)
+        else:
+            q = quaternion_from_matrix(matrix)
+            assert min(np.abs(values - q).max(), np.abs(values + q).max()) <= 1e-2 + 1e-9
+
+
+def test_hover_needs_two_keyframes():
+    f = io.StringIO()
+    quadrotor = QuadrotorDynamics(save_state=False)
+    with KeyframeWriter(f, fps=24) as writer:
+        hover = Section(total_thrust=quadrotor.config['mass'] * quadrotor.config['gravity'],
+                        desired_angular_acc=[0, 0, 0], t=10)
+        for t, state in quadrotor.stream([hover]):
+            writer.add_sample(t, state)
+    assert f.getvalue().splitlines()[0] == 'frame,x,y,z,qw,qx,qy,qz'
+    assert writer.n_frames == 240
+    assert writer.n_keyframes == 2
@@ -0,0 +1,41 @@
+import numpy as np
+
+from quadrotor_simulator.flips import SimulationParams
+from quadrotor_simulator.learning import FlipLearner, flip_residual
+from quadrotor_simulator.quadrotor_dynamics import QuadrotorDynamics
+
+gen = SimulationParams(turns=1)
+initial = gen.get_initial_parameters()
+
+
+def test_warm_start_matches_full_run():
+    learner = FlipLearner(gen)
+    learner.final_state(initial)
+    assert (learner.integrated_sections, learner.reused_sections) == (5, 0)
+
+    for i, shared in [(0, 0), (2, 2), (3, 3), (4, 3)]:
+        parameters = np.array(initial)
+        parameters[i] += 0.02
+        reused = learner.reused_sections
+        state = learner.final_state(parameters)
+        assert learner.reused_sections - reused == shared
+
+        quadrotor = QuadrotorDynamics(save_state=False)
+        quadrotor.update_state(gen.get_sections(tuple(parameters)))
+        np.testing.assert_array_equal(state, quadrotor.current_state)
+
+
+def test_learning_reduces_the_flip_errors():
+    learner = FlipLearner(gen)
+    result = learner.learn(iterations=10)
+    history = result.history
+    assert result.cost < 0.2 * history.cost[0]
+    assert (np.diff(history.cost) < 0).all()
+    np.testing.assert_allclose(result.residual, flip_residual(learner.final_state(result.parameters), gen.Cn))
+    assert (np.array(result.parameters) >= learner.lower_bounds).all()
+    assert (np.array(result.parameters) <= learner.upper_bounds).all()
+    # The perturbations of p2..p4 reuse the leading sections
+    assert learner.reused_sections > learner.integrated_sections / 4
+
+    parallel = FlipLearner(gen, processes=2).learn(iterations=10)
+    np.testing.assert_array_equal(parallel.parameters, result.parameters)
@@ -0,0 +1,86 @@
+import numpy as np
+import pytest
+
+from quadrotor_simulator.flips import SimulationParams
+from quadrotor_simulator.linearization import (angular_rotation_matrix_jacobian, moments_jacobian,
+                                               rotation_matrix_jacobian, state_jacobian)
+from quadrotor_simulator.quadrotor_dynamics import (QuadrotorDynamics, angular_rotation_matrix, moments,
+                                                     rotation_matrix, state_derivative)
+
+rng = np.random.RandomState(0)
+vehicle = QuadrotorDynamics().vehicle
+
+
+def central_difference(fun, x, h=1e-6):
+    """Jacobian of fun at x, the last axis holding the derivatives"""
+    x = np.asarray(x, dtype=float)
+    return np.stack([(fun(x + h * e) - fun(x - h * e)) / (2 * h) for e in np.eye(len(x))], axis=-1)
+
+
+def test_component_jacobians():
+    angles = rng.uniform(-3, 3, (4, 3))
+    rotation = rotation_matrix_jacobian(angles[:, 0], angles[:, 1], angles[:, 2])
+    angular_rotation = angular_rotation_matrix_jacobian(angles[:, 0], angles[:, 1], angles[:, 2])
+    for i, a in enumerate(angles):
+        np.testing.assert_allclose(rotation[i], central_difference(lambda x: rotation_matrix(*x), a), atol=1e-8)
+        np.testing.assert_allclose(angular_rotation[i], central_difference(lambda x: angular_rotation_matrix(*x), a),
+                                   atol=1e-8)
+
+    omega = rng.uniform(-20, 20, 3)
+    expected = central_difference(lambda x: moments(np.zeros(3), x, vehicle.inertia_matrix), omega)
+    np.testing.assert_allclose(moments_jacobian(omega, vehicle.inertia), expected, atol=1e-10)
+
+
+def test_state_jacobian_matches_finite_differences():
+    states = rng.uniform(-1.2, 1.2, (6, 12))
+    states[:, 9:] *= 10
+    total_thrust = rng.uniform(5, 15, 6)
+    desired_angular_acc = rng.uniform(-30, 30, (6, 3))
+    A, B = state_jacobian(states, total_thrust, desired_angular_acc, vehicle)
+    assert A.shape == (6, 12, 12) and B.shape == (6, 12, 4)
+    for i in range(6):
+        inputs = np.concatenate(([total_thrust[i]], desired_angular_acc[i]))
+        np.testing.assert_allclose(A[i], central_difference(
+            lambda x: state_derivative(x, inputs[0], inputs[1:], vehicle), states[i]), atol=1e-6)
+        np.testing.assert_allclose(B[i], central_difference(
+            lambda u: state_derivative(states[i], u[0], u[1:], vehicle), inputs), atol=1e-6)
+    # A single operating point gives plain matrices
+    A0, B0 = state_jacobian(states[0], total_thrust[0], desired_angular_acc[0], vehicle)
+    np.testing.assert_array_equal(A0, A[0])
+    np.testing.assert_array_equal(B0, B[0])
+
+
+def test_trim_is_cached_per_point():
+    quadrotor = QuadrotorDynamics(save_state=False)
+    model = quadrotor.trim(velocity=[1.0, 0, 0], psi=0.5)
+    np.testing.assert_allclose(model.inputs, [9.81, 0, 0, 0])
+    np.testing.assert_allclose(model.state_dot, [1.0] + [0] * 11, atol=1e-12)
+    # Tilting accelerates along the heading, the body rates integrate the inputs
+    assert model.A[3, 7] == pytest.approx(9.81 * np.cos(0.5))
+    np.testing.assert_allclose(model.B[9:, 1:], np.eye(3), atol=1e-12)
+    assert model.B[5, 0] == pytest.approx(1.0)
+
+    assert quadrotor.trim(velocity=[1.0, 0, 0], psi=0.5) is model
+    assert quadrotor.linearize(model.state, 9.81, [0, 0, 0]) is model
+    quadrotor.config['mass'] = 2.0
+    heavy = quadrotor.trim(velocity=[1.0, 0, 0], psi=0.5)
+    assert heavy is not model
+    assert heavy.B[5, 0] == pytest.approx(0.5)
+
+
+@pytest.mark.parametrize('integrator', ['odeint', 'Radau', 'BDF'])
+def test_analytic_jacobian(integrator):
+    gen = SimulationParams(turns=2)
+    sections = gen.get_sections(gen.get_initial_parameters())
+    expected = QuadrotorDynamics(save_state=False, integrator=integrator)
+    expected.update_state(sections)
+    quadrotor = QuadrotorDynamics(save_state=False, integrator=integrator, analytic_jacobian=True)
+    quadrotor.update_state(sections)
+    np.testing.assert_allclose(quadrotor.current_state, expected.current_state, atol=1e-6)
+    # The implicit methods no longer estimate the Jacobian from extra evaluations
+    assert quadrotor.integrator.nfev <= expected.integrator.nfev
+    if integrator != 'odeint':
+        assert quadrotor.integrator.njev > 0
+
+    with pytest.raises(ValueError):
+        QuadrotorDynamics(attitude='quaternion', analytic_jacobian=True)
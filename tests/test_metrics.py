@@ -0,0 +1,66 @@
+import numpy as np
+import pytest
+
+from quadrotor_simulator.flips import SimulationParams
+from quadrotor_simulator.metrics import METRICS, MetricsAccumulator, compute_metrics
+from quadrotor_simulator.quadrotor_dynamics import QuadrotorDynamics
+from quadrotor_simulator.trajectory_io import Trajectory
+
+gen = SimulationParams(turns=2)
+sections = gen.get_sections(gen.get_initial_parameters())
+
+
+def test_metrics_of_a_trajectory():
+    ts = np.array([0.0, 0.1, 0.2, 0.3, 0.4])
+    rows = np.zeros((5, 19))
+    rows[:, 2] = [1.0, 0.8, 0.5, 0.7, 0.9]
+    rows[:, 6] = [0.0, 1.0, 3.0, 5.0, 2 * np.pi + 0.1]
+    rows[:, 9] = [0.0, 10.0, -20.0, 5.0, 0.0]
+    rows[:, 12:16] = 2.0
+    rows[1:3, 13] = 6.0
+    rows[3, 15] = -1.0
+    metrics = dict(zip(METRICS, compute_metrics(rows, ts, thrust_limits=(0.0, 5.0))))
+    assert metrics['rotation_phi'] == pytest.approx(2 * np.pi + 0.1)
+    assert metrics['peak_p'] == 20.0
+    np.testing.assert_allclose([metrics['saturation_time_{}'.format(i)] for i in range(1, 5)], [0, 0.2, 0, 0.1])
+    assert metrics['altitude_loss'] == pytest.approx(0.5)
+    assert metrics['position_error'] == pytest.approx(0.1)
+    # Full turns are not an attitude error
+    assert metrics['attitude_error'] == pytest.approx(0.1)
+
+
+def test_online_matches_offline(tmp_path):
+    quadrotor = QuadrotorDynamics(save_state=False)
+    accumulator = quadrotor.track_metrics(thrust_limits=(1.0, 5.0))
+    path = str(tmp_path / 'flip.qtraj')
+    with quadrotor.record_trajectory(path):
+        quadrotor.update_state(sections)
+    # The trajectory file holds the same samples, each with the inputs of its section
+    rows = Trajectory(path).select()
+    expected = compute_metrics(rows['values'], rows['t'], thrust_limits=(1.0, 5.0))
+    np.testing.assert_allclose(accumulator.result(), expected, rtol=1e-12, atol=1e-12)
+    assert accumulator.n_samples == len(rows)
+    assert accumulator.to_dict()['saturation_time_2'] > 0
+    assert accumulator.to_dict()['rotation_phi'] == pytest.approx(quadrotor.current_state[6])
+
+
+def test_batches_with_lengths():
+    rng = np.random.RandomState(0)
+    ts = np.arange(50) * 0.01
+    rows = rng.normal(2.0, 2.0, (3, 50, 19))
+    lengths = np.array([50, 20, 35])
+    target = rng.normal(size=12)
+    metrics = compute_metrics(rows, ts, lengths, target=target, thrust_limits=(0.0, 4.0))
+    assert metrics.shape == (3, len(METRICS))
+    for i, length in enumerate(lengths):
+        np.testing.assert_allclose(metrics[i], compute_metrics(rows[i, :length], ts[:length], target=target,
+                                                               thrust_limits=(0.0, 4.0)))
+
+    # Chunks of a batch sharing their times
+    accumulator = MetricsAccumulator(target=target, thrust_limits=(0.0, 4.0))
+    for start in range(0, 50, 16):
+        accumulator.update(ts[start:start + 16], rows[:, start:start + 16])
+    np.testing.assert_allclose(accumulator.result(), compute_metrics(rows, ts, target=target,
+                                                                     thrust_limits=(0.0, 4.0)))
+    with pytest.raises(ValueError):
+        MetricsAccumulator().result()
@@ -0,0 +1,32 @@
+import numpy as np
+import pytest
+
+from quadrotor_simulator.mixer import LAYOUTS, Mixer
+from quadrotor_simulator.quadrotor_dynamics import QuadrotorDynamics
+
+
+def test_plus_layout_matches_quadrotor_dynamics():
+    quadrotor = QuadrotorDynamics()
+    mixer = Mixer.from_layout('+', 0.2, 0.018)
+    np.testing.assert_allclose(mixer.allocation, quadrotor.vehicle.mixer)
+    thrust = np.array([4.0, 5.0, 3.0, 2.0])
+    moments = np.dot(mixer.allocation, thrust)[1:]
+    np.testing.assert_allclose(quadrotor.angular_acceleration(quadrotor.df_current_state, thrust),
+                               moments / quadrotor.config['inertia'])
+
+
+@pytest.mark.parametrize("layout", sorted(LAYOUTS))
+def test_layouts_reproduce_commands(layout):
+    mixer = Mixer.from_layout(layout, 0.25, 0.02)
+    commands = np.random.RandomState(0).uniform(-1, 1, (100, 4)) + [10, 0, 0, 0]
+    thrusts = mixer.mix(commands)
+    assert thrusts.shape == (100, len(LAYOUTS[layout][0]))
+    np.testing.assert_allclose(mixer.wrench(thrusts), commands, atol=1e-12)
+
+
+def test_saturation():
+    mixer = Mixer.from_layout('x', 0.2, 0.018, min_thrust=0, max_thrust=3)
+    commands = np.array([[8, 0, 0, 0], [8, 1.5, 0, 0], [0.5, 0, 0, 0.01]])
+    thrusts = mixer.mix(commands)
+    assert thrusts.min() >= 0 and thrusts.max() <= 3
+    np.testing.assert_array_equal(mixer.saturation(commands).any(axis=1), [False, True, True])
@@ -5,71 +5,21 @@
 #
 #       Largely based on the work of https://github.com/nikhilkalige
 
-from collections import namedtuple
 import numpy as np
+import pandas as pd
 import pytest
 
-from quadrotor_simulator.quadrotor_dynamics import QuadrotorDynamics
-
-Section = namedtuple('Section', ['total_thrust', 'desired_angular_acc', 't'])
+from quadrotor_simulator.quadrotor_dynamics import (STATE_COLUMNS, QuadrotorDynamics, angular_rotation_matrix,
+                                                     angular_velocity_to_dt_eulerangles, moments, motor_thrust,
+                                                     rotation_matrix, state_derivative)
+from quadrotor_simulator.recorder import column_index
+from quadrotor_simulator.scenarios import Flip
 
 TURNS = 3
 
-
-class SimulationParams(object):
-    def __init__(self):
-        self.mass = 1
-        self.Ixx = 0.0053
-        self.length = 0.2
-        self.Bup = 21.58
-        self.Bdown = 3.92
-        self.Cpmax = np.pi * 1800 / 180
-        self.Cn = TURNS
-        self.gravity = 9.81
-
-    def get_acceleration(self, p0, p3):
-        ap = {
-            'acc': (-self.mass * self.length * (self.Bup - p0) / (4 * self.Ixx)),
-            'start': (self.mass * self.length * (self.Bup - self.Bdown) / (4 * self.Ixx)),
-            'coast': 0,
-            'stop': (-self.mass * self.length * (self.Bup - self.Bdown) / (4 * self.Ixx)),
-            'recover': (self.mass * self.length * (self.Bup - p3) / (4 * self.Ixx)),
-        }
-        return ap
-
-    def get_initial_parameters(self):
-        p0 = p3 = 0.9 * self.Bup
-        p1 = 0.2
-        acc_start = self.get_acceleration(p0, p3)['start']
-        return [p0, p1, p3]
-
-    def get_sections(self, parameters):
-        [p0, p1, p3] = parameters
-
-        ap = self.get_acceleration(p0, p3)
-
-        T2 = (self.Cpmax - p1 * ap['acc']) / ap['start']
-
-        aq = 0
-        ar = 0
-
-        return (
-            Section(
-                total_thrust=self.mass * p0,
-                desired_angular_acc=[ap['acc'], aq, ar],
-                t=p1),
-            Section(
-                total_thrust=self.mass * self.Bup - 2 * abs(ap['start']) * self.Ixx / self.length,
-                desired_angular_acc=[ap['start'], aq, ar],
-                t=T2),
-        )
-        return sections
-
-
-gen = SimulationParams()
 quadrotor = QuadrotorDynamics()
-params = gen.get_initial_parameters()
-sections = gen.get_sections(params)
+# The first two sections of the flip
+sections = Flip(turns=TURNS).sections()[:2]
 state = quadrotor.update_state(sections)
 
 
@@ -158,4 +108,30 @@ def test_state_index():
 def test_df_state_history_against_state(state_value, state_history):
     np.testing.assert_allclose(state_value, state_history)
     
-    
\ No newline at end of file
+    
+
+def test_state_derivative_matches_reference_functions():
+    rng = np.random.RandomState(0)
+    config = quadrotor.config
+    inertia_matrix = quadrotor.inertia_matrix
+    for _ in range(20):
+        state = rng.uniform(-2, 2, 12)
+        desired_angular_acc = rng.uniform(-50, 50, 3)
+        total_thrust = rng.uniform(0, 20)
+        row = np.zeros(19)
+
+        state_dot = state_derivative(state, total_thrust, desired_angular_acc, quadrotor.vehicle, row)
+
+        my_moments = moments(desired_angular_acc, state[9:], inertia_matrix)
+        thrust = motor_thrust(config, my_moments, total_thrust)
+        force_z_body = np.sum(thrust) / config['mass']
+        acceleration = (np.dot(rotation_matrix(*state[6:9]), [0, 0, force_z_body]) -
+                        np.array([0, 0, config['gravity']]))
+        euler_rates = angular_velocity_to_dt_eulerangles(angular_rotation_matrix(*state[6:9]), state[9:])
+        np.testing.assert_allclose(row, np.concatenate((state, thrust, desired_angular_acc)))
+        np.testing.assert_allclose(state_dot[:3], state[3:6])
+        np.testing.assert_allclose(state_dot[3:6], acceleration, atol=1e-12)
+        np.testing.assert_allclose(state_dot[6:9], euler_rates, rtol=1e-10, atol=1e-12)
+        df_state = pd.DataFrame([state], columns=column_index(STATE_COLUMNS))
+        np.testing.assert_allclose(state_dot[9:], quadrotor.angular_acceleration(df_state, thrust),
+                                   rtol=1e-10, atol=1e-9)
@@ -0,0 +1,39 @@
+import asyncio
+
+import numpy as np
+
+from quadrotor_simulator.quadrotor_dynamics import QuadrotorDynamics
+from quadrotor_simulator.realtime import AsyncSimulationRunner, DeadlineStats
+
+
+def test_runner_applies_commands_and_publishes_states():
+    async def main():
+        quadrotor = QuadrotorDynamics(save_state=False, integrator='rk4', dt=0.002)
+        runner = AsyncSimulationRunner(quadrotor)
+        states = runner.subscribe()
+        stats = await runner.run(steps=5)
+        # Hover by default
+        np.testing.assert_allclose(quadrotor.current_state, 0, atol=1e-12)
+
+        runner.send(12.0, [0, 0, 0])
+        await runner.run(steps=5)
+        sample = states.get_nowait()
+        assert states.empty()
+        return quadrotor, stats, sample
+
+    quadrotor, stats, sample = asyncio.run(main())
+    np.testing.assert_allclose(sample.t, 0.02)
+    np.testing.assert_allclose(sample.state, quadrotor.current_state)
+    assert quadrotor.current_state[5] > 0
+    assert stats.steps == 10
+    assert stats.jitter_counts.sum() == 10
+
+
+def test_deadline_stats():
+    stats = DeadlineStats(0.005)
+    stats.record(0.0001, 0.001)
+    stats.record(0.004, 0.002)
+    stats.record(0.5, 0.001)
+    assert stats.deadline_misses == 2
+    assert stats.jitter_counts[0] == 1 and stats.jitter_counts[-1] == 1
+    assert stats.summary()['compute_time_max'] == 0.002
@@ -0,0 +1,106 @@
+import subprocess
+import sys
+
+import numpy as np
+import pandas as pd
+
+from quadrotor_simulator.quadrotor_dynamics import STATE_HISTORY_COLUMNS, QuadrotorDynamics
+from quadrotor_simulator.recorder import StateRecorder, column_index
+
+columns = pd.MultiIndex.from_tuples([('position', 'x'), ('position', 'y')], names=['variable', 'axis'])
+
+
+def test_append_grows_buffer():
+    recorder = StateRecorder(columns, capacity=2)
+    for i in range(10):
+        recorder.append(i * 0.1, [i, -i])
+    assert len(recorder) == 10
+    np.testing.assert_allclose(recorder.index, np.arange(10) * 0.1)
+    np.testing.assert_allclose(recorder.values[:, 1], -np.arange(10))
+
+
+def test_extend_and_dataframe():
+    recorder = StateRecorder(columns, capacity=1)
+    recorder.extend([0, 1, 2], np.arange(6).reshape(3, 2))
+    df = recorder.to_dataframe()
+    assert df is recorder.to_dataframe()
+    np.testing.assert_allclose(df.position.y.values, [1, 3, 5])
+    recorder.append(3, [6, 7])
+    assert len(recorder.to_dataframe()) == 4
+
+
+def test_ring_buffer_keeps_last_rows():
+    recorder = StateRecorder(columns, maxlen=4)
+    for i in range(11):
+        recorder.append(i, [i, i])
+    assert len(recorder) == 4
+    np.testing.assert_allclose(recorder.index, [7, 8, 9, 10])
+    np.testing.assert_allclose(recorder.to_dataframe().position.x.values, [7, 8, 9, 10])
+
+
+def test_drop_last():
+    recorder = StateRecorder(columns, maxlen=4)
+    for t in [0, 1, 2, 3, 3, 3]:
+        recorder.append(t, [t, t])
+    recorder.drop_last(3)
+    np.testing.assert_allclose(recorder.index, [2])
+
+
+def test_drop_last_after_wrap_around():
+    recorder = StateRecorder(columns, maxlen=4)
+    recorder.extend(np.arange(6), np.arange(6)[:, np.newaxis] * [1, 1])
+    recorder.append(5, [5, 5])
+    recorder.drop_last(5)
+    np.testing.assert_allclose(recorder.index, [3, 4])
+    assert recorder.n_recorded == 5
+    for t in [6, 7, 8]:
+        recorder.append(t, [t, t])
+    np.testing.assert_allclose(recorder.index, [4, 6, 7, 8])
+    np.testing.assert_allclose(recorder.values[:, 1], [4, 6, 7, 8])
+    recorder.drop_last(8)
+    np.testing.assert_allclose(recorder.index, [4, 6, 7])
+
+
+def test_ring_buffer_extend():
+    recorder = StateRecorder(columns, maxlen=5)
+    recorder.extend([0, 1, 2], [[0, 0], [1, 1], [2, 2]])
+    recorder.extend([3, 4, 5, 6], [[3, 3], [4, 4], [5, 5], [6, 6]])
+    np.testing.assert_allclose(recorder.index, [2, 3, 4, 5, 6])
+    recorder.extend(np.arange(7, 20), np.arange(7, 20)[:, np.newaxis] * [1, 1])
+    np.testing.assert_allclose(recorder.values[:, 0], [15, 16, 17, 18, 19])
+
+
+def test_schema_columns_are_shared():
+    recorder = StateRecorder([('position', 'x'), ('position', 'y')], capacity=1)
+    recorder.append(0, [1, 2])
+    assert recorder.to_dataframe().columns.equals(columns)
+
+    quadrotor = QuadrotorDynamics()
+    quadrotor.step(9.81, [0, 0, 0])
+    other = QuadrotorDynamics()
+    other.step(9.81, [0, 0, 0])
+    assert quadrotor.df_state_history.columns is other.df_state_history.columns
+    assert quadrotor.df_current_state.columns is column_index(STATE_HISTORY_COLUMNS)
+
+
+def test_import_defers_pandas_and_scipy():
+    code = ('import sys\n'
+            'from quadrotor_simulator.quadrotor_dynamics import QuadrotorDynamics\n'
+            'quadrotor = QuadrotorDynamics(save_state=False, integrator="rk4")\n'
+            'quadrotor.step(9.81, [0, 0, 0])\n'
+            'print(sorted(set(sys.modules) & {"pandas", "scipy", "numba"}))\n')
+    output = subprocess.check_output([sys.executable, '-c', code], universal_newlines=True)
+    assert output.strip() == '[]'
+
+
+def test_sweep_and_learning_workers_do_not_import_pandas():
+    code = ('import sys\n'
+            'from quadrotor_simulator.learning import FlipLearner\n'
+            'from quadrotor_simulator.sweep import simulate_flip\n'
+            'simulate_flip([21.58, 3.92, 10 * 3.141592653589793, 1] + [float("nan")] * 5)\n'
+            'learner = FlipLearner(integrator="rk4")\n'
+            'parameters = learner.params.get_initial_parameters()\n'
+            'learner.jacobian(parameters, learner.residual(parameters))\n'
+            'print("pandas" in sys.modules)\n')
+    output = subprocess.check_output([sys.executable, '-c', code], universal_newlines=True)
+    assert output.strip() == 'False'
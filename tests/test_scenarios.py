@@ -0,0 +1,108 @@
+import numpy as np
+import pytest
+
+from quadrotor_simulator.batch import BatchQuadrotorDynamics
+from quadrotor_simulator.flips import Section, SimulationParams, flip_sections
+from quadrotor_simulator.quadrotor_dynamics import QuadrotorDynamics
+from quadrotor_simulator.scenarios import (Climb, Flip, Hover, Scenario, YawFlip, compile_schedule,
+                                           concatenate_schedules, pack_sections, schedule_sections)
+
+
+def sampled_steps(schedule, dt):
+    """Steps of each section as sampled by QuadrotorDynamics.update_state"""
+    t_start, steps = 0, []
+    for section in schedule:
+        if section.t < (2 * dt):
+            continue
+        ts = np.arange(t_start, t_start + section.t, dt)
+        t_start = ts[-1]
+        steps.append(len(ts) - 1)
+    return steps
+
+
+def test_flip_matches_flip_sections():
+    assert Flip(turns=5).sections() == flip_sections(Cn=5)
+    assert Flip(turns=2, Bup=20.0, p1=0.15, p2=0.3).sections() == flip_sections(Cn=2, Bup=20.0, p1=0.15, p2=0.3)
+    assert SimulationParams(turns=2).get_initial_parameters() == tuple(Flip(turns=2).initial_parameters()[0])
+
+    # Variants of the flip are rows of the schedule
+    schedule = Flip(turns=[1, 2, 3], p0=[np.nan, 18.0, np.nan]).schedule()
+    assert schedule.t.shape == (3, 5)
+    assert schedule_sections(schedule, 1) == flip_sections(Cn=2, p0=18.0)
+
+    pitch = Flip(turns=2, axis='pitch').schedule()
+    roll = Flip(turns=2).schedule()
+    np.testing.assert_array_equal(pitch.desired_angular_acc[..., 1], roll.desired_angular_acc[..., 0])
+    # Both axes at once, with the same inertia about the diagonal
+    diagonal = Flip(turns=2, axis=[1, 1]).schedule()
+    np.testing.assert_allclose(diagonal.desired_angular_acc[..., :2],
+                               roll.desired_angular_acc[..., :1].repeat(2, axis=-1) / np.sqrt(2))
+    with pytest.raises(ValueError):
+        Flip(axis='yaw').schedule()
+
+
+def test_compile_matches_update_state_sampling():
+    rng = np.random.RandomState(0)
+    dt = 0.005
+    schedules = [[Section(rng.uniform(5, 15), rng.normal(size=3).tolist(), t)
+                  for t in rng.choice([0.004, 0.009, 0.01, 0.05, 0.2, 0.21, 0.3333, 1.1], rng.randint(1, 6))]
+                 for _ in range(200)]
+    compiled = compile_schedule(pack_sections(schedules), dt)
+    for i, schedule in enumerate(schedules):
+        steps = sampled_steps(schedule, dt)
+        k = len(steps)
+        np.testing.assert_array_equal(compiled.section_end[i, :k], np.cumsum(steps))
+        np.testing.assert_array_equal(compiled.section_end[i, k:], sum(steps))
+        assert compiled.n_steps[i] == sum(steps)
+        kept = [section for section in schedule if not section.t < (2 * dt)]
+        np.testing.assert_array_equal(compiled.total_thrust[i, :k], [section.total_thrust for section in kept])
+        np.testing.assert_array_equal(compiled.total_thrust[i, k:], 0.0)
+
+
+def test_maneuvers_fly_as_expected():
+    scenario = Scenario([Hover(0.5), Climb(height=2.0, t=2.0), YawFlip(turns=1), Hover(0.5)])
+    quadrotor = QuadrotorDynamics(save_state=False, integrator='rk4')
+    quadrotor.update_state(scenario.sections())
+    # Each section loses up to a step to the sampling
+    np.testing.assert_allclose(quadrotor.current_state[2], 2.0, atol=0.1)
+    np.testing.assert_allclose(quadrotor.current_state[8], 2 * np.pi, atol=0.1)
+    np.testing.assert_allclose(quadrotor.current_state[[0, 1, 6, 7]], 0.0, atol=1e-9)
+    np.testing.assert_allclose(quadrotor.current_state[[3, 4, 5, 9, 10, 11]], 0.0, atol=0.05)
+
+    # Clockwise turns
+    clockwise = YawFlip(turns=-1).schedule()
+    np.testing.assert_array_equal(clockwise.desired_angular_acc, -YawFlip(turns=1).schedule().desired_angular_acc)
+
+    # A heavier vehicle needs more thrust
+    heavy = Hover(1.0).schedule({'mass': 2.0})
+    assert heavy.total_thrust[0, 0] == pytest.approx(2.0 * 9.81)
+
+
+@pytest.mark.parametrize("turns", [0, [1, 0]])
+def test_yaw_flip_rejects_zero_turns(turns):
+    with pytest.raises(ValueError):
+        YawFlip(turns=turns)
+
+
+@pytest.mark.parametrize("t", [0, -1.0, [1.0, 0.0]])
+def test_climb_rejects_non_positive_durations(t):
+    with pytest.raises(ValueError):
+        Climb(height=1.0, t=t)
+
+
+def test_batch_simulates_a_schedule():
+    turns = np.array([1, 2, 3, 2])
+    hover = Section(9.81, [0, 0, 0], 0.1)
+    # Runs of different lengths
+    schedule = concatenate_schedules([Hover(0.1).schedule(), Flip(turns=turns).schedule(),
+                                      pack_sections([[hover], [hover] * 2, [hover] * 3, []])])
+    assert schedule.t.shape == (4, 9)
+    np.testing.assert_array_equal(schedule.n_sections, [7, 8, 9, 6])
+    batch = BatchQuadrotorDynamics(4)
+    ts, states, n_samples = batch.simulate(schedule)
+    expected = BatchQuadrotorDynamics(4).simulate([schedule_sections(schedule, i) for i in range(4)])
+    np.testing.assert_array_equal(states, expected[1])
+    np.testing.assert_array_equal(n_samples, expected[2])
+    # Each extra turn of the initial flip parameters adds about a full roll
+    phi = states[np.arange(4), n_samples - 1, 6]
+    np.testing.assert_allclose(np.diff(phi[:3]), 2 * np.pi, atol=0.2)
@@ -0,0 +1,80 @@
+import numpy as np
+import pytest
+
+from quadrotor_simulator.flips import SimulationParams
+from quadrotor_simulator.quadrotor_dynamics import QuadrotorDynamics
+from quadrotor_simulator.section_cache import SectionCache
+
+gen = SimulationParams(turns=1)
+initial = gen.get_initial_parameters()
+sections = gen.get_sections(initial)
+
+
+@pytest.mark.parametrize('kwargs', [{}, {'integrator': 'rk4_compiled'}, {'max_history': 50}])
+def test_replayed_sections_match(kwargs):
+    expected = QuadrotorDynamics(**kwargs)
+    expected.update_state(sections)
+
+    cache = SectionCache()
+    for _ in range(2):
+        quadrotor = QuadrotorDynamics(section_cache=cache, **kwargs)
+        quadrotor.update_state(sections)
+        np.testing.assert_array_equal(quadrotor.df_state.values, expected.df_state.values)
+        np.testing.assert_array_equal(quadrotor.df_state_history.values, expected.df_state_history.values)
+        np.testing.assert_allclose(quadrotor.df_state_history.index, expected.df_state_history.index, rtol=1e-12)
+        np.testing.assert_array_equal(quadrotor.current_state, expected.current_state)
+        np.testing.assert_array_equal(quadrotor.df_current_state.values, expected.df_current_state.values)
+    if 'max_history' in kwargs:
+        # Sections longer than the bounded history are not stored
+        assert cache.hits < cache.misses
+    else:
+        assert cache.misses == cache.hits == len(sections)
+
+
+def test_shared_prefix_is_replayed():
+    cache = SectionCache()
+    for p2 in [0.01, 0.02, 0.03]:
+        quadrotor = QuadrotorDynamics(save_state=False, section_cache=cache)
+        quadrotor.update_state(gen.get_sections(initial[:2] + (p2,) + initial[3:]))
+    # The first two sections only depend on p0 and p1
+    assert cache.stats()['hits'] == 4
+    assert cache.stats()['misses'] == 11
+
+    # Entries of models not saving their state have no df_state_history rows
+    quadrotor = QuadrotorDynamics(section_cache=cache)
+    quadrotor.update_state(sections[:1])
+    assert len(quadrotor.df_state_history)
+    assert cache.stats()['misses'] == 12
+
+
+def test_eviction_and_disk_tier(tmp_path):
+    cache = SectionCache(max_bytes=8000, directory=str(tmp_path))
+    QuadrotorDynamics(save_state=False, section_cache=cache).update_state(sections)
+    assert cache.evictions > 0
+    assert cache.nbytes <= 8000
+    assert len(list(tmp_path.glob('*.npz'))) == len(sections)
+
+    expected = QuadrotorDynamics(save_state=False)
+    expected.update_state(sections)
+    cold = SectionCache(directory=str(tmp_path))
+    quadrotor = QuadrotorDynamics(save_state=False, section_cache=cold)
+    quadrotor.update_state(sections)
+    np.testing.assert_array_equal(quadrotor.current_state, expected.current_state)
+    assert cold.stats()['disk_hits'] == len(sections)
+    assert cold.stats()['hit_rate'] == 1.0
+
+
+def test_entries_do_not_share_the_model_state():
+    cache = SectionCache()
+    quadrotor = QuadrotorDynamics(save_state=False, section_cache=cache)
+    quadrotor.update_state(sections[:1])
+    expected = quadrotor.current_state.copy()
+    # In place edits after a miss must not reach the cached section
+    quadrotor.current_state[:] = 1.0
+    quadrotor.current_state_dot[:] = 1.0
+
+    replayed = QuadrotorDynamics(save_state=False, section_cache=cache)
+    replayed.update_state(sections[:1])
+    assert cache.hits == 1
+    np.testing.assert_array_equal(replayed.current_state, expected)
+    assert not np.any(replayed.current_state_dot == 1.0)
@@ -0,0 +1,79 @@
+import multiprocessing
+
+import numpy as np
+import pytest
+
+from quadrotor_simulator.flips import SimulationParams
+from quadrotor_simulator.quadrotor_dynamics import QuadrotorDynamics
+from quadrotor_simulator.state_bus import STATE, T, StatePublisher, StateSubscriber
+
+gen = SimulationParams(turns=2)
+sections = gen.get_sections(gen.get_initial_parameters())
+
+
+def _follow(name, queue):
+    """Read the bus from another process until the publisher finishes"""
+    with StateSubscriber(name) as subscriber:
+        start, ts = 0, []
+        while True:
+            closed = subscriber.closed
+            indices, rows, start = subscriber.read(start)
+            ts.extend(rows[:, T])
+            if closed:
+                break
+        queue.put((ts, subscriber.latest().state))
+
+
+def test_publish_update_state():
+    quadrotor = QuadrotorDynamics()
+    with quadrotor.publish_states(capacity=64) as publisher:
+        with StateSubscriber(publisher.name) as subscriber:
+            assert subscriber.latest() is None
+            quadrotor.update_state(sections)
+            expected = quadrotor.df_state[~quadrotor.df_state.index.duplicated()]
+            assert subscriber.head == len(expected)
+
+            latest = subscriber.latest()
+            assert latest.index == len(expected) - 1
+            assert latest.t == pytest.approx(quadrotor.t_start)
+            np.testing.assert_array_equal(latest.state, quadrotor.current_state)
+            assert latest.total_thrust == sections[-1].total_thrust
+
+            # Only the last rows are still in the ring
+            indices, rows, start = subscriber.read()
+            np.testing.assert_array_equal(indices, np.arange(len(expected) - 64, len(expected)))
+            np.testing.assert_allclose(rows[:, STATE], expected.values[-64:])
+            assert start == len(expected)
+            assert not len(subscriber.read(start)[0])
+            np.testing.assert_array_equal(subscriber.rows[indices % 64], rows)
+
+
+def test_subscriber_in_another_process():
+    quadrotor = QuadrotorDynamics(save_state=False, integrator='rk4')
+    queue = multiprocessing.Queue()
+    with quadrotor.publish_states(capacity=4096) as publisher:
+        reader = multiprocessing.Process(target=_follow, args=(publisher.name, queue))
+        reader.start()
+        for _ in range(500):
+            quadrotor.step(9.81, [0, 10.0, 0])
+        publisher.finish()
+        ts, state = queue.get(timeout=30)
+        reader.join(timeout=30)
+    # The initial state is published with the first step
+    np.testing.assert_allclose(ts, np.arange(501) * quadrotor._dt)
+    np.testing.assert_array_equal(state, quadrotor.current_state)
+
+
+def test_torn_rows_are_dropped():
+    with StatePublisher(capacity=4) as publisher, StateSubscriber(publisher.name) as subscriber:
+        for i in range(6):
+            publisher.publish(0.1 * i, np.full(12, i), 9.81, [0, 0, 0])
+        # A row being written is skipped
+        publisher._sequences[5 % 4] += 1
+        indices, rows, _ = subscriber.read()
+        np.testing.assert_array_equal(indices, [2, 3, 4])
+        with pytest.raises(RuntimeError):
+            subscriber.latest(retries=3)
+        name = publisher.name
+    with pytest.raises(FileNotFoundError):
+        StateSubscriber(name)
@@ -0,0 +1,44 @@
+import numpy as np
+
+from quadrotor_simulator.flips import SimulationParams
+from quadrotor_simulator.quadrotor_dynamics import QuadrotorDynamics
+
+gen = SimulationParams(turns=1)
+sections = gen.get_sections(gen.get_initial_parameters())
+
+
+def unique_samples(df_state):
+    index = df_state.index.values
+    keep = np.r_[True, np.diff(index) != 0]
+    return index[keep], df_state.values[keep]
+
+
+def test_stream_matches_update_state():
+    expected_ts, expected = unique_samples(QuadrotorDynamics(integrator='rk4').update_state(sections))
+
+    quadrotor = QuadrotorDynamics(save_state=False, integrator='rk4')
+    samples = list(quadrotor.stream(sections))
+    np.testing.assert_allclose([sample.t for sample in samples], expected_ts)
+    np.testing.assert_allclose(np.array([sample.state for sample in samples]), expected, rtol=1e-12, atol=1e-12)
+    assert len(quadrotor.df_state) == 0
+
+
+def test_stream_with_odeint():
+    expected_ts, expected = unique_samples(QuadrotorDynamics().update_state(sections))
+    quadrotor = QuadrotorDynamics()
+    states = np.array([sample.state for sample in quadrotor.stream(sections)])
+    np.testing.assert_allclose(states, expected, atol=1e-5)
+    np.testing.assert_allclose(quadrotor.df_state.index.values, expected_ts)
+
+
+def test_step():
+    section = sections[0]
+    reference = QuadrotorDynamics(integrator='rk4_compiled')
+    reference.update_state([section._replace(t=0.05)])
+
+    quadrotor = QuadrotorDynamics(integrator='rk4_compiled')
+    for _ in range(len(reference.df_state) - 1):
+        state = quadrotor.step(section.total_thrust, section.desired_angular_acc)
+    np.testing.assert_allclose(quadrotor.t_start, reference.t_start)
+    np.testing.assert_allclose(state, reference.current_state, rtol=1e-12)
+    np.testing.assert_allclose(quadrotor.df_state.values, reference.df_state.values, rtol=1e-12)
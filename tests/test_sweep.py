@@ -0,0 +1,42 @@
+import numpy as np
+
+from quadrotor_simulator.flips import SimulationParams
+from quadrotor_simulator.quadrotor_dynamics import QuadrotorDynamics
+from quadrotor_simulator.sweep import flip_errors, grid, random_sample, run_sweep
+
+
+def test_grid():
+    parameters = grid(Bup=[20, 21.58], p1=[0.1, 0.2, 0.3])
+    assert parameters.shape == (6, 2)
+    np.testing.assert_allclose(parameters.p1.values, [0.1, 0.2, 0.3, 0.1, 0.2, 0.3])
+
+
+def test_sweep_matches_single_runs():
+    parameters = random_sample(4, {'p0': (18, 20), 'p4': (0.15, 0.25)}, seed=0)
+    parameters['Cn'] = [1, 2, 3, 2]
+    pooled = run_sweep(parameters, processes=2, chunksize=1)
+    serial = run_sweep(parameters, processes=1)
+    np.testing.assert_array_equal(pooled.values, serial.values)
+    # Each worker reuses its model, the runs do not depend on the ones before
+    np.testing.assert_array_equal(run_sweep(parameters.iloc[::-1], processes=1).values[::-1], serial.values)
+
+    for _, run in pooled.iterrows():
+        gen = SimulationParams(turns=run.Cn)
+        quadrotor = QuadrotorDynamics(save_state=False)
+        quadrotor.update_state(gen.get_sections((run.p0, run.p1, run.p2, run.p3, run.p4)))
+        state = quadrotor.current_state
+        np.testing.assert_allclose(run[['x', 'y', 'z', 'phi', 'theta', 'psi']].values, state[[0, 1, 2, 6, 7, 8]])
+        np.testing.assert_allclose(run[['position_error', 'velocity_error', 'attitude_error']].values,
+                                   flip_errors(state, run.Cn))
+        # Trajectory metrics accumulated while simulating
+        np.testing.assert_allclose(run.rotation_phi, state[6])
+        assert run.peak_p > 0 and run.altitude_loss >= 0
+    # Missing flip times take their initial value
+    np.testing.assert_allclose(pooled.p1.values, 0.2)
+
+
+def test_section_cache_is_opt_in():
+    parameters = grid(p1=[0.2], p2=[0.3, 0.35], Cn=[2])
+    cached = run_sweep(parameters, processes=1, section_cache=True)
+    plain = run_sweep(parameters, processes=1)
+    np.testing.assert_allclose(cached.values, plain.values, atol=1e-8)
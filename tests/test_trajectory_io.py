@@ -0,0 +1,113 @@
+import numpy as np
+import pytest
+
+from quadrotor_simulator.flips import SimulationParams
+from quadrotor_simulator.quadrotor_dynamics import QuadrotorDynamics, state_derivative
+from quadrotor_simulator.trajectory_io import VALUES, Trajectory, TrajectoryWriter
+
+gen = SimulationParams(turns=1)
+sections = gen.get_sections(gen.get_initial_parameters())
+
+
+def test_update_state_is_recorded(tmp_path):
+    path = str(tmp_path / 'flip.qtraj')
+    quadrotor = QuadrotorDynamics()
+    with quadrotor.record_trajectory(path, metadata={'turns': 1}):
+        quadrotor.update_state(sections)
+
+    trajectory = Trajectory(path)
+    assert isinstance(trajectory.data, np.memmap)
+    assert trajectory.n_rows == len(trajectory)
+    assert trajectory.header['metadata'] == {'turns': 1}
+    assert trajectory.config['mass'] == quadrotor.config['mass']
+    assert [section['total_thrust'] for section in trajectory.sections] == [
+        section.total_thrust for section in sections if section.t >= 2 * quadrotor._dt]
+
+    # The boundary samples duplicated by df_state are written once
+    df_state = quadrotor.df_state[~quadrotor.df_state.index.duplicated()]
+    np.testing.assert_array_equal(trajectory.channel('t'), df_state.index)
+    np.testing.assert_array_equal(trajectory.to_dataframe().iloc[:, :12].values, df_state.values)
+
+    # Motor thrusts are the ones of the model at each sample
+    for row in trajectory.data[[1, 100, -1]]:
+        expected = np.zeros(19)
+        section = [s for s in trajectory.sections if s['t_start'] <= row['t']][-1]
+        state_derivative(np.array(row['values'][:12]), section['total_thrust'], section['desired_angular_acc'],
+                         quadrotor.vehicle, expected)
+        np.testing.assert_allclose(row['values'][12:], expected[12:], rtol=1e-12)
+
+
+def test_runs_and_time_slices(tmp_path):
+    path = str(tmp_path / 'runs.qtraj')
+    with TrajectoryWriter(path, dtype='float32') as writer:
+        for run in range(3):
+            writer.new_run(run)
+            ts = np.arange(10) * 0.1
+            states = np.full((10, 12), float(run))
+            writer.write(ts, states, np.zeros((10, 4)), [1.0, 2.0, 3.0])
+            # Samples already written are skipped
+            writer.write(ts[:5], states[:5], np.zeros((5, 4)), [1.0, 2.0, 3.0])
+
+    trajectory = Trajectory(path)
+    assert trajectory.data['values'].dtype == np.float32
+    assert trajectory.data['values'].shape == (30, len(VALUES))
+    np.testing.assert_array_equal(trajectory.runs(), [0, 1, 2])
+
+    rows = trajectory.select(run=1, t_start=0.25, t_end=0.55)
+    np.testing.assert_array_equal(rows['t'], ts[3:6])
+    assert (rows['values'][:, :12] == 1).all()
+    np.testing.assert_array_equal(rows['values'][:, 16:], [[1, 2, 3]] * 3)
+    assert np.shares_memory(rows, trajectory.data)
+
+
+def test_float32_keeps_run_and_time_exact(tmp_path):
+    path = str(tmp_path / 'long.qtraj')
+    run = 2 ** 24 + 1
+    ts = 1e6 + np.arange(5) * 0.005
+    with TrajectoryWriter(path, dtype='float32') as writer:
+        writer.new_run(run)
+        writer.write(ts, np.zeros((5, 12)), np.zeros((5, 4)), [0, 0, 0])
+    trajectory = Trajectory(path)
+    assert trajectory.channel('run').dtype == np.int64
+    np.testing.assert_array_equal(trajectory.channel('run'), run)
+    np.testing.assert_array_equal(trajectory.channel('t'), ts)
+    np.testing.assert_array_equal(trajectory.select(run, ts[1], ts[3])['t'], ts[1:4])
+
+
+def test_many_sections_and_reading_while_writing(tmp_path):
+    path = str(tmp_path / 'sweep.qtraj')
+    vehicle = QuadrotorDynamics().vehicle
+    writer = TrajectoryWriter(path)
+    for run in range(200):
+        writer.new_run(run)
+        for i in range(10):
+            ts = 0.1 * i + np.arange(3) * 0.05
+            writer.write_section(ts, np.zeros((3, 12)), 9.81 + i, [float(run), 0, 0], vehicle)
+    writer.flush()
+    trajectory = Trajectory(path)
+    n_rows = len(trajectory)
+    assert len(trajectory.sections) == 2000
+    assert trajectory.sections[-1]['run'] == 199
+    np.testing.assert_array_equal(trajectory.sections['desired_angular_acc'][-1], [199, 0, 0])
+
+    # Rows appended after the flush overwrite the section table until the next one
+    writer.new_run()
+    writer.write([0.0, 0.1], np.zeros((2, 12)), np.zeros((2, 4)), [0, 0, 0])
+    writer._file.flush()
+    trajectory = Trajectory(path)
+    assert len(trajectory) == n_rows + 2 and not len(trajectory.sections)
+    writer.close()
+    trajectory = Trajectory(path)
+    assert len(trajectory) == n_rows + 2 and len(trajectory.sections) == 2000
+
+
+def test_bad_header_and_file(tmp_path):
+    path = tmp_path / 'bad_metadata.qtraj'
+    with pytest.raises(TypeError):
+        TrajectoryWriter(str(path), metadata={'vehicle': object()})
+    assert not path.exists()
+
+    path = tmp_path / 'not_a_trajectory'
+    path.write_bytes(b'\0' * 64)
+    with pytest.raises(ValueError):
+        Trajectory(str(path))
@@ -0,0 +1,38 @@
+import numpy as np
+import pytest
+
+from quadrotor_simulator.quadrotor_dynamics import QuadrotorDynamics, default_config, motor_thrust
+from quadrotor_simulator.vehicle import VehicleParams
+
+
+def test_from_config():
+    config = default_config()
+    vehicle = VehicleParams.from_config(config)
+    np.testing.assert_allclose(vehicle.inverse_inertia_matrix, np.linalg.inv(np.diag(config['inertia'])))
+    np.testing.assert_allclose(np.dot(vehicle.mixer, vehicle.inverse_mixer), np.eye(4), atol=1e-12)
+    moments = np.array([0.01, -0.02, 0.003])
+    np.testing.assert_allclose(np.dot(vehicle.inverse_mixer, np.r_[9.81, moments]),
+                               motor_thrust(config, moments, 9.81))
+    with pytest.raises(ValueError):
+        vehicle.inertia[0] = 1
+
+
+def test_vehicle_is_cached_until_config_changes():
+    quadrotor = QuadrotorDynamics()
+    vehicle = quadrotor.vehicle
+    assert quadrotor.vehicle is vehicle
+
+    quadrotor.config['mass'] = 2
+    assert quadrotor.vehicle is not vehicle
+    assert quadrotor.vehicle.mass == 2
+
+    quadrotor.config = dict(default_config(), inertia=np.array([0.01, 0.01, 0.02]))
+    np.testing.assert_allclose(quadrotor.inertia_matrix, np.diag([0.01, 0.01, 0.02]))
+
+
+def test_methods_use_vehicle():
+    quadrotor = QuadrotorDynamics()
+    moments = np.array([0.01, -0.02, 0.003])
+    thrust = quadrotor.motor_thrust(moments, 9.81)
+    np.testing.assert_allclose(thrust, motor_thrust(quadrotor.config, moments, 9.81))
+    np.testing.assert_allclose(np.dot(quadrotor.vehicle.mixer, thrust), np.r_[9.81, moments])